@@ -60,7 +60,7 @@ def parse_args():
     # 执行配置
     parser.add_argument('--workers', '-w', type=int,
                         default=4,
-                        help='并发worker数量 (默认: 4)')
+                        help='并发worker数量，同时用于Phase 1历史扫描和Phase 3执行 (默认: 4)')
     parser.add_argument('--phase', type=str,
                         choices=['quick', 'method', 'full'],
                         default='full',
@@ -74,6 +74,11 @@ def parse_args():
                         help='采样数量，用于快速测试')
     parser.add_argument('--commit', type=str,
                         help='只分析指定的commit')
+    parser.add_argument('--scan-mode', type=str,
+                        choices=['stream', 'bloom'],
+                        default=AnalysisConfig.PHASE1_SCAN_MODE,
+                        help='Phase 1扫描方式: stream(逐个commit扫描；启用commit索引时直接查询索引), '
+                             'bloom(基于commit-graph Bloom过滤器，优先于commit索引)')
     
     # 其他选项
     parser.add_argument('--resume', action='store_true',
@@ -155,7 +160,8 @@ def analyze_single_project(project_path: str, args, logger) -> dict:
         workers=args.workers,
         resume=args.resume,
         enable_cache=not args.no_cache,
-        verbose=args.verbose
+        verbose=args.verbose,
+        scan_mode=args.scan_mode
     )
     
     # 执行分析
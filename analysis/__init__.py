@@ -6,10 +6,12 @@ from .project_analyzer import ProjectAnalyzer
 from .commit_analyzer import CommitAnalyzer
 from .report_generator import ReportGenerator
 from .cache_manager import CacheManager
+from .commit_index import CommitIndex
 
 __all__ = [
     'ProjectAnalyzer',
     'CommitAnalyzer', 
     'ReportGenerator',
-    'CacheManager'
+    'CacheManager',
+    'CommitIndex'
 ]
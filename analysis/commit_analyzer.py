@@ -7,12 +7,14 @@ import json
 from datetime import datetime
 from dataclasses import dataclass, field, asdict
 from typing import Dict, Any, List, Optional
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from config import Config, AnalysisConfig
 from utils.logger import get_logger
 from modules import GitAnalyzer, CodeAnalyzer, ChangeDetector
 from modules.diff_filter import DiffFilter
+from modules.commit_diff import CommitDiff
+from modules.method_index import MethodIndex
 from modules.isolated_executor import IsolatedExecutor
 from modules.commit_classifier import CommitClassifier
 
@@ -59,6 +61,9 @@ class CommitAnalyzer:
         self.code_analyzer = CodeAnalyzer()
         self.change_detector = ChangeDetector()
         self.diff_filter = DiffFilter()
+        
+        # 最近一个commit的完整diff（各阶段共享，避免重复调用git diff）
+        self._commit_diff_cache = None
     
     def analyze_full(self, commit_hash: str) -> CommitAnalysisResult:
         """
@@ -80,19 +85,17 @@ class CommitAnalyzer:
             # 2. 分析文件变更
             result.file_changes = self._analyze_file_changes(commit_hash)
             
-            # 3. 分析方法变更
-            result.method_changes = self._analyze_method_changes(commit_hash, result.file_changes)
-            
-            # 4. 处理diff
-            result.diff_info = self._process_diff(commit_hash)
-
-            # 4.1 统计方法级变更行数
-            result.method_changes['method_change_stats'] = self._compute_method_change_stats(
+            # 3. 分析方法变更，同时统计方法级变更行数
+            result.method_changes, method_change_stats = self._analyze_method_changes_and_stats(
                 commit_hash,
                 result.basic_info.get('parent_hash'),
                 result.file_changes
             )
             
+            # 4. 处理diff
+            result.diff_info = self._process_diff(commit_hash)
+            result.method_changes['method_change_stats'] = method_change_stats
+            
             # 5. 执行4个版本
             execution_results = self._execute_all_versions(
                 commit_hash,
@@ -149,8 +152,10 @@ class CommitAnalyzer:
             # 文件变更
             file_changes = self._analyze_file_changes(commit_hash)
             
-            # 方法变更
-            method_changes = self._analyze_method_changes(commit_hash, file_changes)
+            # 方法变更（同时统计方法级变更行数）
+            method_changes, method_change_stats = self._analyze_method_changes_and_stats(
+                commit_hash, basic_info.get('parent_hash'), file_changes
+            )
             
             # 检查是否有方法级变更
             source_methods = method_changes.get('source_methods', [])
@@ -161,11 +166,6 @@ class CommitAnalyzer:
             
             # Diff信息
             diff_info = self._process_diff(commit_hash)
-            method_change_stats = self._compute_method_change_stats(
-                commit_hash,
-                basic_info.get('parent_hash'),
-                file_changes
-            )
             
             return {
                 'commit_hash': commit_hash,
@@ -321,33 +321,47 @@ class CommitAnalyzer:
         }
     
     def _analyze_method_changes(self, commit_hash: str, file_changes: dict) -> dict:
-        """分析方法变更
+        """分析方法变更（只需要方法列表时使用）"""
+        commit = self.git_analyzer.repo.commit(commit_hash)
+        parent_hash = commit.parents[0].hexsha if commit.parents else None
+        method_changes, _ = self._analyze_method_changes_and_stats(commit_hash, parent_hash, file_changes)
+        return method_changes
+    
+    def _analyze_method_changes_and_stats(self, commit_hash: str, parent_hash: Optional[str],
+                                          file_changes: dict) -> tuple:
+        """分析方法变更并统计方法级增删行数
+        
+        每个变更文件只读取一次diff切片和两个版本的内容，每个版本只解析一次，
+        同一遍行号映射同时产出变更方法列表和方法级统计。
         
         正确处理新增行和删除行的方法归属：
         - 新增行 (+) 对应当前版本的行号，在当前版本的方法结构中查找
         - 删除行 (-) 对应父版本的行号，在父版本的方法结构中查找
-        """
-        commit = self.git_analyzer.repo.commit(commit_hash)
-        parent_hash = commit.parents[0].hexsha if commit.parents else None
         
+        Args:
+            commit_hash: 当前commit hash
+            parent_hash: 父commit hash
+            file_changes: 文件变更信息
+            
+        Returns:
+            tuple: (method_changes, method_change_stats)
+        """
         source_methods = []
         test_methods = []
+        stats = {'source': [], 'test': []}
         
-        # 分析源文件中的方法变更
-        for file_info in file_changes.get('source_files', []):
-            methods = self._analyze_single_file_methods(
-                commit_hash, parent_hash, commit, file_info, is_test=False
-            )
-            source_methods.extend(methods)
+        # 一次性流水线读取所有变更文件的两个版本
+        contents = self._prefetch_file_contents(commit_hash, parent_hash, file_changes)
         
-        # 分析测试文件中的方法变更
-        for file_info in file_changes.get('test_files', []):
-            methods = self._analyze_single_file_methods(
-                commit_hash, parent_hash, commit, file_info, is_test=True
-            )
-            test_methods.extend(methods)
+        for category, is_test in (('source_files', False), ('test_files', True)):
+            for file_info in file_changes.get(category, []):
+                methods, file_stats = self._analyze_single_file(
+                    commit_hash, parent_hash, file_info, is_test, contents
+                )
+                (test_methods if is_test else source_methods).extend(methods)
+                stats['test' if is_test else 'source'].extend(file_stats)
         
-        return {
+        method_changes = {
             'source_methods': source_methods,
             'test_methods': test_methods,
             'summary': {
@@ -355,75 +369,120 @@ class CommitAnalyzer:
                 'test_methods_count': len(test_methods)
             }
         }
+        
+        # 根commit没有父版本，不统计增删行
+        if not parent_hash:
+            stats = {'source': [], 'test': []}
+        
+        return method_changes, stats
     
-    def _analyze_single_file_methods(self, commit_hash: str, parent_hash: str, 
-                                      commit, file_info: dict, is_test: bool) -> list:
-        """分析单个文件的方法变更
+    def _get_commit_diff(self, commit_hash: str) -> CommitDiff:
+        """获取commit的完整diff对象（同一commit只生成一次）"""
+        if self._commit_diff_cache and self._commit_diff_cache[0] == commit_hash:
+            return self._commit_diff_cache[1]
+        
+        commit = self.git_analyzer.repo.commit(commit_hash)
+        commit_diff = self.git_analyzer.get_commit_diff(commit)
+        self._commit_diff_cache = (commit_hash, commit_diff)
+        return commit_diff
+    
+    def _prefetch_file_contents(self, commit_hash: str, parent_hash: Optional[str],
+                                file_changes: dict) -> dict:
+        """批量读取变更Java文件在当前版本和父版本中的内容
+        
+        Args:
+            commit_hash: 当前commit hash
+            parent_hash: 父commit hash
+            file_changes: 文件变更信息
+            
+        Returns:
+            dict: {(rev, file_path): (blob_sha, content)}
+        """
+        specs = []
+        for category in ('source_files', 'test_files'):
+            for file_info in file_changes.get(category, []):
+                file_path = file_info.get('path')
+                if not file_path or not file_path.endswith('.java'):
+                    continue
+                specs.append((commit_hash, file_path))
+                if parent_hash:
+                    # 重命名文件在父版本中使用旧路径
+                    specs.append((parent_hash, file_info.get('old_path') or file_path))
+        
+        return dict(zip(specs, self.git_analyzer.get_file_contents(specs)))
+    
+    def _analyze_single_file(self, commit_hash: str, parent_hash: Optional[str],
+                             file_info: dict, is_test: bool, contents: dict) -> tuple:
+        """分析单个文件的方法变更和方法级增删行数
         
         Args:
             commit_hash: 当前commit hash
             parent_hash: 父commit hash
-            commit: commit对象
             file_info: 文件信息
             is_test: 是否为测试文件
+            contents: 预读取的文件内容 {(rev, file_path): (blob_sha, content)}
             
         Returns:
-            list: 变更的方法列表
+            tuple: (变更的方法列表, 方法级统计列表)
         """
         file_path = file_info.get('path')
         change_type = file_info.get('change_type')
         
         if not file_path or not file_path.endswith('.java'):
-            return []
+            return [], []
         
         try:
-            diff_text = self.git_analyzer.get_file_diff(commit, file_path)
-            if not diff_text:
-                return []
-            
-            # 获取当前版本和父版本的文件内容
-            current_content = self.git_analyzer.get_file_content(commit_hash, file_path)
-            parent_content = self.git_analyzer.get_file_content(parent_hash, file_path) if parent_hash else None
-            
-            # 文件被删除的情况：只有父版本有内容
-            if change_type == 'deleted':
-                current_content = None
-            # 文件被新增的情况：只有当前版本有内容
-            elif change_type == 'added':
-                parent_content = None
-            
-            # 提取两个版本的方法结构
-            current_methods = self._extract_methods_from_content(current_content, file_path)
-            parent_methods = self._extract_methods_from_content(parent_content, file_path)
-            
-            # 解析diff获取变更行号
-            parsed_diff = self.change_detector.parse_diff(diff_text)
+            hunks = self._get_commit_diff(commit_hash).file_hunks(file_path)
+            if not hunks:
+                return [], []
+            
+            # 获取当前版本和父版本的文件内容（每个版本只解析一次）
+            child_blob = contents.get((commit_hash, file_path))
+            parent_path = file_info.get('old_path') or file_path
+            parent_blob = contents.get((parent_hash, parent_path)) if parent_hash else None
+            
+            child_methods = self._extract_methods_from_content(child_blob, file_path)
+            parent_methods = self._extract_methods_from_content(parent_blob, file_path)
+            child_index = MethodIndex(child_methods)
+            parent_index = MethodIndex(parent_methods)
+            
+            # 方法归属按变更类型处理：删除的文件只看父版本，新增的文件只看当前版本；
+            # 增删行统计始终使用两个版本的实际内容
+            track_added = change_type != 'deleted'
+            track_removed = change_type != 'added'
+            current_methods = child_methods if track_added else []
             
             # 收集变更的方法（使用set去重）
             changed_method_keys = set()
             changed_methods_map = {}
+            method_stats = {}
             
-            for entry in parsed_diff:
-                for change in entry.get('changes', []):
-                    # 新增行 -> 在当前版本的方法中查找
-                    for line_no in change.get('added_lines', []):
-                        method = self._find_method_at_line(current_methods, line_no)
-                        if method:
-                            key = self._get_method_key(method)
-                            if key not in changed_method_keys:
-                                changed_method_keys.add(key)
-                                changed_methods_map[key] = method.copy()
+            for hunk in hunks:
+                # 新增行 -> 在当前版本的方法中查找
+                for line_no in hunk.added_lines:
+                    method = child_index.find(line_no)
+                    if not method:
+                        continue
+                    self._count_method_line(method_stats, method, file_path, 'added_lines')
+                    
+                    key = self._get_method_key(method)
+                    if track_added and key not in changed_method_keys:
+                        changed_method_keys.add(key)
+                        changed_methods_map[key] = method.copy()
+                
+                # 删除行 -> 在父版本的方法中查找
+                for line_no in hunk.removed_lines:
+                    method = parent_index.find(line_no)
+                    if not method:
+                        continue
+                    self._count_method_line(method_stats, method, file_path, 'removed_lines')
                     
-                    # 删除行 -> 在父版本的方法中查找
-                    for line_no in change.get('removed_lines', []):
-                        method = self._find_method_at_line(parent_methods, line_no)
-                        if method:
-                            key = self._get_method_key(method)
-                            if key not in changed_method_keys:
-                                changed_method_keys.add(key)
-                                # 对于删除的行，优先使用当前版本的方法信息（如果存在）
-                                current_method = self._find_method_by_key(current_methods, key)
-                                changed_methods_map[key] = (current_method or method).copy()
+                    key = self._get_method_key(method)
+                    if track_removed and key not in changed_method_keys:
+                        changed_method_keys.add(key)
+                        # 对于删除的行，优先使用当前版本的方法信息（如果存在）
+                        current_method = self._find_method_by_key(current_methods, key)
+                        changed_methods_map[key] = (current_method or method).copy()
             
             # 转换为结果列表
             result_methods = []
@@ -432,28 +491,48 @@ class CommitAnalyzer:
                     method['is_test_method'] = self._is_test_method(method)
                 result_methods.append(method)
             
-            return result_methods
+            for entry in method_stats.values():
+                entry['total_changed_lines'] = entry.get('added_lines', 0) + entry.get('removed_lines', 0)
+            
+            return result_methods, list(method_stats.values())
             
         except Exception as e:
             logger.debug(f"分析文件方法失败 {file_path}: {e}")
-            return []
+            return [], []
+    
+    @staticmethod
+    def _count_method_line(method_stats: dict, method: dict, file_path: str, field_name: str):
+        """累加方法的增删行数"""
+        key = (method['package'], method['class'], method['method'],
+               tuple(method.get('parameters', [])), file_path)
+        entry = method_stats.setdefault(key, {
+            'package': method['package'],
+            'class': method['class'],
+            'method': method['method'],
+            'parameters': method.get('parameters', []),
+            'file': file_path,
+            'added_lines': 0,
+            'removed_lines': 0
+        })
+        entry[field_name] += 1
     
-    def _extract_methods_from_content(self, content: str, file_path: str) -> list:
+    def _extract_methods_from_content(self, blob: Optional[tuple], file_path: str) -> list:
         """从文件内容中提取所有方法信息
         
         Args:
-            content: 文件内容
+            blob: (blob_sha, 文件内容)，文件不存在时为None
             file_path: 文件路径
             
         Returns:
             list: 方法信息列表
         """
-        if not content:
+        if not blob or not blob[1]:
             return []
         
         methods = []
-        classes_info = self.code_analyzer.parse_java_file(content)
-        package = self.code_analyzer.get_package_name(content)
+        blob_sha, content = blob
+        classes_info = self.code_analyzer.parse_outline(content, blob_sha=blob_sha)
+        package = classes_info['package']
         
         for cls in classes_info.get('classes', []):
             for m in cls.get('methods', []):
@@ -470,21 +549,6 @@ class CommitAnalyzer:
                 })
         return methods
     
-    def _find_method_at_line(self, methods: list, line_no: int) -> Optional[dict]:
-        """根据行号找到对应的方法
-        
-        Args:
-            methods: 方法列表
-            line_no: 行号
-            
-        Returns:
-            dict or None: 找到的方法信息
-        """
-        for m in methods:
-            if m.get('start_line', 0) <= line_no <= m.get('end_line', 0):
-                return m
-        return None
-    
     def _get_method_key(self, method: dict) -> tuple:
         """生成方法的唯一标识key
         
@@ -535,14 +599,13 @@ class CommitAnalyzer:
     
     def _process_diff(self, commit_hash: str) -> dict:
         """处理diff，分离源代码和测试代码的diff"""
-        commit = self.git_analyzer.repo.commit(commit_hash)
-        
         # 获取完整diff
-        full_diff = self.git_analyzer.get_full_diff(commit)
+        commit_diff = self._get_commit_diff(commit_hash)
+        full_diff = commit_diff.text
         
         # 分离diff
-        source_diff, test_diff, stats = self.diff_filter.filter_test_changes(full_diff)
-        full_stats = self.diff_filter.extract_changes_info(full_diff, label="完整")
+        source_diff, test_diff, stats = self.diff_filter.filter_test_changes(commit_diff)
+        full_stats = self.diff_filter.extract_changes_info(commit_diff, label="完整")
         source_stats = self.diff_filter.extract_changes_info(source_diff, label="源代码")
         test_stats = self.diff_filter.extract_test_changes_info(test_diff)
         
@@ -571,12 +634,16 @@ class CommitAnalyzer:
         
         executor = IsolatedExecutor(
             repo_path=self.repo_path,
-            work_dir=AnalysisConfig.ANALYSIS_WORKTREE_DIR
+            work_dir=AnalysisConfig.ANALYSIS_WORKTREE_DIR,
+            blob_reader=self.git_analyzer.blob_reader
         )
         
         results = {}
         
         try:
+            # 多模块项目只检出变更涉及的模块
+            executor.plan_sparse_checkout(commit_hash, parent_hash)
+            
             # 根据配置决定是否并行执行
             if AnalysisConfig.PARALLEL_VERSION_EXECUTION:
                 results = self._execute_versions_parallel(
@@ -664,24 +731,30 @@ class CommitAnalyzer:
                     executor.execute_version,
                     parent_hash, 'v1', None, changed_source_methods, changed_test_methods
                 ): 'v1',
-                pool.submit(
-                    executor.execute_version,
-                    parent_hash, 'v05', diff_info.get('source_only_diff'),
-                    changed_source_methods, changed_test_methods
-                ): 'v05',
-                pool.submit(
-                    executor.execute_version,
-                    parent_hash, 't05', diff_info.get('test_only_diff'),
-                    changed_source_methods, changed_test_methods
-                ): 't05',
                 pool.submit(
                     executor.execute_version,
                     commit_hash, 'v0', None, changed_source_methods, changed_test_methods
                 ): 'v0'
             }
             
-            for future in futures:
-                version = futures[future]
+            # V-0.5/T-0.5从V-1的构建输出增量构建时，需等待V-1完成（V0不受影响）
+            if AnalysisConfig.SEED_FROM_PARENT_BUILD:
+                wait([f for f, v in futures.items() if v == 'v1'], timeout=AnalysisConfig.COMMIT_TIMEOUT)
+            
+            futures[pool.submit(
+                executor.execute_version,
+                parent_hash, 'v05', diff_info.get('source_only_diff'),
+                changed_source_methods, changed_test_methods
+            )] = 'v05'
+            futures[pool.submit(
+                executor.execute_version,
+                parent_hash, 't05', diff_info.get('test_only_diff'),
+                changed_source_methods, changed_test_methods
+            )] = 't05'
+            
+            by_version = {v: f for f, v in futures.items()}
+            for version in ('v1', 'v05', 't05', 'v0'):
+                future = by_version[version]
                 try:
                     results[version] = future.result(timeout=AnalysisConfig.COMMIT_TIMEOUT)
                 except Exception as e:
@@ -700,115 +773,8 @@ class CommitAnalyzer:
         return classifier.classify(v1_result, v05_result, t05_result, v0_result)
 
     def _compute_method_change_stats(self, commit_hash: str, parent_hash: str, file_changes: dict) -> dict:
-        """统计方法级别的增删行数（源/测试）"""
-        stats = {'source': [], 'test': []}
-
+        """统计方法级别的增删行数（源/测试，只需要统计时使用）"""
         if not parent_hash:
-            return stats
-
-        commit = self.git_analyzer.repo.commit(commit_hash)
-
-        def _collect_file_stats(file_info, category):
-            file_path = file_info.get('path')
-            if not file_path or not file_path.endswith('.java'):
-                return
-
-            diff_text = self.git_analyzer.get_file_diff(commit, file_path)
-            if not diff_text:
-                return
-
-            parsed = self.change_detector.parse_diff(diff_text)
-            file_changes_list = []
-            for entry in parsed:
-                if entry.get('file') == file_path:
-                    file_changes_list.extend(entry.get('changes', []))
-
-            if not file_changes_list:
-                return
-
-            child_content = self.git_analyzer.get_file_content(commit_hash, file_path) or ""
-            parent_content = self.git_analyzer.get_file_content(parent_hash, file_path) or ""
-
-            child_classes = self.code_analyzer.parse_java_file(child_content)
-            parent_classes = self.code_analyzer.parse_java_file(parent_content)
-
-            child_pkg = self.code_analyzer.get_package_name(child_content)
-            parent_pkg = self.code_analyzer.get_package_name(parent_content)
-
-            child_methods = []
-            for cls in child_classes.get('classes', []):
-                for m in cls.get('methods', []):
-                    child_methods.append({
-                        'class': cls.get('name'),
-                        'method': m.get('name'),
-                        'parameters': m.get('parameters', []),
-                        'start_line': m.get('start_line', 0),
-                        'end_line': m.get('end_line', 0),
-                        'package': child_pkg,
-                        'file': file_path
-                    })
-
-            parent_methods = []
-            for cls in parent_classes.get('classes', []):
-                for m in cls.get('methods', []):
-                    parent_methods.append({
-                        'class': cls.get('name'),
-                        'method': m.get('name'),
-                        'parameters': m.get('parameters', []),
-                        'start_line': m.get('start_line', 0),
-                        'end_line': m.get('end_line', 0),
-                        'package': parent_pkg,
-                        'file': file_path
-                    })
-
-            def _find_method(methods, line_no):
-                for m in methods:
-                    if m.get('start_line', 0) <= line_no <= m.get('end_line', 0):
-                        return m
-                return None
-
-            method_stats = {}
-
-            for change in file_changes_list:
-                for line_no in change.get('added_lines', []):
-                    m = _find_method(child_methods, line_no)
-                    if not m:
-                        continue
-                    key = (m['package'], m['class'], m['method'], tuple(m.get('parameters', [])), file_path)
-                    entry = method_stats.setdefault(key, {
-                        'package': m['package'],
-                        'class': m['class'],
-                        'method': m['method'],
-                        'parameters': m.get('parameters', []),
-                        'file': file_path,
-                        'added_lines': 0,
-                        'removed_lines': 0
-                    })
-                    entry['added_lines'] += 1
-
-                for line_no in change.get('removed_lines', []):
-                    m = _find_method(parent_methods, line_no)
-                    if not m:
-                        continue
-                    key = (m['package'], m['class'], m['method'], tuple(m.get('parameters', [])), file_path)
-                    entry = method_stats.setdefault(key, {
-                        'package': m['package'],
-                        'class': m['class'],
-                        'method': m['method'],
-                        'parameters': m.get('parameters', []),
-                        'file': file_path,
-                        'added_lines': 0,
-                        'removed_lines': 0
-                    })
-                    entry['removed_lines'] += 1
-
-            for entry in method_stats.values():
-                entry['total_changed_lines'] = entry.get('added_lines', 0) + entry.get('removed_lines', 0)
-                stats[category].append(entry)
-
-        for file_info in file_changes.get('source_files', []):
-            _collect_file_stats(file_info, 'source')
-        for file_info in file_changes.get('test_files', []):
-            _collect_file_stats(file_info, 'test')
-
+            return {'source': [], 'test': []}
+        _, stats = self._analyze_method_changes_and_stats(commit_hash, parent_hash, file_changes)
         return stats
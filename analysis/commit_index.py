@@ -0,0 +1,222 @@
+"""
+Commit索引 - 在SQLite中持久化每个commit的文件级分类结果，支持增量更新
+"""
+
+import os
+import json
+import sqlite3
+from datetime import datetime
+from typing import List, Optional, Dict, Any
+
+from config import Config
+from utils.logger import get_logger
+from .history_scanner import HistoryScanner
+
+logger = get_logger()
+
+
+class CommitIndex:
+    """Commit文件级分类索引
+
+    每个仓库一个SQLite文件，记录commit hash、父commit、提交时间以及
+    测试/源代码/其他文件的变更数量。索引记住上次建立时的HEAD，
+    之后只扫描 `last_head..HEAD` 范围内的新commit。
+    项目信息统计、Phase 1筛选、日期过滤和采样都直接查询索引。
+    """
+
+    SCHEMA_VERSION = 1
+    BATCH_SIZE = 1000
+
+    def __init__(self, db_path: str, git_analyzer, history_scanner=None):
+        """
+        初始化索引
+
+        Args:
+            db_path: SQLite文件路径
+            git_analyzer: GitAnalyzer实例
+            history_scanner: HistoryScanner实例（用于并行扫描新增commit），默认单进程扫描
+        """
+        self.db_path = db_path
+        self.git_analyzer = git_analyzer
+        self.history_scanner = history_scanner or HistoryScanner(git_analyzer)
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """获取数据库连接（首次访问时建表）"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS commits (
+                    hash TEXT PRIMARY KEY,
+                    parent TEXT,
+                    committed_date INTEGER NOT NULL,
+                    test_files INTEGER NOT NULL,
+                    source_files INTEGER NOT NULL,
+                    other_files INTEGER NOT NULL,
+                    ord INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_commits_date ON commits (committed_date);
+                CREATE INDEX IF NOT EXISTS idx_commits_ord ON commits (ord);
+            """)
+        return self._conn
+
+    def close(self):
+        """关闭数据库连接"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # ========== 索引维护 ==========
+
+    def update(self) -> int:
+        """
+        将索引更新到当前HEAD
+
+        HEAD是上次索引HEAD的后代时只扫描新增commit；
+        历史被改写（rebase、切换分支）或路径分类规则变化时重建索引。
+
+        Returns:
+            int: 新写入的commit数量
+        """
+        head = self.git_analyzer.get_head_commit()
+        if head is None:
+            logger.warning("仓库没有HEAD，跳过commit索引更新")
+            return 0
+
+        last_head = self._get_meta('head')
+        fingerprint = self._get_fingerprint()
+
+        if last_head == head and self._get_meta('fingerprint') == fingerprint:
+            return 0
+
+        if (last_head and self._get_meta('fingerprint') == fingerprint
+                and self.git_analyzer.is_ancestor(last_head, head)):
+            revision = f"{last_head}..{head}"
+            logger.info(f"增量更新commit索引: {last_head[:8]}..{head[:8]}")
+        else:
+            if last_head:
+                logger.info("索引HEAD不在当前历史中或分类规则已变化，重建commit索引")
+            else:
+                logger.info("首次建立commit索引...")
+            self._reset()
+            revision = head
+
+        added = self._index_revision(revision)
+
+        with self.conn:
+            self._set_meta('head', head)
+            self._set_meta('fingerprint', fingerprint)
+            self._set_meta('updated_at', datetime.now().isoformat())
+
+        logger.info(f"commit索引已更新: 新增 {added} 个commits，共 {self.count()} 个")
+        return added
+
+    def _index_revision(self, revision: str) -> int:
+        """扫描版本范围内的commit并批量写入"""
+        rows = []
+        for commit_hash, committed_date, parent_hash, changed_files in \
+                self.history_scanner.iter_commit_changes(revision):
+            rows.append((
+                commit_hash,
+                parent_hash,
+                committed_date,
+                len(changed_files['test_files']),
+                len(changed_files['source_files']),
+                len(changed_files['other_files'])
+            ))
+
+        if not rows:
+            return 0
+
+        # 新commit按git log顺序排在已有commit之前，保持与流式扫描一致的输出顺序
+        row = self.conn.execute("SELECT MIN(ord) FROM commits").fetchone()
+        base = (row[0] if row[0] is not None else 0) - len(rows)
+
+        with self.conn:
+            for start in range(0, len(rows), self.BATCH_SIZE):
+                batch = rows[start:start + self.BATCH_SIZE]
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO commits "
+                    "(hash, parent, committed_date, test_files, source_files, other_files, ord) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [r + (base + start + i,) for i, r in enumerate(batch)]
+                )
+        return len(rows)
+
+    def _reset(self):
+        """清空索引"""
+        with self.conn:
+            self.conn.execute("DELETE FROM commits")
+            self.conn.execute("DELETE FROM meta")
+
+    def _get_fingerprint(self) -> str:
+        """分类规则指纹，规则变化后索引失效"""
+        return json.dumps({
+            'schema': self.SCHEMA_VERSION,
+            'test': Config.TEST_PATH_PATTERNS,
+            'source': Config.SOURCE_PATH_PATTERNS
+        }, sort_keys=True)
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ========== 查询 ==========
+
+    @staticmethod
+    def _date_condition(since_date: Optional[datetime]):
+        """生成日期过滤条件（与流式扫描一致：按提交时间，包含起始时刻）"""
+        if since_date is None:
+            return "1", ()
+        return "committed_date >= ?", (int(since_date.timestamp()),)
+
+    def count(self, since_date: Optional[datetime] = None) -> int:
+        """统计commit数量"""
+        condition, params = self._date_condition(since_date)
+        row = self.conn.execute(f"SELECT COUNT(*) FROM commits WHERE {condition}", params).fetchone()
+        return row[0]
+
+    def get_date_range(self) -> Dict[str, Any]:
+        """
+        获取提交时间范围
+
+        Returns:
+            dict: {'earliest': datetime or None, 'latest': datetime or None}
+        """
+        row = self.conn.execute("SELECT MIN(committed_date), MAX(committed_date) FROM commits").fetchone()
+        return {
+            'earliest': datetime.fromtimestamp(row[0]) if row[0] is not None else None,
+            'latest': datetime.fromtimestamp(row[1]) if row[1] is not None else None
+        }
+
+    def query_candidates(self,
+                         since_date: Optional[datetime] = None,
+                         sample: Optional[int] = None) -> List[str]:
+        """
+        查询同时修改测试和源代码的commit
+
+        Args:
+            since_date: 起始日期（datetime对象）
+            sample: 随机采样数量，None表示返回全部
+
+        Returns:
+            list: commit hash列表（不采样时按git log顺序）
+        """
+        condition, params = self._date_condition(since_date)
+        sql = (f"SELECT hash FROM commits "
+               f"WHERE test_files > 0 AND source_files > 0 AND {condition} ")
+        if sample:
+            sql += "ORDER BY RANDOM() LIMIT ?"
+            params = params + (sample,)
+        else:
+            sql += "ORDER BY ord"
+        return [row[0] for row in self.conn.execute(sql, params)]
@@ -0,0 +1,119 @@
+"""
+历史扫描器 - 将commit历史切分为连续区间，在进程池中并行计算文件级变更
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Iterator, Tuple
+
+from modules import GitAnalyzer
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# worker进程内常驻的GitAnalyzer（由进程池initializer创建）
+_worker_git_analyzer = None
+
+
+def _init_scan_worker(repo_path: str):
+    """进程池initializer：每个worker只加载一次仓库"""
+    global _worker_git_analyzer
+    _worker_git_analyzer = GitAnalyzer(repo_path)
+
+
+def _scan_commit_shard(commit_hashes: List[str]) -> List[Tuple]:
+    """在worker中扫描一段连续的commit"""
+    return list(_worker_git_analyzer.iter_commit_changes_of(commit_hashes))
+
+
+class HistoryScanner:
+    """并行历史扫描器
+
+    先用 `git rev-list` 得到与 `git log` 相同顺序的commit列表，切分为连续区间，
+    每个区间由worker中的单个 `git diff-tree --stdin` 进程处理，
+    按区间顺序合并结果，输出顺序与单进程扫描完全一致。
+    """
+
+    # 每个区间的最小commit数量，区间过小时进程间通信开销大于收益
+    MIN_SHARD_SIZE = 200
+
+    # 每个worker平均分到的区间数，用于平衡各区间diff开销的差异
+    SHARDS_PER_WORKER = 4
+
+    def __init__(self, git_analyzer: GitAnalyzer, workers: int = 1):
+        """
+        初始化历史扫描器
+
+        Args:
+            git_analyzer: 主进程中的GitAnalyzer
+            workers: 并发worker数，<=1时在当前进程中扫描
+        """
+        self.git_analyzer = git_analyzer
+        self.workers = max(1, workers or 1)
+
+    def iter_commit_changes(self,
+                            revision: str = 'HEAD',
+                            since_date: Optional[datetime] = None) -> Iterator[Tuple]:
+        """
+        扫描版本范围内的commit
+
+        Args:
+            revision: 版本范围（如 'HEAD' 或 'abc123..HEAD'）
+            since_date: 起始日期（datetime对象），早于该日期的commit不输出
+
+        Yields:
+            tuple: (commit_hash, committed_date, parent_hash, changed_files)
+        """
+        if self.workers <= 1:
+            for record in self.git_analyzer.iter_commit_changes(revision):
+                if since_date and datetime.fromtimestamp(record[1]) < since_date:
+                    continue
+                yield record
+            return
+
+        commit_hashes = list(self.git_analyzer.iter_rev_list(since_date=since_date, branch=revision))
+        yield from self.scan(commit_hashes)
+
+    def scan(self, commit_hashes: List[str]) -> Iterator[Tuple]:
+        """
+        扫描指定的commit列表，输出顺序与输入顺序一致
+
+        Args:
+            commit_hashes: commit hash列表
+
+        Yields:
+            tuple: (commit_hash, committed_date, parent_hash, changed_files)
+        """
+        shards = self._split_shards(commit_hashes)
+        if len(shards) <= 1:
+            yield from self.git_analyzer.iter_commit_changes_of(commit_hashes)
+            return
+
+        logger.debug(f"  并行扫描 {len(commit_hashes)} 个commits: "
+                     f"{len(shards)} 个区间, {self.workers} 个workers")
+
+        try:
+            executor = ProcessPoolExecutor(
+                max_workers=min(self.workers, len(shards)),
+                initializer=_init_scan_worker,
+                initargs=(self.git_analyzer.repo_path,)
+            )
+        except PermissionError as e:
+            logger.warning(f"ProcessPool不可用，改为顺序扫描: {e}")
+            yield from self.git_analyzer.iter_commit_changes_of(commit_hashes)
+            return
+
+        with executor:
+            # map按提交顺序返回结果，保证合并后的顺序确定
+            for records in executor.map(_scan_commit_shard, shards):
+                yield from records
+
+    def _split_shards(self, commit_hashes: List[str]) -> List[List[str]]:
+        """将commit列表切分为连续区间"""
+        total = len(commit_hashes)
+        if self.workers <= 1 or total < self.MIN_SHARD_SIZE * 2:
+            return [commit_hashes] if commit_hashes else []
+
+        shard_count = min(self.workers * self.SHARDS_PER_WORKER, total // self.MIN_SHARD_SIZE)
+        shard_size = -(-total // shard_count)
+        return [commit_hashes[i:i + shard_size] for i in range(0, total, shard_size)]
@@ -7,13 +7,15 @@ import json
 from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass, field, asdict
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 
 from config import Config, AnalysisConfig
 from utils.logger import get_logger
-from modules import GitAnalyzer, CommitFilter
+from modules import GitAnalyzer, CommitFilter, IsolatedExecutor, MavenRepository
 from .commit_analyzer import CommitAnalyzer
 from .cache_manager import CacheManager
+from .commit_index import CommitIndex
+from .history_scanner import HistoryScanner
 from .report_generator import ReportGenerator
 
 logger = get_logger()
@@ -44,7 +46,8 @@ class ProjectAnalyzer:
                  workers: int = 4,
                  resume: bool = False,
                  enable_cache: bool = True,
-                 verbose: bool = False):
+                 verbose: bool = False,
+                 scan_mode: str = None):
         """
         初始化项目分析器
         
@@ -55,6 +58,7 @@ class ProjectAnalyzer:
             resume: 是否断点续传
             enable_cache: 是否启用缓存
             verbose: 详细日志
+            scan_mode: Phase 1扫描方式 ('stream', 'bloom')，默认使用AnalysisConfig.PHASE1_SCAN_MODE
         """
         self.project_path = project_path
         self.project_name = os.path.basename(project_path)
@@ -62,6 +66,7 @@ class ProjectAnalyzer:
         self.workers = workers
         self.resume = resume
         self.verbose = verbose
+        self.scan_mode = scan_mode or AnalysisConfig.PHASE1_SCAN_MODE
         
         # 初始化组件
         self.git_analyzer = GitAnalyzer(project_path)
@@ -71,6 +76,17 @@ class ProjectAnalyzer:
             enabled=enable_cache
         )
         self.report_generator = ReportGenerator(output_dir)
+        self.history_scanner = HistoryScanner(self.git_analyzer, workers=workers)
+        
+        # 持久化commit分类索引（与缓存放在同一目录）
+        self.commit_index = None
+        if enable_cache and AnalysisConfig.ENABLE_COMMIT_INDEX:
+            self.commit_index = CommitIndex(
+                db_path=os.path.join(self.cache_manager.cache_dir, 'commit_index.sqlite'),
+                git_analyzer=self.git_analyzer,
+                history_scanner=self.history_scanner
+            )
+        self._commit_index_ready = False
         
         # 创建输出目录
         os.makedirs(output_dir, exist_ok=True)
@@ -137,7 +153,7 @@ class ProjectAnalyzer:
             
             # Phase 2: 方法分析
             logger.info("\n[Phase 2] 方法级分析...")
-            method_analyzed = self._phase2_method_analysis(candidates, sample)
+            method_analyzed = self._phase2_method_analysis(candidates, sample, since_date)
             logger.info(f"  有方法变更的commits: {len(method_analyzed)}")
             
             if phase == 'method':
@@ -148,7 +164,11 @@ class ProjectAnalyzer:
             
             # Phase 3: 执行分析
             logger.info("\n[Phase 3] 执行分析...")
-            execution_results = self._phase3_execution_analysis(method_analyzed)
+            try:
+                execution_results = self._phase3_execution_analysis(method_analyzed)
+            finally:
+                # 删除各worker进程复用的worktree池和原始副本缓存
+                IsolatedExecutor.cleanup_checkout_caches(self.project_path)
             
             # Phase 4: 分类判定
             logger.info("\n[Phase 4] 分类判定...")
@@ -169,6 +189,21 @@ class ProjectAnalyzer:
         """收集项目基本信息"""
         repo = self.git_analyzer.repo
         
+        commit_index = self._get_commit_index()
+        if commit_index:
+            date_range = commit_index.get_date_range()
+            return {
+                'name': self.project_name,
+                'path': self.project_path,
+                'default_branch': repo.active_branch.name if not repo.head.is_detached else 'HEAD',
+                'total_commits': commit_index.count(),
+                'date_range': {
+                    'earliest': date_range['earliest'].strftime('%Y-%m-%d') if date_range['earliest'] else None,
+                    'latest': date_range['latest'].strftime('%Y-%m-%d') if date_range['latest'] else None,
+                    'filter_since': since_date
+                }
+            }
+        
         # 获取所有commits来统计
         all_commits = list(repo.iter_commits('HEAD'))
         
@@ -187,56 +222,148 @@ class ProjectAnalyzer:
             }
         }
     
+    def _get_commit_index(self) -> Optional[CommitIndex]:
+        """获取已更新到HEAD的commit索引（每次分析只更新一次，失败时返回None）"""
+        if self.commit_index is None:
+            return None
+        if not self._commit_index_ready:
+            try:
+                self.commit_index.update()
+                self._commit_index_ready = True
+            except Exception as e:
+                logger.warning(f"commit索引不可用，回退到扫描git历史: {e}")
+                self.commit_index.close()
+                self.commit_index = None
+                return None
+        return self.commit_index
+    
+    @staticmethod
+    def _parse_since_date(since_date: str) -> Optional[datetime]:
+        """解析起始日期 (YYYY-MM-DD)"""
+        if not since_date:
+            return None
+        try:
+            return datetime.strptime(since_date, "%Y-%m-%d")
+        except ValueError:
+            logger.warning(f"无效的日期格式: {since_date}")
+            return None
+    
     def _phase1_quick_scan(self, since_date: str) -> List[str]:
         """
         Phase 1: 快速扫描
         只检查文件变更，筛选同时修改测试和源代码的commits
         """
-        # 解析日期
-        date_filter = None
-        if since_date:
-            try:
-                date_filter = datetime.strptime(since_date, "%Y-%m-%d")
-            except:
-                logger.warning(f"无效的日期格式: {since_date}")
-        
-        # 获取所有commits
-        commits = self.git_analyzer.get_all_commits(since_date=date_filter)
-        self._stats['total_commits'] = len(commits) if not date_filter else self._stats['total_commits']
-        self._stats['after_date_filter'] = len(commits)
-        
-        candidates = []
-        for i, commit in enumerate(commits):
-            if i % 100 == 0:
-                logger.debug(f"  扫描进度: {i}/{len(commits)}")
-            
-            # 获取变更文件
-            changed_files = self.git_analyzer.get_changed_files(commit)
+        return list(self._iter_phase1_candidates(since_date))
+    
+    def _iter_phase1_candidates(self, since_date: str) -> Iterator[str]:
+        """
+        流式产出Phase 1候选commit
+        
+        整个历史只通过一个git log进程扫描，边读边分类，不在内存中保存commit对象
+        """
+        date_filter = self._parse_since_date(since_date)
+        
+        # 显式指定的bloom扫描优先于commit索引（Bloom过滤器不可用时再查询索引）
+        if self.scan_mode == 'bloom':
+            candidates = self._get_bloom_candidates(date_filter)
+            if candidates is not None:
+                yield from self._verify_bloom_candidates(candidates, date_filter)
+                return
+        
+        commit_index = self._get_commit_index()
+        if commit_index:
+            candidates = commit_index.query_candidates(date_filter)
+            if not date_filter:
+                self._stats['total_commits'] = commit_index.count()
+            self._stats['after_date_filter'] = commit_index.count(date_filter)
+            self._stats['has_test_and_source'] = len(candidates)
+            yield from candidates
+            return
+        
+        scanned = 0
+        matched = 0
+        for commit_hash, _, _, changed_files in self.history_scanner.iter_commit_changes(since_date=date_filter):
+            if scanned % 1000 == 0:
+                logger.debug(f"  扫描进度: {scanned}")
+            scanned += 1
             
             # 检查是否同时修改了测试和源代码
             if self.commit_filter.filter_by_file_changes(changed_files):
-                candidates.append(commit.hexsha)
+                matched += 1
+                yield commit_hash
+        
+        if not date_filter:
+            self._stats['total_commits'] = scanned
+        self._stats['after_date_filter'] = scanned
+        self._stats['has_test_and_source'] = matched
+    
+    def _get_bloom_candidates(self, date_filter: Optional[datetime]) -> Optional[List[str]]:
+        """
+        通过pathspec限定的rev-list获取候选commit（测试目录与源代码目录的交集）
+        
+        Returns:
+            候选commit列表（从新到旧），无法构造pathspec时返回None
+        """
+        git_analyzer = self.git_analyzer
+        test_paths = git_analyzer.get_pattern_pathspecs(Config.TEST_PATH_PATTERNS)
+        source_paths = git_analyzer.get_pattern_pathspecs(Config.SOURCE_PATH_PATTERNS)
+        if not test_paths or not source_paths:
+            logger.warning("当前tree中未找到测试/源代码目录，回退到stream扫描")
+            return None
+        
+        git_analyzer.ensure_changed_path_bloom_filters()
+        logger.debug(f"  pathspec: 测试目录 {len(test_paths)} 个, 源代码目录 {len(source_paths)} 个")
+        
+        test_hits = set(git_analyzer.iter_rev_list(test_paths, since_date=date_filter))
+        return [
+            commit_hash
+            for commit_hash in git_analyzer.iter_rev_list(source_paths, since_date=date_filter)
+            if commit_hash in test_hits
+        ]
+    
+    def _verify_bloom_candidates(self, candidates: List[str],
+                                 date_filter: Optional[datetime]) -> Iterator[str]:
+        """
+        用与stream扫描相同的分类规则校验rev-list交集
+        
+        目录级pathspec只是超集（如只修改了非.java文件），需要逐个确认
+        """
+        scanned = sum(1 for _ in self.git_analyzer.iter_rev_list(since_date=date_filter))
         
-        self._stats['has_test_and_source'] = len(candidates)
-        return candidates
+        matched = 0
+        for commit_hash, _, _, changed_files in self.history_scanner.scan(candidates):
+            if self.commit_filter.filter_by_file_changes(changed_files):
+                matched += 1
+                yield commit_hash
+        
+        logger.debug(f"  Bloom候选: {len(candidates)}, 校验通过: {matched}")
+        if not date_filter:
+            self._stats['total_commits'] = scanned
+        self._stats['after_date_filter'] = scanned
+        self._stats['has_test_and_source'] = matched
     
-    def _phase2_method_analysis(self, candidates: List[str], sample: int = None) -> List[dict]:
+    def _phase2_method_analysis(self, candidates: List[str], sample: int = None,
+                                since_date: str = None) -> List[dict]:
         """
         Phase 2: 方法级分析
         分析每个commit的方法变更
         """
         if sample and len(candidates) > sample:
             logger.info(f"  采样 {sample} 个commits")
-            import random
-            candidates = random.sample(candidates, sample)
+            commit_index = self._get_commit_index()
+            if commit_index:
+                candidates = commit_index.query_candidates(
+                    self._parse_since_date(since_date), sample=sample
+                )
+            else:
+                import random
+                candidates = random.sample(candidates, sample)
         
-        analyzed = []
+        results = {}
         
-        for i, commit_hash in enumerate(candidates):
-            if i % 20 == 0:
-                logger.debug(f"  方法分析进度: {i}/{len(candidates)}")
-            
-            # 检查缓存
+        # 过滤已缓存的
+        to_process = []
+        for commit_hash in candidates:
             if self.resume and self.cache_manager.has_cache(
                 self.project_name, commit_hash, 'method'
             ):
@@ -244,38 +371,76 @@ class ProjectAnalyzer:
                     self.project_name, commit_hash, 'method'
                 )
                 if cached and cached.get('data'):
-                    analyzed.append(cached['data'])
+                    results[commit_hash] = cached['data']
                     self._stats['from_cache'] += 1
                     continue
             
-            try:
-                # 创建commit分析器并进行方法分析
-                commit_analyzer = CommitAnalyzer(
-                    repo_path=self.project_path,
-                    output_dir=self.output_dir
-                )
-                
-                method_info = commit_analyzer.analyze_methods(commit_hash)
-                
-                if method_info and method_info.get('has_method_changes'):
-                    analyzed.append(method_info)
-                    
-                    # 缓存结果
-                    self.cache_manager.set_cache(
-                        self.project_name, commit_hash, 'method', method_info
-                    )
-                    
-            except Exception as e:
-                logger.debug(f"  方法分析失败 {commit_hash[:8]}: {e}")
+            to_process.append(commit_hash)
+        
+        for i, (commit_hash, method_info, error) in enumerate(self._iter_method_results(to_process)):
+            if i % 20 == 0:
+                logger.debug(f"  方法分析进度: {i}/{len(to_process)}")
+            
+            if error:
+                logger.debug(f"  方法分析失败 {commit_hash[:8]}: {error}")
                 self._stats['errors'].append({
                     'commit': commit_hash,
                     'phase': 'method_analysis',
-                    'error': str(e)
+                    'error': error
                 })
+                continue
+            
+            if method_info and method_info.get('has_method_changes'):
+                results[commit_hash] = method_info
+                
+                # 缓存结果（逐条写入，中断后 --resume 不会重做已完成的commit）
+                self.cache_manager.set_cache(
+                    self.project_name, commit_hash, 'method', method_info
+                )
+        
+        # 按候选顺序输出，与并发完成顺序无关
+        analyzed = [results[commit_hash] for commit_hash in candidates if commit_hash in results]
         
         self._stats['has_method_changes'] = len(analyzed)
         return analyzed
     
+    def _iter_method_results(self, commit_hashes: List[str]) -> Iterator[tuple]:
+        """
+        执行方法级分析，按输入顺序流式返回结果
+        
+        workers > 1 时在进程池中执行，每个worker只创建一个CommitAnalyzer并复用
+        
+        Yields:
+            tuple: (commit_hash, method_info, error)
+        """
+        if not commit_hashes:
+            return
+        
+        if self.workers > 1 and len(commit_hashes) > 1:
+            # 每个worker约分到8批，兼顾调度开销和负载均衡
+            chunksize = max(1, min(16, len(commit_hashes) // (self.workers * 8)))
+            try:
+                executor = ProcessPoolExecutor(
+                    max_workers=min(self.workers, len(commit_hashes)),
+                    initializer=_init_method_worker,
+                    initargs=(self.project_path, self.output_dir)
+                )
+            except PermissionError as e:
+                logger.warning(f"ProcessPool不可用，改为顺序执行: {e}")
+            else:
+                with executor:
+                    yield from executor.map(
+                        _analyze_commit_methods, commit_hashes, chunksize=chunksize
+                    )
+                return
+        
+        commit_analyzer = CommitAnalyzer(
+            repo_path=self.project_path,
+            output_dir=self.output_dir
+        )
+        for commit_hash in commit_hashes:
+            yield _run_method_analysis(commit_analyzer, commit_hash)
+    
     def _phase3_execution_analysis(self, method_analyzed: List[dict]) -> List[dict]:
         """
         Phase 3: 执行分析
@@ -312,6 +477,9 @@ class ProjectAnalyzer:
         
         if not to_process:
             return results
+        
+        # 预热共享Maven仓库（每个项目一次），之后的构建离线执行
+        MavenRepository.shared().prewarm(self.project_path, to_process[0]['commit_hash'])
 
         def _process_sequential(items: List[dict]) -> List[dict]:
             seq_results = []
@@ -726,6 +894,37 @@ class ProjectAnalyzer:
             logger.debug(f"写入diff失败 {path}: {e}")
 
 
+# worker进程内复用的CommitAnalyzer（由Phase 2进程池initializer创建）
+_worker_commit_analyzer = None
+
+
+def _init_method_worker(repo_path: str, output_dir: str):
+    """Phase 2进程池initializer：每个worker只创建一次CommitAnalyzer"""
+    global _worker_commit_analyzer
+    _worker_commit_analyzer = CommitAnalyzer(
+        repo_path=repo_path,
+        output_dir=output_dir
+    )
+
+
+def _analyze_commit_methods(commit_hash: str) -> tuple:
+    """在worker中分析单个commit的方法变更"""
+    return _run_method_analysis(_worker_commit_analyzer, commit_hash)
+
+
+def _run_method_analysis(commit_analyzer: CommitAnalyzer, commit_hash: str) -> tuple:
+    """
+    执行方法分析，异常转换为错误信息返回，保证结果可跨进程传递
+    
+    Returns:
+        tuple: (commit_hash, method_info, error)
+    """
+    try:
+        return commit_hash, commit_analyzer.analyze_methods(commit_hash), None
+    except Exception as e:
+        return commit_hash, None, str(e)
+
+
 def _process_single_commit_execution(repo_path: str, output_dir: str, method_info: dict) -> dict:
     """
     处理单个commit的执行分析（在独立进程中运行）
@@ -23,6 +23,32 @@ class AnalysisConfig:
     # 单个版本执行时，是否并行执行4个版本
     PARALLEL_VERSION_EXECUTION = True
     
+    # 是否复用worktree：每个worker进程维护一个worktree池，版本之间通过
+    # `git checkout --detach` + `git clean -fdx` 切换（target/一并清除，增量构建见SEED_FROM_PARENT_BUILD）
+    # 关闭时每个版本单独 `git worktree add`，执行完即删除
+    REUSE_WORKTREES = True
+    
+    # 版本检出方式:
+    #   'worktree': git worktree add（配合REUSE_WORKTREES复用）
+    #   'archive': git archive <rev> | tar -x 导出到临时目录，不占用仓库的worktree锁；
+    #              导出目录不是git仓库，且遵循 export-ignore/export-subst 属性
+    #   'reflink': 每个版本导出一份原始副本，执行目录通过 cp --reflink=auto 写时复制
+    #              （btrfs/XFS/APFS上几乎零拷贝，其他文件系统退化为普通复制）
+    CHECKOUT_BACKEND = 'worktree'
+    
+    # 多模块Maven项目是否稀疏检出（仅worktree方式支持）：只检出commit变更的模块、
+    # 其reactor依赖和父模块（cone模式稀疏检出，不修改原始仓库的配置），其余模块只保留pom.xml，
+    # 构建时使用 `-pl <变更模块> -am`；单模块项目或修改根pom.xml时完整检出
+    SPARSE_CHECKOUT = True
+    
+    # ========== 快速扫描配置 ==========
+    # Phase 1扫描方式:
+    #   'stream': 单个git log进程遍历全部commit的变更文件（结果精确）
+    #   'bloom': 借助commit-graph的changed-path Bloom过滤器，分别按测试/源代码目录
+    #            执行rev-list后取交集，再对交集逐个校验（只覆盖当前HEAD中存在的目录）
+    # 'stream'且启用ENABLE_COMMIT_INDEX时Phase 1直接查询索引；'bloom'优先于索引（Bloom过滤器不可用时才查询索引）
+    PHASE1_SCAN_MODE = 'stream'
+    
     # ========== 超时配置 ==========
     # 单次编译超时（秒）
     COMPILE_TIMEOUT = 300  # 5分钟
@@ -33,6 +59,28 @@ class AnalysisConfig:
     # 单个commit总超时（秒）
     COMMIT_TIMEOUT = 1800  # 30分钟
     
+    # ========== 构建配置 ==========
+    # 是否用单次Maven调用（clean test）完成编译和测试，按输出中的阶段边界区分编译失败和测试失败
+    # 关闭时先执行 mvn compile -DskipTests，再执行 clean test（两次JVM启动、两次完整编译）
+    SINGLE_INVOCATION_BUILD = True
+    
+    # 是否从V-1的构建输出增量构建V-0.5和T-0.5：V-1先执行，构建后保存target/的写时复制快照，
+    # V-0.5/T-0.5预置该快照并执行 `test`（不clean），只重新编译patch涉及的模块/文件
+    # 启用后同一commit内V-0.5/T-0.5需等待V-1完成
+    SEED_FROM_PARENT_BUILD = False
+    
+    # ========== Maven仓库配置 ==========
+    # 是否离线构建：Phase 3开始前为项目预热共享仓库（dependency:go-offline，含JaCoCo插件），
+    # 之后Maven调用使用 `-o -nsu`，共享仓库只读（maven.repo.local.tail，需Maven 3.9+），
+    # 每个并发Maven进程写入独立的覆盖仓库；缺少构件时在线重试一次，下载到覆盖仓库
+    MAVEN_OFFLINE = True
+    
+    # 预热的共享本地仓库
+    MAVEN_SHARED_REPO = "./cache/m2/repository"
+    
+    # 各worker覆盖仓库的根目录（worker_<n>，按文件锁租用）
+    MAVEN_OVERLAY_DIR = "./cache/m2/overlays"
+    
     # ========== 覆盖率配置 ==========
     # 覆盖率下降阈值（低于此值判定为Type2）
     COVERAGE_DECREASE_THRESHOLD = 0.02  # 2%
@@ -46,6 +94,32 @@ class AnalysisConfig:
     # 缓存目录
     CACHE_DIR = "./cache/analysis"
     
+    # 是否启用持久化commit分类索引（SQLite，位于 CACHE_DIR/<project>/commit_index.sqlite）
+    # 索引按HEAD增量更新，Phase 1筛选、日期过滤和采样直接查询索引
+    ENABLE_COMMIT_INDEX = True
+    
+    # ========== 解析缓存配置 ==========
+    # Java解析结果（类/方法结构）按blob SHA缓存，内容相同的文件只解析一次
+    # 内存LRU缓存条目数（每个进程）
+    PARSE_CACHE_SIZE = 4096
+    
+    # 是否将解析结果持久化到磁盘（跨worker进程和多次运行复用）
+    PARSE_CACHE_PERSIST = True
+    
+    # 解析结果磁盘缓存目录
+    PARSE_CACHE_DIR = "./cache/parse"
+    
+    # ========== 执行结果缓存配置 ==========
+    # 是否缓存版本的构建/测试结果和JaCoCo报告，键为 源码tree hash + Maven参数 + 选中测试 + JDK
+    # （commit N的V0与commit N+1的V-1相同，patch为空的V-0.5/T-0.5与V-1相同）
+    ENABLE_EXECUTION_CACHE = True
+    
+    # 执行结果缓存目录（没有正在运行的分析时直接删除该目录即可清空缓存）
+    EXECUTION_CACHE_DIR = "./cache/executions"
+    
+    # 执行结果缓存的大小上限（MB，JaCoCo报告gzip压缩存储），超出时删除最久未使用的条目；None表示不限制
+    EXECUTION_CACHE_MAX_MB = 2048
+    
     # ========== 日志配置 ==========
     # 分析日志文件
     ANALYSIS_LOG_FILE = "analysis.log"
@@ -112,6 +186,18 @@ class Config:
     JACOCO_VERSION = "0.8.11"
     JACOCO_REPORT_PATH = "target/site/jacoco/jacoco.xml"
     
+    # JaCoCo注入方式:
+    #   'cli': 在命令行显式执行 jacoco-maven-plugin 的 prepare-agent 和 report goal，不修改pom.xml；
+    #          多模块项目每个模块生成各自的报告，合并为根目录的 JACOCO_REPORT_PATH
+    #   'pom': 每次执行前备份pom.xml，写入JaCoCo插件配置，执行后恢复
+    JACOCO_INJECTION = 'cli'
+    
+    # 是否将JaCoCo限定在变更方法所在的类（含内部类 `$` 形式）：
+    # 'pom'方式在插件配置中写入agent和report的includes；
+    # 'cli'方式（prepare-agent的includes没有命令行属性）不执行prepare-agent，通过 `-DargLine=-javaagent:...,includes=...`
+    # 挂载预热时下载的agent运行时jar，报告在解析时按同一组类过滤；找不到agent jar时退回不限定插桩的prepare-agent
+    JACOCO_SCOPE_TO_CHANGED_CLASSES = True
+    
     # ========== 并行处理配置 ==========
     # 并行worker数量
     PARALLEL_WORKERS = 10
@@ -119,6 +205,9 @@ class Config:
     # 单个commit处理超时（秒）
     PROCESS_TIMEOUT = 900
     
+    # 生成过滤版本时并行处理的commit数（分支只用git底层命令创建，编译验证在独立检出目录中执行）
+    FILTERED_VERSION_WORKERS = 4
+    
     # ========== 高级选项 ==========
     # 是否保存中间结果（支持断点续传）
     SAVE_INTERMEDIATE = True
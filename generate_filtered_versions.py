@@ -81,15 +81,14 @@ def generate_filtered_versions(repo_path, dataset_file, output_file):
     results = []
     
     try:
-        for i, commit_info in enumerate(qualified_commits):
+        # 并行生成过滤版本（仅源代码变更）和测试版本（仅测试代码变更）
+        logger.info(f"并行生成过滤版本 (workers={Config.FILTERED_VERSION_WORKERS})...")
+        generated = version_generator.generate_versions(qualified_commits)
+        
+        for i, (commit_info, (source_result, test_result)) in enumerate(zip(qualified_commits, generated)):
             commit_hash = commit_info['commit_hash']
             logger.info(f"\n处理 [{i+1}/{len(qualified_commits)}]: {commit_hash[:8]}")
             
-            # 生成过滤版本（仅源代码变更）
-            source_result = version_generator.generate_filtered_version(commit_info)
-            # 生成测试版本（仅测试代码变更）
-            test_result = version_generator.generate_test_only_version(commit_info)
-            
             # 构建输出数据
             output_data = {
                 'original_commit': commit_hash,
@@ -210,8 +209,8 @@ def generate_filtered_versions(repo_path, dataset_file, output_file):
         logger.info("=" * 80)
         
     finally:
-        # 恢复原始状态
-        version_generator.restore_original_branch()
+        # 清理编译验证使用的临时检出目录
+        version_generator.close()
 
 
 def main():
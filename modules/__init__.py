@@ -6,13 +6,21 @@ from .git_analyzer import GitAnalyzer
 from .code_analyzer import CodeAnalyzer
 from .change_detector import ChangeDetector
 from .maven_executor import MavenExecutor
-from .coverage_analyzer import CoverageAnalyzer
+from .coverage_analyzer import CoverageAnalyzer, SourceFileCoverage
 from .commit_filter import CommitFilter
 from .dataset_generator import DatasetGenerator
 from .diff_filter import DiffFilter
 from .filtered_version_generator import FilteredVersionGenerator
 from .isolated_executor import IsolatedExecutor
 from .commit_classifier import CommitClassifier
+from .blob_reader import BlobReader
+from .parse_cache import ParseCache
+from .method_index import MethodIndex
+from .worktree_pool import WorktreePool
+from .checkout_backends import CheckoutBackend, create_checkout_backend
+from .maven_reactor import MavenReactor
+from .execution_cache import ExecutionCache
+from .maven_repository import MavenRepository
 
 __all__ = [
     'GitAnalyzer',
@@ -20,10 +28,20 @@ __all__ = [
     'ChangeDetector',
     'MavenExecutor',
     'CoverageAnalyzer',
+    'SourceFileCoverage',
     'CommitFilter',
     'DatasetGenerator',
     'DiffFilter',
     'FilteredVersionGenerator',
     'IsolatedExecutor',
-    'CommitClassifier'
+    'CommitClassifier',
+    'BlobReader',
+    'ParseCache',
+    'MethodIndex',
+    'WorktreePool',
+    'CheckoutBackend',
+    'create_checkout_backend',
+    'MavenReactor',
+    'ExecutionCache',
+    'MavenRepository'
 ]
@@ -0,0 +1,155 @@
+"""
+Blob读取模块 - 通过常驻的 `git cat-file --batch` 进程批量读取文件内容
+"""
+
+import os
+import subprocess
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from utils.logger import get_logger
+from utils.exceptions import GitOperationError
+
+logger = get_logger()
+
+
+class BlobReader:
+    """常驻blob读取器
+
+    每个进程只维护一个 `git cat-file --batch` 子进程，所有 `<rev>:<path>` 查询
+    通过管道流水线发送，避免每次读取文件都重新解析commit和遍历tree。
+    """
+
+    def __init__(self, repo_path: str):
+        """
+        初始化blob读取器
+
+        Args:
+            repo_path: Git仓库路径
+        """
+        self.repo_path = repo_path
+        self._process = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def read(self, rev: str, path: str) -> Optional[Tuple[str, bytes]]:
+        """
+        读取单个文件
+
+        Args:
+            rev: commit/tree hash
+            path: 文件路径
+
+        Returns:
+            tuple or None: (blob_sha, 内容bytes)，文件不存在时返回None
+        """
+        return self.read_many([(rev, path)])[0]
+
+    def read_many(self, specs: Iterable[Tuple[str, str]]) -> List[Optional[Tuple[str, bytes]]]:
+        """
+        流水线批量读取文件
+
+        Args:
+            specs: [(rev, path), ...]
+
+        Returns:
+            list: 与specs一一对应的 (blob_sha, 内容bytes) 或 None
+        """
+        specs = list(specs)
+        if not specs:
+            return []
+
+        request = b''.join(
+            f"{rev}:{path}\n".encode('utf-8') for rev, path in specs
+        )
+
+        with self._lock:
+            try:
+                return self._communicate(request, len(specs))
+            except (BrokenPipeError, OSError, ValueError) as e:
+                # 进程意外退出时重启一次
+                logger.debug(f"cat-file进程异常，重启: {e}")
+                self._close_process()
+                return self._communicate(request, len(specs))
+
+    def close(self):
+        """关闭常驻进程"""
+        with self._lock:
+            self._close_process()
+
+    def _communicate(self, request: bytes, count: int) -> List[Optional[Tuple[str, bytes]]]:
+        """发送请求并按顺序读取响应"""
+        process = self._ensure_process()
+
+        # 在独立线程中写入请求，避免大批量请求时双向管道互相阻塞
+        writer = threading.Thread(target=self._write_request, args=(process, request), daemon=True)
+        writer.start()
+
+        results = []
+        for _ in range(count):
+            header = process.stdout.readline()
+            if not header:
+                raise GitOperationError("cat-file进程提前退出")
+
+            # "<spec> missing" / "<spec> ambiguous"（spec中的路径可能包含空格，只看最后一个字段）
+            fields = header.rstrip(b'\n').rsplit(b' ', 2)
+            if fields[-1] in (b'missing', b'ambiguous'):
+                results.append(None)
+                continue
+
+            sha, obj_type, size = fields
+            data = process.stdout.read(int(size) + 1)[:-1]
+            if obj_type != b'blob':
+                results.append(None)
+                continue
+            results.append((sha.decode('ascii'), data))
+
+        writer.join()
+        return results
+
+    def _write_request(self, process, request: bytes):
+        """写入批量请求"""
+        try:
+            process.stdin.write(request)
+            process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def _ensure_process(self):
+        """获取当前进程可用的cat-file子进程（fork后的子进程会重新启动）"""
+        if self._process is not None and self._pid == os.getpid() and self._process.poll() is None:
+            return self._process
+
+        if self._pid == os.getpid():
+            self._close_process()
+
+        self._process = subprocess.Popen(
+            ['git', 'cat-file', '--batch'],
+            cwd=self.repo_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        self._pid = os.getpid()
+        return self._process
+
+    def _close_process(self):
+        """终止子进程"""
+        process = self._process
+        self._process = None
+        if process is None or self._pid != os.getpid():
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except Exception:
+            process.kill()
+            process.wait()
+        finally:
+            process.stdout.close()
+
+    def __del__(self):
+        try:
+            self._close_process()
+        except Exception:
+            pass
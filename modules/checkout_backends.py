@@ -0,0 +1,449 @@
+"""
+检出策略模块 - 将指定版本的文件树物化到独立目录，供隔离执行器构建和测试
+
+支持三种方式（AnalysisConfig.CHECKOUT_BACKEND）：
+- worktree: `git worktree add`（可复用worktree池）
+- archive: `git archive <rev> | tar -x` 导出到临时目录，不写入仓库的worktree管理信息
+- reflink: 每个版本先导出一份原始副本，再用 `cp --reflink=auto` 写时复制出各个执行目录
+"""
+
+import os
+import re
+import glob
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from git import Git, GitCommandError
+from config import AnalysisConfig
+from utils.logger import get_logger
+from utils.exceptions import ConfigurationError, GitOperationError
+from modules.worktree_pool import WorktreePool, add_worktree
+
+logger = get_logger()
+
+
+class CheckoutBackend:
+    """检出策略基类"""
+
+    name = ''
+
+    # 是否支持只物化部分模块（AnalysisConfig.SPARSE_CHECKOUT）
+    supports_sparse_checkout = False
+
+    def __init__(self, repo_path: str, work_dir: str):
+        """
+        初始化检出策略
+
+        Args:
+            repo_path: 原始仓库路径
+            work_dir: 当前进程的工作目录
+        """
+        self.repo_path = repo_path
+        self.work_dir = work_dir
+        self.project_name = os.path.basename(repo_path)
+
+    def acquire(self, revision: str, label: str, sparse_dirs: Optional[List[str]] = None) -> Optional[str]:
+        """
+        将版本物化到一个独立目录
+
+        Args:
+            revision: commit或tree hash
+            label: 目录名标签（如 "<hash>_v1"）
+            sparse_dirs: cone模式的稀疏检出目录，不支持稀疏检出的策略忽略该参数
+
+        Returns:
+            str or None: 目录路径，失败时返回None
+        """
+        raise NotImplementedError
+
+    def release(self, path: str):
+        """执行完成后归还或删除目录"""
+        raise NotImplementedError
+
+    def close(self):
+        """清理本实例创建的临时目录（进程内共享的池和缓存保留到Phase 3结束）"""
+
+    def _scratch_path(self, label: str) -> str:
+        """生成唯一的临时目录路径"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        return os.path.join(self.work_dir, f"{self.project_name}_{label}_{timestamp}")
+
+
+class WorktreeBackend(CheckoutBackend):
+    """git worktree检出
+
+    启用REUSE_WORKTREES时从进程内的WorktreePool取出并切换版本，
+    否则每个版本单独 `git worktree add`，执行完即删除。
+    """
+
+    name = 'worktree'
+    supports_sparse_checkout = True
+
+    def __init__(self, repo_path: str, work_dir: str):
+        super().__init__(repo_path, work_dir)
+        self.pool = None
+        if AnalysisConfig.REUSE_WORKTREES:
+            self.pool = WorktreePool.for_repo(repo_path, os.path.join(work_dir, 'pool'))
+
+        # 记录创建的临时worktree，用于清理（需要线程安全）
+        self._created: List[str] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, revision: str, label: str, sparse_dirs: Optional[List[str]] = None) -> Optional[str]:
+        if self.pool:
+            return self.pool.acquire(revision, sparse_dirs)
+
+        worktree_path = self._scratch_path(label)
+        try:
+            # 确保路径不存在
+            if os.path.exists(worktree_path):
+                shutil.rmtree(worktree_path)
+            add_worktree(self.repo_path, worktree_path, revision, sparse_dirs)
+        except (GitCommandError, OSError) as e:
+            logger.error(f"创建worktree失败: {e}")
+            self._remove(worktree_path)
+            return None
+
+        with self._lock:
+            self._created.append(worktree_path)
+        logger.debug(f"创建worktree: {worktree_path}")
+        return worktree_path
+
+    def release(self, path: str):
+        if self.pool and self.pool.owns(path):
+            self.pool.release(path)
+        else:
+            self._remove(path)
+
+    def close(self):
+        with self._lock:
+            created = list(self._created)
+        for path in created:
+            self._remove(path)
+
+        # 清理可能遗留的临时worktree（池中的worktree保留到Phase 3结束）
+        git = Git(self.repo_path)
+        try:
+            output = git.worktree('list', '--porcelain')
+            for line in output.split('\n'):
+                if not line.startswith('worktree '):
+                    continue
+                path = line[len('worktree '):].strip()
+                if self.pool and self.pool.owns(path):
+                    continue
+                if self.work_dir in path and self.project_name in path:
+                    self._remove(path)
+        except GitCommandError as e:
+            logger.debug(f"清理遗留worktree失败: {e}")
+
+        try:
+            git.worktree('prune')
+        except GitCommandError:
+            pass
+
+    def _remove(self, worktree_path: str):
+        """删除临时worktree"""
+        try:
+            if os.path.exists(worktree_path):
+                try:
+                    Git(self.repo_path).worktree('remove', '--force', worktree_path)
+                except GitCommandError:
+                    pass
+
+                # 如果还存在，强制删除目录
+                if os.path.exists(worktree_path):
+                    shutil.rmtree(worktree_path, ignore_errors=True)
+
+                logger.debug(f"清理worktree: {worktree_path}")
+        except Exception as e:
+            logger.warning(f"清理worktree失败 {worktree_path}: {e}")
+
+        with self._lock:
+            if worktree_path in self._created:
+                self._created.remove(worktree_path)
+
+
+class ArchiveBackend(CheckoutBackend):
+    """`git archive | tar -x` 导出
+
+    只读取对象库，不获取仓库的worktree锁，也不写入 `.git/worktrees` 管理信息，
+    并行版本之间互不阻塞。导出目录不是git仓库，且遵循 export-ignore/export-subst 属性。
+    """
+
+    name = 'archive'
+
+    def __init__(self, repo_path: str, work_dir: str):
+        super().__init__(repo_path, work_dir)
+        self._created: List[str] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, revision: str, label: str, sparse_dirs: Optional[List[str]] = None) -> Optional[str]:
+        path = self._scratch_path(label)
+        try:
+            export_tree(self.repo_path, revision, path)
+        except (GitOperationError, OSError) as e:
+            logger.error(f"导出版本失败 [{revision[:8]}]: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+
+        with self._lock:
+            self._created.append(path)
+        logger.debug(f"导出版本: {path}")
+        return path
+
+    def release(self, path: str):
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            if path in self._created:
+                self._created.remove(path)
+
+    def close(self):
+        with self._lock:
+            created = list(self._created)
+        for path in created:
+            self.release(path)
+
+
+class ReflinkBackend(ArchiveBackend):
+    """写时复制检出
+
+    每个版本只导出一次原始副本（同一commit的V-1、V-0.5、T-0.5共用父版本），
+    执行目录通过 `cp -a --reflink=auto` 复制：支持reflink的文件系统（btrfs、XFS、APFS）
+    上几乎不占用额外空间，其他文件系统退化为普通复制。
+    """
+
+    name = 'reflink'
+
+    def __init__(self, repo_path: str, work_dir: str):
+        super().__init__(repo_path, work_dir)
+        self.pristine = PristineCache.for_dir(repo_path, os.path.join(work_dir, 'pristine'))
+
+    def acquire(self, revision: str, label: str, sparse_dirs: Optional[List[str]] = None) -> Optional[str]:
+        source = self.pristine.checkout(revision)
+        if not source:
+            return None
+
+        path = self._scratch_path(label)
+        try:
+            copy_tree(source, path)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.error(f"复制版本失败 [{revision[:8]}]: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        finally:
+            self.pristine.release(revision)
+
+        with self._lock:
+            self._created.append(path)
+        logger.debug(f"复制版本: {path}")
+        return path
+
+
+class PristineCache:
+    """按版本缓存的原始导出副本（每个进程一个，LRU淘汰）"""
+
+    # 保留的版本数：当前commit的父版本和子版本，再加上一个相邻commit
+    MAX_ENTRIES = 3
+
+    _caches: Dict[str, 'PristineCache'] = {}
+    _caches_lock = threading.Lock()
+
+    def __init__(self, repo_path: str, cache_dir: str):
+        self.repo_path = repo_path
+        self.cache_dir = cache_dir
+        # revision -> {'path', 'users', 'ready', 'ok'}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_dir(cls, repo_path: str, cache_dir: str) -> 'PristineCache':
+        """获取进程内共享的缓存"""
+        key = os.path.abspath(cache_dir)
+        with cls._caches_lock:
+            cache = cls._caches.get(key)
+            if cache is None:
+                cache = cls(repo_path, key)
+                cls._caches[key] = cache
+            return cache
+
+    @classmethod
+    def close_all(cls):
+        """删除当前进程的所有缓存副本"""
+        with cls._caches_lock:
+            caches = list(cls._caches.values())
+            cls._caches.clear()
+        for cache in caches:
+            shutil.rmtree(cache.cache_dir, ignore_errors=True)
+
+    def checkout(self, revision: str) -> Optional[str]:
+        """
+        获取版本的原始副本（使用完后需调用release）
+
+        Returns:
+            str or None: 副本路径，导出失败时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(revision)
+            creator = entry is None
+            if creator:
+                entry = {
+                    'path': os.path.join(self.cache_dir, revision),
+                    'users': 0,
+                    'ready': threading.Event(),
+                    'ok': False
+                }
+                self._entries[revision] = entry
+            self._entries.move_to_end(revision)
+            entry['users'] += 1
+
+        if creator:
+            try:
+                shutil.rmtree(entry['path'], ignore_errors=True)
+                export_tree(self.repo_path, revision, entry['path'])
+                entry['ok'] = True
+            except (GitOperationError, OSError) as e:
+                logger.error(f"导出原始副本失败 [{revision[:8]}]: {e}")
+            finally:
+                entry['ready'].set()
+        else:
+            entry['ready'].wait()
+
+        if not entry['ok']:
+            self.release(revision)
+            return None
+        return entry['path']
+
+    def release(self, revision: str):
+        """归还副本，超出容量时淘汰未被使用的旧版本"""
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(revision)
+            if entry is not None:
+                entry['users'] -= 1
+                if not entry['ok'] and entry['users'] <= 0:
+                    del self._entries[revision]
+
+            for rev in list(self._entries):
+                if len(self._entries) <= self.MAX_ENTRIES:
+                    break
+                if self._entries[rev]['users'] <= 0:
+                    evicted.append(self._entries.pop(rev)['path'])
+
+        for path in evicted:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def export_tree(repo_path: str, revision: str, dest: str):
+    """
+    将版本的文件树导出到目录（`git archive <rev> | tar -x`）
+
+    Args:
+        repo_path: 仓库路径
+        revision: commit或tree hash
+        dest: 目标目录
+
+    Raises:
+        GitOperationError: 导出失败
+    """
+    os.makedirs(dest, exist_ok=True)
+    archive = subprocess.Popen(
+        ['git', 'archive', '--format=tar', revision],
+        cwd=repo_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    try:
+        untar = subprocess.run(
+            ['tar', '-x', '-f', '-', '-C', dest],
+            stdin=archive.stdout,
+            capture_output=True
+        )
+    finally:
+        archive.stdout.close()
+        archive_stderr = archive.stderr.read()
+        archive.stderr.close()
+        archive.wait()
+
+    if archive.returncode != 0:
+        raise GitOperationError(
+            f"git archive失败: {archive_stderr.decode('utf-8', errors='replace').strip()}"
+        )
+    if untar.returncode != 0:
+        raise GitOperationError(
+            f"tar解包失败: {untar.stderr.decode('utf-8', errors='replace').strip()}"
+        )
+
+
+def copy_tree(source: str, dest: str):
+    """写时复制目录（不支持 `--reflink` 的cp退化为shutil复制）"""
+    try:
+        subprocess.run(
+            ['cp', '-a', '--reflink=auto', source, dest],
+            check=True,
+            capture_output=True
+        )
+    except FileNotFoundError:
+        shutil.copytree(source, dest, symlinks=True)
+    except subprocess.CalledProcessError:
+        if os.path.exists(dest):
+            raise
+        shutil.copytree(source, dest, symlinks=True)
+
+
+CHECKOUT_BACKENDS = {
+    WorktreeBackend.name: WorktreeBackend,
+    ArchiveBackend.name: ArchiveBackend,
+    ReflinkBackend.name: ReflinkBackend,
+}
+
+
+def create_checkout_backend(repo_path: str, work_dir: str, name: Optional[str] = None) -> CheckoutBackend:
+    """
+    按配置创建检出策略
+
+    Args:
+        repo_path: 原始仓库路径
+        work_dir: 当前进程的工作目录
+        name: 策略名称，默认读取AnalysisConfig.CHECKOUT_BACKEND
+
+    Returns:
+        CheckoutBackend: 检出策略实例
+    """
+    name = name or AnalysisConfig.CHECKOUT_BACKEND
+    backend_cls = CHECKOUT_BACKENDS.get(name)
+    if backend_cls is None:
+        raise ConfigurationError(
+            f"未知的检出方式: {name}（可选: {', '.join(CHECKOUT_BACKENDS)}）"
+        )
+    return backend_cls(repo_path, work_dir)
+
+
+def cleanup_checkout_caches(repo_path: str, base_dir: str):
+    """
+    删除所有进程遗留的worktree池和原始副本缓存（Phase 3结束后调用）
+
+    Args:
+        repo_path: 原始仓库路径
+        base_dir: 隔离执行的根工作目录
+    """
+    WorktreePool.close_all()
+    PristineCache.close_all()
+
+    # 进程池worker退出时不会清理各自的池和缓存，按路径规则统一删除
+    base_dir = os.path.abspath(base_dir)
+    project_name = os.path.basename(repo_path)
+    prefix = os.path.join(base_dir, project_name)
+
+    pattern = re.escape(prefix) + r'_\d+' + re.escape(os.sep + 'pool' + os.sep)
+    removed = WorktreePool.remove_matching(repo_path, pattern)
+    if removed:
+        logger.debug(f"清理worktree池: {removed} 个worktree")
+
+    pristine_pattern = re.compile(re.escape(prefix) + r'_\d+' + re.escape(os.sep + 'pristine') + '$')
+    for path in glob.glob(f"{glob.escape(prefix)}_*{os.sep}pristine"):
+        if pristine_pattern.match(path):
+            shutil.rmtree(path, ignore_errors=True)
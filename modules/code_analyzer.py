@@ -4,32 +4,89 @@
 
 import javalang
 import re
+from bisect import bisect_left
 from utils.logger import get_logger
 from utils.exceptions import ParseError
+from .parse_cache import ParseCache, compute_blob_sha
+from .method_index import MethodIndex
 
 logger = get_logger()
 
+# 括号词法：注释、字符串、字符常量整体跳过（未闭合时延续到文件末尾），只对代码区的括号分组
+# 转义符吞掉其后第一个非换行字符（行尾的反斜杠转义下一行首字符）
+_BRACE_LEXER_PATTERN = re.compile(
+    r'//[^\n]*'
+    r'|/\*.*?(?:\*/|\Z)'
+    r'|"[^"\\]*(?:\\\n*(?:[^\n]|\Z)[^"\\]*)*(?:"|\Z)'
+    r"|'[^'\\]*(?:\\\n*(?:[^\n]|\Z)[^'\\]*)*(?:'|\Z)"
+    r'|(?P<open>\{)|(?P<close>\})',
+    re.S
+)
+_NEWLINE_PATTERN = re.compile(r'\n')
+
 
 class CodeAnalyzer:
     """Java代码分析器"""
     
-    def __init__(self):
-        """初始化代码分析器"""
-        pass
+    def __init__(self, parse_cache=None):
+        """
+        初始化代码分析器
+        
+        Args:
+            parse_cache: 解析缓存，默认使用进程内共享缓存
+        """
+        self.parse_cache = parse_cache or ParseCache.shared()
     
-    def parse_java_file(self, file_content):
+    def parse_java_file(self, file_content, blob_sha=None):
         """
         解析Java文件，提取类和方法信息
         
         Args:
             file_content: Java文件内容
+            blob_sha: 文件的blob SHA（已知时传入，省去计算）
             
         Returns:
             dict: {'classes': [{'name': str, 'methods': [{'name': str, 'start_line': int, 'end_line': int}]}]}
         """
+        return {'classes': self.parse_outline(file_content, blob_sha)['classes']}
+    
+    def parse_outline(self, file_content, blob_sha=None):
+        """
+        解析Java文件的包名和类/方法结构（结果按blob SHA缓存）
+        
+        Args:
+            file_content: Java文件内容
+            blob_sha: 文件的blob SHA，为None时根据内容计算
+            
+        Returns:
+            dict: {'package': str, 'classes': [...]}，为共享的缓存对象，调用方不应修改
+        """
+        if not isinstance(file_content, str):
+            return {'package': "", 'classes': []}
+        
+        if blob_sha is None:
+            blob_sha = compute_blob_sha(file_content.encode('utf-8', errors='surrogatepass'))
+        
+        outline = self.parse_cache.get(blob_sha)
+        if outline is None:
+            outline = self._parse_outline(file_content)
+            self.parse_cache.put(blob_sha, outline)
+        return outline
+    
+    def _parse_outline(self, file_content):
+        """实际执行javalang解析"""
         try:
             tree = javalang.parse.parse(file_content)
+        except Exception as e:
+            logger.debug(f"解析Java文件失败: {e}")
+            return {'package': "", 'classes': []}
+        
+        package = tree.package.name if tree.package else ""
+        
+        try:
             classes = []
+            # 整个文件只扫描一次括号，所有类（含嵌套类）的方法共享
+            brace_index = None
             
             for path, node in tree.filter(javalang.tree.ClassDeclaration):
                 # 构建完整的类名（包括外部类）
@@ -47,6 +104,9 @@ class CodeAnalyzer:
                 }
                 
                 # 提取类中的方法
+                if node.methods and brace_index is None:
+                    brace_index = self._build_brace_index(file_content)
+                
                 for idx, method in enumerate(node.methods):
                     start_line = method.position.line if method.position else 0
                     method_info = {
@@ -56,7 +116,7 @@ class CodeAnalyzer:
                     }
                     
                     # 估算方法结束行
-                    end_line = self._estimate_method_end_line(file_content, start_line)
+                    end_line = self._estimate_method_end_line(file_content, start_line, brace_index)
                     
                     # 如果无法确定结束行，使用下一个方法的开始行作为参考
                     if end_line is None:
@@ -65,131 +125,84 @@ class CodeAnalyzer:
                             end_line = node.methods[idx + 1].position.line - 1
                         else:
                             # 最后的方法，使用文件总行数
-                            end_line = len(file_content.split('\n'))
+                            end_line = brace_index[2]
                     
                     method_info['end_line'] = end_line
                     class_info['methods'].append(method_info)
                 
                 classes.append(class_info)
             
-            return {'classes': classes}
+            return {'package': package, 'classes': classes}
         
         except Exception as e:
             logger.debug(f"解析Java文件失败: {e}")
-            return {'classes': []}
+            return {'package': package, 'classes': []}
     
-    def _estimate_method_end_line(self, file_content, start_line):
+    def _estimate_method_end_line(self, file_content, start_line, brace_index=None):
         """
-        估算方法的结束行号，使用状态机跳过字符串和注释中的括号
+        估算方法的结束行号：方法起始行及之后的第一个代码区'{'所匹配的'}'所在行
         
         Args:
             file_content: 文件内容
             start_line: 方法开始行号
+            brace_index: _build_brace_index的结果，同一文件的多个方法共享，为None时现场构建
             
         Returns:
             int or None: 估算的结束行号，无法确定时返回None
         """
-        lines = file_content.split('\n')
-        if start_line >= len(lines) or start_line < 1:
+        if brace_index is None:
+            brace_index = self._build_brace_index(file_content)
+        open_lines, close_lines, line_count = brace_index
+        
+        if start_line >= line_count or start_line < 1:
+            return None
+        
+        idx = bisect_left(open_lines, start_line)
+        if idx == len(open_lines):
             return None
         
-        brace_stack = []  # 使用栈追踪括号
-        found_first_brace = False
+        # 括号未闭合时返回None让上层处理
+        return close_lines[idx]
+    
+    def _build_brace_index(self, file_content):
+        """
+        单次扫描文件，记录代码区域中每个'{'及其匹配'}'所在的行号
+        
+        词法规则与原逐方法扫描的状态机一致：跳过字符串、字符常量、
+        单行注释和多行注释中的括号，未闭合的字符串/注释延续到文件末尾。
+        
+        Args:
+            file_content: 文件内容
+            
+        Returns:
+            tuple: (open_lines, close_lines, line_count)
+                open_lines: 按出现顺序排列的'{'行号（非递减）
+                close_lines: 与open_lines对应的匹配'}'行号，未闭合为None
+                line_count: 文件总行数
+        """
+        newline_offsets = [m.start() for m in _NEWLINE_PATTERN.finditer(file_content)]
         
-        # 状态追踪
-        in_string = False       # 在字符串中 "..."
-        in_char = False         # 在字符中 '...'
-        in_single_comment = False  # 在单行注释中 //
-        in_multi_comment = False   # 在多行注释中 /* */
-        escape_next = False     # 下一个字符是转义字符
+        open_lines = []
+        close_lines = []
+        stack = []
         
-        for line_idx in range(start_line - 1, len(lines)):
-            line = lines[line_idx]
-            in_single_comment = False  # 每行重置单行注释状态
+        for match in _BRACE_LEXER_PATTERN.finditer(file_content):
+            kind = match.lastgroup
+            if kind is None:
+                # 注释、字符串、字符常量
+                continue
             
-            i = 0
-            while i < len(line):
-                char = line[i]
-                next_char = line[i + 1] if i + 1 < len(line) else ''
-                
-                # 处理转义字符
-                if escape_next:
-                    escape_next = False
-                    i += 1
-                    continue
-                
-                if char == '\\' and (in_string or in_char):
-                    escape_next = True
-                    i += 1
-                    continue
-                
-                # 处理多行注释结束
-                if in_multi_comment:
-                    if char == '*' and next_char == '/':
-                        in_multi_comment = False
-                        i += 2
-                        continue
-                    i += 1
-                    continue
-                
-                # 处理单行注释
-                if in_single_comment:
-                    i += 1
-                    continue
-                
-                # 处理字符串
-                if in_string:
-                    if char == '"':
-                        in_string = False
-                    i += 1
-                    continue
-                
-                # 处理字符常量
-                if in_char:
-                    if char == "'":
-                        in_char = False
-                    i += 1
-                    continue
-                
-                # 检测注释开始
-                if char == '/' and next_char == '/':
-                    in_single_comment = True
-                    i += 2
-                    continue
-                
-                if char == '/' and next_char == '*':
-                    in_multi_comment = True
-                    i += 2
-                    continue
-                
-                # 检测字符串/字符开始
-                if char == '"':
-                    in_string = True
-                    i += 1
-                    continue
-                
-                if char == "'":
-                    in_char = True
-                    i += 1
-                    continue
-                
-                # 处理括号（只有在代码区域才计数）
-                if char == '{':
-                    brace_stack.append('{')
-                    found_first_brace = True
-                elif char == '}':
-                    if brace_stack:
-                        brace_stack.pop()
-                    # 当找到第一个括号后，栈空表示方法结束
-                    if found_first_brace and len(brace_stack) == 0:
-                        return line_idx + 1  # 返回1-indexed行号
-                
-                i += 1
+            line = bisect_left(newline_offsets, match.start()) + 1
+            if kind == 'open':
+                stack.append(len(open_lines))
+                open_lines.append(line)
+                close_lines.append(None)
+            elif stack:
+                close_lines[stack.pop()] = line
         
-        # 无法确定结束行，返回None让上层处理
-        return None
+        return open_lines, close_lines, len(newline_offsets) + 1
     
-    def get_methods_in_range(self, classes_info, start_line, end_line):
+    def get_methods_in_range(self, classes_info, start_line, end_line, method_index=None):
         """
         获取指定行范围内的方法
         
@@ -197,29 +210,43 @@ class CodeAnalyzer:
             classes_info: 类信息字典
             start_line: 起始行
             end_line: 结束行
+            method_index: build_method_index构建的索引，同一文件多次查询时传入以复用
             
         Returns:
             list: 方法信息列表
         """
-        methods = []
+        if method_index is None:
+            method_index = self.build_method_index(classes_info)
         
-        for class_info in classes_info.get('classes', []):
-            for method in class_info['methods']:
-                method_start = method['start_line']
-                method_end = method['end_line']
-                
-                # 检查方法是否与指定范围有重叠
-                if self._ranges_overlap(method_start, method_end, start_line, end_line):
-                    methods.append({
-                        'class': class_info['name'],
-                        'method': method['name'],
-                        'parameters': method.get('parameters', []),
-                        'start_line': method_start,
-                        'end_line': method_end
-                    })
+        methods = []
+        for class_info, method in method_index.overlapping(start_line, end_line):
+            methods.append({
+                'class': class_info['name'],
+                'method': method['name'],
+                'parameters': method.get('parameters', []),
+                'start_line': method['start_line'],
+                'end_line': method['end_line']
+            })
         
         return methods
     
+    def build_method_index(self, classes_info):
+        """
+        为解析结果构建方法区间索引
+        
+        Args:
+            classes_info: 类信息字典
+            
+        Returns:
+            MethodIndex: 元素为 (class_info, method) 的区间索引
+        """
+        return MethodIndex(
+            [(class_info, method)
+             for class_info in classes_info.get('classes', [])
+             for method in class_info['methods']],
+            key=lambda pair: (pair[1]['start_line'], pair[1]['end_line'])
+        )
+    
     def _ranges_overlap(self, start1, end1, start2, end2):
         """检查两个范围是否有重叠"""
         return not (end1 < start2 or end2 < start1)
@@ -259,19 +286,19 @@ class CodeAnalyzer:
             logger.debug(f"提取测试方法失败: {e}")
             return []
     
-    def get_package_name(self, file_content):
+    def get_package_name(self, file_content, blob_sha=None):
         """
         获取Java文件的包名
         
         Args:
             file_content: Java文件内容
+            blob_sha: 文件的blob SHA（可选）
             
         Returns:
             str: 包名
         """
         try:
-            tree = javalang.parse.parse(file_content)
-            return tree.package.name if tree.package else ""
+            return self.parse_outline(file_content, blob_sha)['package']
         except:
             return ""
     
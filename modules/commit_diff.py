@@ -0,0 +1,371 @@
+"""
+Commit Diff模块 - 一次生成commit的完整diff，并按文件建立偏移索引供各模块共享
+"""
+
+import re
+from array import array
+
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class DiffHunk:
+    """单个hunk：hunk头中的起始行/行数，以及增删行号（array('I')）"""
+
+    __slots__ = ('source_start', 'source_length', 'target_start', 'target_length',
+                 'added_lines', 'removed_lines')
+
+    def __init__(self, source_start, source_length, target_start, target_length,
+                 added_lines, removed_lines):
+        self.source_start = source_start
+        self.source_length = source_length
+        self.target_start = target_start
+        self.target_length = target_length
+        self.added_lines = added_lines
+        self.removed_lines = removed_lines
+
+
+class CommitDiff:
+    """单个commit的完整unified diff
+
+    只保存一份diff文本，记录每个文件段在文本中的起止偏移，
+    ChangeDetector、DiffFilter以及方法统计都通过切片读取单文件diff，
+    不再为每个文件单独调用 `git diff`。
+
+    hunk解析也在这里统一完成：按偏移流式扫描原始文本，增删行号存入共享的
+    array('I')，不再为每个文件生成行列表。
+    """
+
+    FILE_HEADER = 'diff --git '
+    _PATH_PATTERN = re.compile(r'diff --git a/(.*?) b/')
+    _HUNK_PATTERN = re.compile(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+    # 每个hunk在 _hunk_records 中占用的字段数：
+    # source_start, source_length, target_start, target_length,
+    # added_begin, added_end, removed_begin, removed_end
+    _HUNK_FIELDS = 8
+
+    # hunk内同类行连续段的结束位置：下一行不再以该字符开头
+    _RUN_END_PATTERNS = {
+        '+': re.compile(r'\n(?!\+)'),
+        '-': re.compile(r'\n(?!-)'),
+        ' ': re.compile(r'\n(?! )'),
+    }
+
+    def __init__(self, text):
+        """
+        初始化并建立文件索引
+
+        Args:
+            text: 完整的diff文本
+        """
+        self.text = text or ''
+        # [(a_path, b_path, start, end), ...]
+        self._entries = []
+        # path -> entries下标（新旧路径都可查询）
+        self._by_path = {}
+        self._build_index()
+
+        # hunk索引按文件惰性建立，所有文件共用同一组紧凑数组
+        # _file_hunks[idx] = (hunk_begin, hunk_end, is_new, is_deleted)
+        self._file_hunks = [None] * len(self._entries)
+        self._hunk_records = array('I')
+        self._added = array('I')
+        self._removed = array('I')
+
+    @classmethod
+    def coerce(cls, diff):
+        """将diff文本或CommitDiff统一转换为CommitDiff"""
+        if isinstance(diff, cls):
+            return diff
+        return cls(diff)
+
+    def _build_index(self):
+        """扫描文件头，记录每个文件段的偏移"""
+        text = self.text
+        header = self.FILE_HEADER
+
+        starts = []
+        pos = 0 if text.startswith(header) else text.find('\n' + header)
+        if pos > 0:
+            pos += 1
+        while pos != -1:
+            starts.append(pos)
+            pos = text.find('\n' + header, pos + 1)
+            if pos != -1:
+                pos += 1
+
+        for idx, start in enumerate(starts):
+            end = starts[idx + 1] if idx + 1 < len(starts) else len(text)
+            line_end = text.find('\n', start, end)
+            header_line = text[start:line_end if line_end != -1 else end]
+
+            # 无法解析路径的文件段（如带引号的特殊路径）与原有实现一致地跳过
+            match = self._PATH_PATTERN.match(header_line)
+            if not match:
+                continue
+            a_path = match.group(1)
+            b_path = header_line[match.end():] or a_path
+
+            self._by_path.setdefault(b_path, len(self._entries))
+            self._by_path.setdefault(a_path, len(self._entries))
+            self._entries.append((a_path, b_path, start, end))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self.text)
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def paths(self):
+        """所有文件的新路径"""
+        return [entry[1] for entry in self._entries]
+
+    def file_diff(self, file_path):
+        """
+        获取单个文件的diff切片
+
+        Args:
+            file_path: 文件路径（新路径或旧路径）
+
+        Returns:
+            str: 该文件的diff文本，不存在时返回空字符串
+        """
+        idx = self._by_path.get(file_path)
+        if idx is None:
+            return ""
+        _, _, start, end = self._entries[idx]
+        return self.text[start:end]
+
+    def iter_files(self):
+        """
+        按顺序遍历文件段
+
+        Yields:
+            tuple: (file_diff, a_path, b_path)
+        """
+        text = self.text
+        for a_path, b_path, start, end in self._entries:
+            yield text[start:end], a_path, b_path
+
+    # ========== hunk索引 ==========
+
+    def _iter_hunk_lines(self, start, end):
+        """
+        流式遍历文件段中的hunk行
+
+        按偏移在原始文本上移动，不切分整段文本。连续的同类行（如整段新增的文件）
+        作为一段输出，段内行数由 str.count 统计。hunk的范围由hunk头中的行数界定，
+        因此内容以 '++'/'--' 开头的增删行（如 `++i;`）也能正确计数。
+
+        Args:
+            start: 文件段起始偏移
+            end: 文件段结束偏移
+
+        Yields:
+            tuple: (kind, value, count, run_start, run_end)
+                - ('@', hunk头match, 0, 行起始, 行结束)
+                - ('+', 新版本起始行号, 行数, 段起始, 段结束)
+                - ('-', 旧版本起始行号, 行数, 段起始, 段结束)
+        """
+        text = self.text
+        hunk_pattern = self._HUNK_PATTERN
+        run_patterns = self._RUN_END_PATTERNS
+        source_left = target_left = 0
+        source_no = target_no = 0
+
+        pos = start
+        while pos < end:
+            first = text[pos]
+
+            if (source_left > 0 or target_left > 0) and first in run_patterns:
+                match = run_patterns[first].search(text, pos, end)
+                run_end = match.start() if match else end
+                count = text.count('\n', pos, run_end) + 1
+
+                if first == '+':
+                    limit = target_left
+                elif first == '-':
+                    limit = source_left
+                else:
+                    limit = min(source_left, target_left)
+                if count > limit:
+                    # 行数超出hunk头声明的范围，只取声明范围内的行
+                    count = max(limit, 1)
+                    run_end = pos
+                    for _ in range(count):
+                        run_end = text.find('\n', run_end, end) + 1 or end + 1
+                    run_end -= 1
+
+                if first == '+':
+                    yield '+', target_no, count, pos, run_end
+                    target_no += count
+                    target_left -= count
+                elif first == '-':
+                    yield '-', source_no, count, pos, run_end
+                    source_no += count
+                    source_left -= count
+                else:
+                    source_no += count
+                    target_no += count
+                    source_left -= count
+                    target_left -= count
+                pos = run_end + 1
+                continue
+
+            line_end = text.find('\n', pos, end)
+            if line_end == -1:
+                line_end = end
+
+            if first == '\n' and (source_left > 0 or target_left > 0):
+                # 空的上下文行（部分工具会去掉空行前的空格）
+                source_no += 1
+                target_no += 1
+                source_left -= 1
+                target_left -= 1
+            elif first == '@':
+                match = hunk_pattern.match(text, pos, line_end)
+                if match:
+                    source_no = int(match.group(1))
+                    source_left = int(match.group(2)) if match.group(2) else 1
+                    target_no = int(match.group(3))
+                    target_left = int(match.group(4)) if match.group(4) else 1
+                    yield '@', match, 0, pos, line_end
+
+            pos = line_end + 1
+
+    def _parse_file(self, idx):
+        """解析单个文件段的hunk，结果追加到共享数组中"""
+        info = self._file_hunks[idx]
+        if info is not None:
+            return info
+
+        _, _, start, end = self._entries[idx]
+        records = self._hunk_records
+        added = self._added
+        removed = self._removed
+        fields = self._HUNK_FIELDS
+
+        hunk_begin = len(records) // fields
+        header_end = end
+        current = -1
+
+        for kind, value, count, line_start, _ in self._iter_hunk_lines(start, end):
+            if kind == '+':
+                added.extend(range(value, value + count))
+            elif kind == '-':
+                removed.extend(range(value, value + count))
+            else:
+                if current < 0:
+                    header_end = line_start
+                else:
+                    records[current + 5] = len(added)
+                    records[current + 7] = len(removed)
+                current = len(records)
+                records.extend((
+                    int(value.group(1)),
+                    int(value.group(2)) if value.group(2) else 1,
+                    int(value.group(3)),
+                    int(value.group(4)) if value.group(4) else 1,
+                    len(added), 0, len(removed), 0
+                ))
+
+        if current >= 0:
+            records[current + 5] = len(added)
+            records[current + 7] = len(removed)
+
+        text = self.text
+        info = (
+            hunk_begin,
+            len(records) // fields,
+            text.find('new file mode', start, header_end) != -1,
+            text.find('deleted file mode', start, header_end) != -1
+        )
+        self._file_hunks[idx] = info
+        return info
+
+    def _build_hunks(self, idx):
+        """将文件段的hunk记录转换为DiffHunk列表"""
+        hunk_begin, hunk_end, _, _ = self._parse_file(idx)
+        records = self._hunk_records
+        fields = self._HUNK_FIELDS
+        hunks = []
+        for offset in range(hunk_begin * fields, hunk_end * fields, fields):
+            hunks.append(DiffHunk(
+                records[offset],
+                records[offset + 1],
+                records[offset + 2],
+                records[offset + 3],
+                self._added[records[offset + 4]:records[offset + 5]],
+                self._removed[records[offset + 6]:records[offset + 7]]
+            ))
+        return hunks
+
+    def file_hunks(self, file_path):
+        """
+        获取单个文件的hunk列表
+
+        Args:
+            file_path: 文件路径（新路径或旧路径）
+
+        Returns:
+            list: DiffHunk列表，文件不存在时返回空列表
+        """
+        idx = self._by_path.get(file_path)
+        if idx is None:
+            return []
+        return self._build_hunks(idx)
+
+    def iter_hunks(self):
+        """
+        按顺序遍历每个文件的hunk
+
+        Yields:
+            tuple: (a_path, b_path, [DiffHunk, ...])
+        """
+        for idx, (a_path, b_path, _, _) in enumerate(self._entries):
+            yield a_path, b_path, self._build_hunks(idx)
+
+    def iter_file_stats(self):
+        """
+        按顺序遍历每个文件的增删行统计
+
+        Yields:
+            tuple: (a_path, b_path, lines_added, lines_removed, is_new, is_deleted)
+        """
+        records = self._hunk_records
+        fields = self._HUNK_FIELDS
+        for idx, (a_path, b_path, _, _) in enumerate(self._entries):
+            hunk_begin, hunk_end, is_new, is_deleted = self._parse_file(idx)
+            lines_added = lines_removed = 0
+            if hunk_end > hunk_begin:
+                first = hunk_begin * fields
+                last = (hunk_end - 1) * fields
+                lines_added = records[last + 5] - records[first + 4]
+                lines_removed = records[last + 7] - records[first + 6]
+            yield a_path, b_path, lines_added, lines_removed, is_new, is_deleted
+
+    def iter_changed_lines(self):
+        """
+        按顺序遍历所有增删行的内容（不含 '+'/'-' 前缀）
+
+        Yields:
+            tuple: (kind, line_text)，kind为 '+' 或 '-'
+        """
+        text = self.text
+        for _, _, start, end in self._entries:
+            for kind, _, _, run_start, run_end in self._iter_hunk_lines(start, end):
+                if kind == '@':
+                    continue
+                line_start = run_start
+                while line_start < run_end:
+                    line_end = text.find('\n', line_start, run_end)
+                    if line_end == -1:
+                        line_end = run_end
+                    yield kind, text[line_start + 1:line_end]
+                    line_start = line_end + 1
@@ -3,13 +3,80 @@
 """
 
 import os
+import gzip
+import bisect
 import xml.etree.ElementTree as ET
+from array import array
 from utils.logger import get_logger
 from utils.exceptions import CoverageError
 
 logger = get_logger()
 
 
+class SourceFileCoverage:
+    """单个源文件的行/分支覆盖数据（紧凑表示）
+
+    - lines: 插桩行号（升序，array('I')）
+    - covered: 与lines对齐的覆盖标记（bytearray，0/1）
+    - branch_lines / branch_covered / branch_total: 有分支的行及其覆盖/总分支数（array('I')）
+
+    方法行范围查询通过二分定位切片后在切片上计数，不逐行做成员测试；
+    pickle时数组按原始字节序列化。
+    """
+
+    __slots__ = ('source_file', 'lines', 'covered', 'branch_lines', 'branch_covered', 'branch_total')
+
+    def __init__(self, source_file, lines, covered, branch_lines=(), branch_covered=(), branch_total=()):
+        """
+        初始化源文件覆盖数据
+
+        Args:
+            source_file: 源文件名
+            lines: 插桩行号（升序）
+            covered: 与lines对齐的覆盖标记
+            branch_lines: 有分支的行号（升序）
+            branch_covered: 与branch_lines对齐的已覆盖分支数
+            branch_total: 与branch_lines对齐的总分支数
+        """
+        self.source_file = source_file
+        self.lines = array('I', lines)
+        self.covered = bytearray(covered)
+        self.branch_lines = array('I', branch_lines)
+        self.branch_covered = array('I', branch_covered)
+        self.branch_total = array('I', branch_total)
+
+    def __reduce__(self):
+        return (self.__class__, (
+            self.source_file, self.lines, bytes(self.covered),
+            self.branch_lines, self.branch_covered, self.branch_total
+        ))
+
+    @staticmethod
+    def _slice(index, start_line, end_line):
+        """行号在 [start_line, end_line] 内的元素下标范围"""
+        lo = bisect.bisect_left(index, start_line)
+        return lo, max(lo, bisect.bisect_right(index, end_line))
+
+    def has_covered_line(self, start_line, end_line):
+        """行范围内是否有被覆盖的行"""
+        lo, hi = self._slice(self.lines, start_line, end_line)
+        return lo < hi and 1 in self.covered[lo:hi]
+
+    def line_counts(self, start_line, end_line):
+        """行范围内的 (覆盖行数, 插桩行数)"""
+        lo, hi = self._slice(self.lines, start_line, end_line)
+        return self.covered.count(1, lo, hi), hi - lo
+
+    def branch_counts(self, start_line, end_line):
+        """行范围内的 (覆盖分支数, 总分支数)"""
+        lo, hi = self._slice(self.branch_lines, start_line, end_line)
+        return sum(self.branch_covered[lo:hi]), sum(self.branch_total[lo:hi])
+
+    def covered_lines(self):
+        """被覆盖的行号集合"""
+        return {line for line, flag in zip(self.lines, self.covered) if flag}
+
+
 class CoverageAnalyzer:
     """覆盖率分析器"""
     
@@ -17,95 +84,92 @@ class CoverageAnalyzer:
         """初始化覆盖率分析器"""
         pass
     
-    def parse_jacoco_report(self, report_path):
+    def parse_jacoco_report(self, report_path, include_classes=None):
         """
-        解析JaCoCo XML报告
+        流式解析JaCoCo XML报告（iterparse），只构建需要的源文件的行数据
+        
+        每个源文件/类元素处理完立即清空，已处理的package从根元素移除，
+        内存占用与单个package的大小有关，而不是整个报告。
         
         Args:
-            report_path: JaCoCo报告文件路径
+            report_path: JaCoCo报告文件路径（.gz结尾时按gzip解压）
+            include_classes: 需要的类（"包名.类名"），匹配源文件名或JaCoCo的class元素
+                （内部类按外部类匹配，同一源文件中的其他顶层类映射到所在源文件）；None表示全部
             
         Returns:
-            dict: 覆盖率数据 {'classes': {'pkg.ClassName': {covered_lines: set()}}}
+            dict: 覆盖率数据 {'classes': {'pkg.ClassName': SourceFileCoverage}, 'summary': {}}
         """
         try:
             if not os.path.exists(report_path):
                 logger.error(f"JaCoCo报告不存在: {report_path}")
                 return None
             
-            tree = ET.parse(report_path)
-            root = tree.getroot()
-            
             coverage_data = {
                 'classes': {},
                 'summary': {}
             }
-
-            # Overall coverage summary from report-level counters (preferred)
-            line_counter = None
-            for counter in root.findall('counter'):
-                if counter.get('type') == 'LINE':
-                    line_counter = counter
-                    break
-
-            if line_counter is not None:
-                try:
-                    missed = int(line_counter.get('missed', 0))
-                    covered = int(line_counter.get('covered', 0))
-                    coverage_data['summary']['line'] = {
-                        'missed': missed,
-                        'covered': covered,
-                        'total': missed + covered
-                    }
-                except Exception:
-                    # Keep summary empty if parsing fails
-                    pass
             
-            # 遍历所有package
-            for package in root.findall('.//package'):
-                package_name = package.get('name', '').replace('/', '.')
+            if include_classes is not None:
+                include_classes = set(include_classes)
+                include_packages = {name.rsplit('.', 1)[0] for name in include_classes}
+            
+            # 从根元素到当前元素的路径
+            stack = []
+            package_name = None
+            skip_package = False
+            # 当前package中需要解析的源文件（由匹配的class元素的sourcefilename得到）
+            wanted_sources = set()
+            
+            # 执行结果缓存中的报告以gzip压缩存储，边解压边解析
+            opener = gzip.open if report_path.endswith('.gz') else open
+            with opener(report_path, 'rb') as source:
+                for event, element in ET.iterparse(source, events=('start', 'end')):
+                    tag = element.tag
+                    if event == 'start':
+                        stack.append(element)
+                        if tag == 'package':
+                            package_name = element.get('name', '').replace('/', '.')
+                            skip_package = include_classes is not None and package_name not in include_packages
+                            wanted_sources = set()
+                        continue
+                
+                    stack.pop()
+                    if tag == 'counter':
+                        # Overall coverage summary from report-level counters (preferred)
+                        if len(stack) == 1 and element.get('type') == 'LINE' and 'line' not in coverage_data['summary']:
+                            try:
+                                missed = int(element.get('missed', 0))
+                                covered = int(element.get('covered', 0))
+                                coverage_data['summary']['line'] = {
+                                    'missed': missed,
+                                    'covered': covered,
+                                    'total': missed + covered
+                                }
+                            except Exception:
+                                # Keep summary empty if parsing fails
+                                pass
+                
+                    elif tag == 'class':
+                        if not skip_package and include_classes is not None:
+                            # JaCoCo类名: pkg/Outer$Inner，按外部类匹配
+                            class_name = element.get('name', '').split('$', 1)[0].replace('/', '.')
+                            if '.' not in class_name:
+                                class_name = f".{class_name}"
+                            if class_name in include_classes and element.get('sourcefilename'):
+                                wanted_sources.add(element.get('sourcefilename'))
+                        element.clear()
                 
-                # 遍历package中的sourcefile
-                for sourcefile in package.findall('sourcefile'):
-                    source_name = sourcefile.get('name', '')
-                    # 尝试推断类名 (简化处理：假设类名与文件名一致)
-                    class_simple_name = source_name.replace('.java', '')
-                    full_class_name = f"{package_name}.{class_simple_name}"
-                    
-                    covered_lines = set()
-                    line_status = {}
-                    branch_status = {}
-                    instrumented_lines = set()
-                    for line in sourcefile.findall('line'):
-                        nr = int(line.get('nr', 0))
-                        ci = int(line.get('ci', 0))
-                        mi = int(line.get('mi', 0))
-                        cb = int(line.get('cb', 0))
-                        mb = int(line.get('mb', 0))
-                        if ci + mi == 0:
-                            continue
-                        instrumented_lines.add(nr)
-                        is_covered = ci > 0
-                        line_status[nr] = is_covered
-                        if cb + mb > 0:
-                            branch_status[nr] = {
-                                'covered': cb,
-                                'total': cb + mb
-                            }
-                        if is_covered:
-                            covered_lines.add(nr)
-                    
-                    if covered_lines:
-                        coverage_data['classes'][full_class_name] = {
-                            'source_file': source_name,
-                            'covered_lines': covered_lines,
-                            'line_status': line_status,
-                            'branch_status': branch_status,
-                            'instrumented_lines': instrumented_lines
-                        }
-                        
-                        # 同时也尝试匹配可能的内部类或其他类名
-                        # 在JaCoCo中，class元素和sourcefile元素是兄弟，但我们这里主要关心行覆盖
-                        # 为了兼容性，我们也可以遍历class元素来获取更精确的类名映射，但行信息只在sourcefile里
+                    elif tag == 'sourcefile':
+                        if not skip_package:
+                            self._parse_sourcefile(element, package_name, include_classes, wanted_sources,
+                                                   coverage_data['classes'])
+                        element.clear()
+                
+                    elif tag in ('package', 'sessioninfo'):
+                        # 释放已处理的package（位于report或group下）
+                        stack[-1].remove(element)
+                        package_name = None
+                        skip_package = False
             
             logger.debug(f"成功解析JaCoCo报告: {report_path}")
             return coverage_data
@@ -113,6 +177,88 @@ class CoverageAnalyzer:
         except Exception as e:
             logger.error(f"解析JaCoCo报告失败 [{report_path}]: {e}")
             return None
+    
+    @staticmethod
+    def _parse_sourcefile(sourcefile, package_name, include_classes, wanted_sources, classes):
+        """解析单个sourcefile元素的行覆盖数据，写入classes"""
+        source_name = sourcefile.get('name', '')
+        # 尝试推断类名 (简化处理：假设类名与文件名一致)
+        class_simple_name = source_name.replace('.java', '')
+        full_class_name = f"{package_name}.{class_simple_name}"
+        if (include_classes is not None and full_class_name not in include_classes
+                and source_name not in wanted_sources):
+            return
+        
+        lines = []
+        branches = []
+        for line in sourcefile.iter('line'):
+            nr = int(line.get('nr', 0))
+            ci = int(line.get('ci', 0))
+            mi = int(line.get('mi', 0))
+            cb = int(line.get('cb', 0))
+            mb = int(line.get('mb', 0))
+            if ci + mi == 0:
+                continue
+            lines.append((nr, 1 if ci > 0 else 0))
+            if cb + mb > 0:
+                branches.append((nr, cb, cb + mb))
+        
+        if any(flag for _, flag in lines):
+            # JaCoCo按行号升序输出，排序只是保证二分查找的前提
+            lines.sort()
+            branches.sort()
+            classes[full_class_name] = SourceFileCoverage(
+                source_name,
+                [nr for nr, _ in lines],
+                [flag for _, flag in lines],
+                [nr for nr, _, _ in branches],
+                [covered for _, covered, _ in branches],
+                [total for _, _, total in branches]
+            )
+
+    @staticmethod
+    def merge_jacoco_reports(report_paths, output_path):
+        """
+        合并多个模块的JaCoCo XML报告（命令行注入JaCoCo时每个模块单独生成报告）
+        
+        各模块的package元素依次放入同一个report元素，报告级counter按类型求和。
+        
+        Args:
+            report_paths: 模块报告路径列表
+            output_path: 合并后的报告路径
+            
+        Returns:
+            bool: 是否合并成功
+        """
+        merged = ET.Element('report', {'name': 'merged'})
+        counters = {}
+        
+        try:
+            for report_path in report_paths:
+                root = ET.parse(report_path).getroot()
+                for child in root:
+                    if child.tag == 'counter':
+                        totals = counters.setdefault(child.get('type'), [0, 0])
+                        totals[0] += int(child.get('missed', 0))
+                        totals[1] += int(child.get('covered', 0))
+                    elif child.tag in ('package', 'group'):
+                        merged.append(child)
+            
+            for counter_type, (missed, covered) in counters.items():
+                ET.SubElement(merged, 'counter', {
+                    'type': counter_type,
+                    'missed': str(missed),
+                    'covered': str(covered)
+                })
+            
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            ET.ElementTree(merged).write(output_path, encoding='UTF-8', xml_declaration=True)
+            logger.debug(f"已合并{len(report_paths)}个JaCoCo报告: {output_path}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"合并JaCoCo报告失败: {e}")
+            return False
 
     def analyze_test_coverage_for_changes(self, coverage_data, changed_test_methods, 
                                           changed_source_methods):
@@ -155,14 +301,9 @@ class CoverageAnalyzer:
             if not class_cov:
                 class_cov = self._fuzzy_match_class(classes_coverage, method.get('class', ''), full_class_name)
             
-            # 检查方法范围内是否有被覆盖的行
+            # 检查方法范围内是否有被覆盖的行（只要有一行被覆盖，我们就算该方法被覆盖了）
             if class_cov:
-                covered_lines = class_cov['covered_lines']
-                # 只要有一行被覆盖，我们就算该方法被覆盖了
-                for line_num in range(start_line, end_line + 1):
-                    if line_num in covered_lines:
-                        is_covered = True
-                        break
+                is_covered = class_cov.has_covered_line(start_line, end_line)
 
             if is_covered:
                 covered_count += 1
@@ -223,13 +364,7 @@ class CoverageAnalyzer:
             method_covered = 0
 
             if class_cov:
-                line_status = class_cov.get('line_status', {})
-                if line_status:
-                    for line_num in range(start_line, end_line + 1):
-                        if line_num in line_status:
-                            method_total += 1
-                            if line_status.get(line_num):
-                                method_covered += 1
+                method_covered, method_total = class_cov.line_counts(start_line, end_line)
 
             if method_total > 0:
                 methods_with_data += 1
@@ -289,13 +424,7 @@ class CoverageAnalyzer:
             method_covered = 0
 
             if class_cov:
-                branch_status = class_cov.get('branch_status', {})
-                if branch_status:
-                    for line_num in range(start_line, end_line + 1):
-                        if line_num in branch_status:
-                            info = branch_status[line_num]
-                            method_total += info.get('total', 0)
-                            method_covered += info.get('covered', 0)
+                method_covered, method_total = class_cov.branch_counts(start_line, end_line)
 
             if method_total > 0:
                 methods_with_data += 1
@@ -384,7 +513,7 @@ class CoverageAnalyzer:
         # 策略4: 通过源文件名匹配
         source_file = f"{simple_class_name}.java"
         for key, value in classes_coverage.items():
-            if value.get('source_file') == source_file:
+            if value.source_file == source_file:
                 logger.debug(f"源文件匹配: {full_class_name} -> {key}")
                 return value
         
@@ -2,9 +2,9 @@
 Diff过滤器 - 负责从完整diff中过滤掉测试代码的变更
 """
 
-import re
 from config import Config
 from utils.logger import get_logger
+from .commit_diff import CommitDiff
 
 logger = get_logger()
 
@@ -21,7 +21,7 @@ class DiffFilter:
         从完整diff中过滤掉测试文件的变更，只保留源代码变更
         
         Args:
-            diff_text: 完整的diff文本
+            diff_text: 完整的diff文本或CommitDiff对象
             
         Returns:
             tuple: (filtered_diff: str, test_diff: str, stats: dict)
@@ -73,47 +73,15 @@ class DiffFilter:
         按文件分割diff文本
         
         Args:
-            diff_text: 完整的diff文本
+            diff_text: 完整的diff文本或CommitDiff对象
             
         Returns:
             list: [(file_diff, file_path), ...]
         """
-        file_diffs = []
-        
-        # 分割diff文本
-        parts = re.split(r'(diff --git [^\n]+\n)', diff_text)
-        
-        current_diff = []
-        current_path = None
-        
-        for part in parts:
-            if not part:
-                continue
-                
-            if part.startswith('diff --git'):
-                # 保存前一个文件的diff
-                if current_diff and current_path:
-                    file_diffs.append(("\n".join(current_diff), current_path))
-                
-                # 开始新的文件diff
-                current_diff = [part.strip()]
-                
-                # 提取文件路径
-                match = re.search(r'diff --git a/(.*?) b/', part)
-                if match:
-                    current_path = match.group(1)
-                else:
-                    current_path = None
-            else:
-                # 添加到当前文件的diff
-                if part.strip():
-                    current_diff.append(part)
-        
-        # 保存最后一个文件的diff
-        if current_diff and current_path:
-            file_diffs.append(("\n".join(current_diff), current_path))
-        
-        return file_diffs
+        return [
+            (file_diff, a_path)
+            for file_diff, a_path, _ in CommitDiff.coerce(diff_text).iter_files()
+        ]
     
     def extract_test_changes_info(self, test_diff):
         """
@@ -132,7 +100,7 @@ class DiffFilter:
         从diff中提取变更信息（通用）
         
         Args:
-            diff_text: diff文本
+            diff_text: diff文本或CommitDiff对象
             label: 日志标签
             
         Returns:
@@ -142,26 +110,12 @@ class DiffFilter:
             if not diff_text:
                 return {"files": [], "total_lines_added": 0, "total_lines_removed": 0}
             
-            file_diffs = self._split_diff_by_file(diff_text)
             files_info = []
             total_added = 0
             total_removed = 0
             
-            for file_diff, file_path in file_diffs:
-                # 统计添加和删除的行数
-                added = len([
-                    line for line in file_diff.split('\n')
-                    if line.startswith('+') and not line.startswith('+++')
-                ])
-                removed = len([
-                    line for line in file_diff.split('\n')
-                    if line.startswith('-') and not line.startswith('---')
-                ])
-                
-                # 检测新文件和删除文件
-                is_new = 'new file mode' in file_diff
-                is_deleted = 'deleted file mode' in file_diff
-                
+            for file_path, _, added, removed, is_new, is_deleted in \
+                    CommitDiff.coerce(diff_text).iter_file_stats():
                 file_info = {
                     "path": file_path,
                     "lines_added": added,
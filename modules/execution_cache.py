@@ -0,0 +1,320 @@
+"""
+执行结果缓存模块 - 以源码tree hash为键缓存版本的构建、测试结果和JaCoCo报告
+"""
+
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import subprocess
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import AnalysisConfig
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class ExecutionCache:
+    """版本执行结果缓存
+
+    线性历史中commit N的V0与commit N+1的V-1是同一个tree，源码patch或测试patch为空时
+    V-0.5/T-0.5也与V-1相同。构建和测试结果只取决于：
+    - 源码tree hash
+    - Maven命令参数（可执行文件、额外参数、-pl模块、JaCoCo版本）
+    - 选中的测试集合
+    - JDK
+    因此以这些内容的哈希为键，缓存构建结果、测试结果和gzip压缩的JaCoCo报告。
+    变更方法的覆盖率与具体commit有关，命中后基于缓存的报告重新计算。
+
+    缓存总大小超过 AnalysisConfig.EXECUTION_CACHE_MAX_MB 时按最近使用时间（result.json的mtime，
+    命中时更新）删除最久未用的条目。删除整个缓存目录即可清空缓存。
+
+    磁盘布局: <cache_dir>/v<版本>/<key前两位>/<key>/{result.json, jacoco.xml.gz}
+    """
+
+    # 缓存内容或键的组成变化时递增，旧缓存自动失效（清理时删除旧版本目录）
+    CACHE_VERSION = 2
+
+    RESULT_FILE = 'result.json'
+    REPORT_FILE = 'jacoco.xml.gz'
+
+    # 每写入多少个条目检查一次缓存大小（每个进程写入第一个条目时也检查）
+    PRUNE_INTERVAL = 50
+
+    # 超出上限时清理到上限的比例，避免每次检查都只删除少量条目
+    PRUNE_TARGET_RATIO = 0.9
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    # 每个JAVA_HOME的JDK标识（进程内只探测一次）
+    _jdk_ids: Dict[str, str] = {}
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None):
+        """
+        初始化执行结果缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节），None表示不限制
+        """
+        self.root_dir = cache_dir
+        self.cache_dir = os.path.join(cache_dir, f"v{self.CACHE_VERSION}")
+        self.max_bytes = max_bytes
+        self._puts = 0
+        self._lock = threading.Lock()
+        # 进程内正在执行的键 {key: [lock, 等待数]}，同一tree的并行版本只执行一次
+        self._inflight: Dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def shared(cls) -> 'ExecutionCache':
+        """获取进程内共享的执行结果缓存（按AnalysisConfig配置创建）"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    max_mb = AnalysisConfig.EXECUTION_CACHE_MAX_MB
+                    cls._shared = cls(
+                        AnalysisConfig.EXECUTION_CACHE_DIR,
+                        max_mb * 1024 * 1024 if max_mb else None
+                    )
+        return cls._shared
+
+    @staticmethod
+    def make_key(tree_hash: str, maven_args: List[str], selected_tests: Optional[List[str]],
+                 jdk: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            tree_hash: 版本的源码tree hash
+            maven_args: 影响构建结果的Maven参数
+            selected_tests: 选中的测试（None表示运行全部测试）
+            jdk: JDK标识
+
+        Returns:
+            str: 缓存键（sha256）
+        """
+        payload = json.dumps({
+            'tree': tree_hash,
+            'maven': list(maven_args),
+            'tests': sorted(selected_tests) if selected_tests is not None else None,
+            'jdk': jdk
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def detect_jdk(cls, java_home: Optional[str] = None) -> str:
+        """
+        获取JDK标识（JAVA_HOME + `java -version` 输出）
+
+        Args:
+            java_home: JAVA_HOME路径，None表示使用PATH中的java
+
+        Returns:
+            str: JDK标识，无法探测时为 "unknown"
+        """
+        cache_key = java_home or ''
+        jdk_id = cls._jdk_ids.get(cache_key)
+        if jdk_id is not None:
+            return jdk_id
+
+        java = os.path.join(java_home, 'bin', 'java') if java_home else 'java'
+        try:
+            process = subprocess.run(
+                [java, '-version'],
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+            version = (process.stderr or process.stdout).strip()
+        except (OSError, subprocess.TimeoutExpired):
+            version = 'unknown'
+
+        jdk_id = f"{cache_key}|{version}"
+        cls._jdk_ids[cache_key] = jdk_id
+        return jdk_id
+
+    @contextmanager
+    def reserve(self, key: Optional[str]):
+        """
+        在进程内独占一个键：同一键的其他线程等待当前执行完成后再查询缓存
+
+        Args:
+            key: 缓存键，None时不加锁
+        """
+        if key is None:
+            yield
+            return
+
+        with self._lock:
+            slot = self._inflight.get(key)
+            if slot is None:
+                slot = [threading.Lock(), 0]
+                self._inflight[key] = slot
+            slot[1] += 1
+
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] <= 0:
+                    self._inflight.pop(key, None)
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        查询缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            dict or None: {'build', 'test', 'jacoco_report', 'source'}，未命中时返回None
+        """
+        entry_dir = self._entry_dir(key)
+        result_file = os.path.join(entry_dir, self.RESULT_FILE)
+        try:
+            with open(result_file, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # 记录最近使用时间，清理时优先保留
+            os.utime(result_file)
+        except FileNotFoundError:
+            entry = None
+        except Exception as e:
+            logger.debug(f"读取执行缓存失败 {key[:12]}: {e}")
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        report = os.path.join(entry_dir, self.REPORT_FILE)
+        entry['jacoco_report'] = report if os.path.exists(report) else None
+        return entry
+
+    def put(self, key: str, build: dict, test: dict, jacoco_report: Optional[str] = None,
+            source: Optional[dict] = None):
+        """
+        写入缓存（先写临时目录再重命名，多进程并发写入安全）
+
+        Args:
+            key: 缓存键
+            build: 构建结果
+            test: 测试结果
+            jacoco_report: JaCoCo XML报告路径（gzip压缩后存入缓存目录）
+            source: 产生该结果的版本信息（commit、版本类型）
+        """
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            if jacoco_report and os.path.exists(jacoco_report):
+                with open(jacoco_report, 'rb') as src, \
+                        gzip.open(os.path.join(tmp_dir, self.REPORT_FILE), 'wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst)
+            with open(os.path.join(tmp_dir, self.RESULT_FILE), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'build': build,
+                    'test': test,
+                    'source': dict(source or {}, cached_at=datetime.now().isoformat())
+                }, f, ensure_ascii=False, default=str)
+            os.rename(tmp_dir, entry_dir)
+        except Exception as e:
+            # 其他进程已写入同一键时重命名失败，保留已有结果
+            if not os.path.exists(entry_dir):
+                logger.debug(f"写入执行缓存失败 {key[:12]}: {e}")
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        with self._lock:
+            self._puts += 1
+            check = self.max_bytes is not None and self._puts % self.PRUNE_INTERVAL == 1
+        if check:
+            self.prune()
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """
+        删除旧版本的缓存目录，并在总大小超过上限时删除最久未使用的条目
+
+        Args:
+            max_bytes: 大小上限（字节），默认使用初始化时的上限
+
+        Returns:
+            int: 删除的条目数
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+
+        current = os.path.basename(self.cache_dir)
+        try:
+            names = os.listdir(self.root_dir)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if name != current and name.startswith('v') and name[1:].isdigit():
+                shutil.rmtree(os.path.join(self.root_dir, name), ignore_errors=True)
+
+        if max_bytes is None:
+            return 0
+
+        entries = []
+        total = 0
+        for shard in self._listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            for key in self._listdir(shard_dir):
+                entry_dir = os.path.join(shard_dir, key)
+                if key.endswith('.tmp'):
+                    continue
+                try:
+                    used = os.stat(os.path.join(entry_dir, self.RESULT_FILE)).st_mtime
+                    size = sum(
+                        entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file()
+                    )
+                except OSError:
+                    continue
+                entries.append((used, size, entry_dir))
+                total += size
+
+        if total <= max_bytes:
+            return 0
+
+        removed = 0
+        target = max_bytes * self.PRUNE_TARGET_RATIO
+        for _, size, entry_dir in sorted(entries):
+            if total <= target:
+                break
+            # 先重命名再删除，并发读取的进程只会看到完整条目或未命中
+            doomed = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.rename(entry_dir, doomed)
+            except OSError:
+                continue
+            shutil.rmtree(doomed, ignore_errors=True)
+            total -= size
+            removed += 1
+
+        logger.info(f"执行缓存超过 {max_bytes // (1024 * 1024)}MB，删除 {removed} 个最久未使用的条目")
+        return removed
+
+    @staticmethod
+    def _listdir(path: str) -> List[str]:
+        try:
+            return os.listdir(path)
+        except OSError:
+            return []
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
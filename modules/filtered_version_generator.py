@@ -1,13 +1,23 @@
 """
 过滤版本生成器 - 负责生成隐藏测试变更的V-0.5版本
+
+只使用git底层命令（临时索引 + write-tree + commit-tree + update-ref）创建分支，
+编译验证在独立的临时检出目录中并行执行，不修改用户仓库的工作区和HEAD
 """
 
 import os
-import tempfile
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from git import GitCommandError
-from config import Config
+from config import Config, AnalysisConfig
 from utils.logger import get_logger
+from utils.exceptions import GitOperationError
 from .diff_filter import DiffFilter
+from .commit_diff import CommitDiff
+from .patch_tree import write_patched_tree, commit_tree
+from .checkout_backends import create_checkout_backend, cleanup_checkout_caches
+from .maven_executor import MavenExecutor
 
 logger = get_logger()
 
@@ -28,6 +38,40 @@ class FilteredVersionGenerator:
         self.git_analyzer = git_analyzer
         self.diff_filter = DiffFilter()
         self.repo = git_analyzer.repo
+        self.repo_path = git_analyzer.repo_path
+        
+        # 每个线程最近一个commit的完整diff（source_only/test_only两种模式共享）
+        self._thread_local = threading.local()
+        
+        # 编译验证使用的临时检出目录（首次验证时创建）
+        self._scratch_base = os.path.join(AnalysisConfig.ANALYSIS_WORKTREE_DIR, 'filtered')
+        self._checkout_backend = None
+        self._backend_lock = threading.Lock()
+    
+    def generate_versions(self, commit_infos, max_workers=None):
+        """
+        并行为多个commit生成源代码版本和测试版本
+        
+        Args:
+            commit_infos: commit信息列表
+            max_workers: 并发数，默认Config.FILTERED_VERSION_WORKERS
+            
+        Returns:
+            list: 与commit_infos一一对应的 (source_result, test_result)
+        """
+        max_workers = max_workers or Config.FILTERED_VERSION_WORKERS
+        
+        def generate_both(commit_info):
+            return (
+                self.generate_filtered_version(commit_info),
+                self.generate_test_only_version(commit_info)
+            )
+        
+        if max_workers <= 1:
+            return [generate_both(commit_info) for commit_info in commit_infos]
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(generate_both, commit_infos))
     
     def generate_filtered_version(self, commit_info):
         """
@@ -98,7 +142,7 @@ class FilteredVersionGenerator:
             
             # 1. 获取完整的diff (使用git命令获取标准格式)
             try:
-                diff_text = self.repo.git.diff(parent_hash, commit_hash)
+                diff_text = self._get_commit_diff(parent_hash, commit_hash)
             except Exception as e:
                 logger.error(f"获取diff失败: {e}")
                 result['error'] = f"获取diff失败: {e}"
@@ -113,10 +157,9 @@ class FilteredVersionGenerator:
                 return result
             
             # 3. 获取原始commit的完整message
-            original_commit = self.repo.commit(commit_hash)
-            original_message = original_commit.message.strip()
+            original_message = self.repo.git.log('-1', '--format=%B', commit_hash).strip()
             
-            # 4. 创建新分支并应用diff
+            # 4. 在临时索引中应用diff，生成新commit对象（尚不创建分支）
             branch_name = self._build_branch_name(commit_hash, mode)
             commit_message = self._build_commit_message(original_message, mode)
             new_hash = self._apply_diff_to_branch(
@@ -128,6 +171,7 @@ class FilteredVersionGenerator:
             
             if not new_hash:
                 result['error'] = "应用diff失败"
+                self._cleanup_branch(branch_name)
                 return result
             
             # 5. 验证可编译性
@@ -137,10 +181,13 @@ class FilteredVersionGenerator:
                 self._cleanup_branch(branch_name)
                 return result
             
-            # 6. 提取被隐藏的变更信息
+            # 6. 验证通过后再创建分支
+            self.repo.git.update_ref(f"refs/heads/{branch_name}", new_hash)
+            
+            # 7. 提取被隐藏的变更信息
             hidden_changes_info = self.diff_filter.extract_changes_info(hidden_diff)
             
-            # 7. 返回成功结果
+            # 8. 返回成功结果
             result['success'] = True
             result['commit_hash'] = new_hash
             result['branch_name'] = branch_name
@@ -155,9 +202,22 @@ class FilteredVersionGenerator:
         
         return result
     
+    def _get_commit_diff(self, parent_hash, commit_hash):
+        """
+        获取commit的完整diff对象（同一commit只调用一次git diff）
+        """
+        key = (parent_hash, commit_hash)
+        cached = getattr(self._thread_local, 'commit_diff', None)
+        if cached and cached[0] == key:
+            return cached[1]
+        
+        commit_diff = CommitDiff(self.repo.git.diff(parent_hash, commit_hash))
+        self._thread_local.commit_diff = (key, commit_diff)
+        return commit_diff
+    
     def _apply_diff_to_branch(self, parent_hash, diff_text, branch_name, commit_message):
         """
-        应用diff到新分支
+        在临时索引中应用diff并创建commit对象（分支在编译验证通过后由update-ref创建）
         
         Args:
             parent_hash: 父commit的hash
@@ -168,64 +228,30 @@ class FilteredVersionGenerator:
         Returns:
             str: 新commit的hash，失败返回None
         """
-        try:
-            # 1. 彻底清理工作区，确保完全干净的状态
-            logger.debug(f"清理工作区...")
-            self.repo.git.reset('--hard', 'HEAD')
-            self.repo.git.clean('-fd')  # 删除未跟踪的文件和目录
-            
-            # 2. 删除已存在的同名分支
-            try:
-                self.repo.git.branch('-D', branch_name)
-                logger.debug(f"已删除旧分支: {branch_name}")
-            except GitCommandError:
-                pass  # 分支不存在，忽略
-            
-            # 3. 从父commit创建新分支
-            self.repo.git.checkout('-b', branch_name, parent_hash)
-            
-            # 4. 再次确保分支状态干净（移除可能的target/等编译产物）
-            self.repo.git.reset('--hard', parent_hash)
-            self.repo.git.clean('-fd')
-            logger.debug(f"已创建并清理分支: {branch_name}")
-            
-            # 将diff保存到临时文件
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.patch', delete=False) as f:
-                f.write(diff_text)
-                patch_file = f.name
-            
-            try:
-                # 应用patch
-                self.repo.git.apply(patch_file, '--whitespace=nowarn')
-                
-                # 添加变更到暂存区
-                self.repo.git.add('-A')
-                
-                # 检查是否有变更需要提交
-                if self.repo.is_dirty():
-                    self.repo.git.commit('-m', commit_message)
-                    
-                    # 获取新commit的hash
-                    new_commit_hash = self.repo.head.commit.hexsha
-                    
-                    logger.debug(f"成功应用filtered diff，新commit: {new_commit_hash[:8]}")
-                    return new_commit_hash
-                else:
-                    logger.warning("应用patch后没有变更")
-                    return None
-                
-            finally:
-                # 清理临时文件
-                if os.path.exists(patch_file):
-                    os.remove(patch_file)
+        patch_result = write_patched_tree(
+            self.repo_path,
+            parent_hash,
+            str(diff_text),
+            apply_args=('--whitespace=nowarn',)
+        )
+        if not patch_result['success']:
+            logger.error(f"应用diff失败 [{branch_name}]: {patch_result.get('error')}")
+            return None
         
-        except GitCommandError as e:
-            logger.error(f"应用diff失败: {e}")
+        # 检查是否有变更需要提交
+        parent_tree = self.repo.git.rev_parse(f"{parent_hash}^{{tree}}")
+        if patch_result['tree'] == parent_tree:
+            logger.warning("应用patch后没有变更")
             return None
         
-        except Exception as e:
-            logger.error(f"应用diff异常: {e}")
+        try:
+            new_commit_hash = commit_tree(self.repo_path, patch_result['tree'], parent_hash, commit_message)
+        except GitOperationError as e:
+            logger.error(f"应用diff失败: {e}")
             return None
+        
+        logger.debug(f"成功应用filtered diff，新commit: {new_commit_hash[:8]}")
+        return new_commit_hash
 
     def _select_diff(self, filtered_diff, test_diff, mode):
         """
@@ -256,7 +282,7 @@ class FilteredVersionGenerator:
     
     def _verify_compilable(self, commit_hash):
         """
-        验证指定commit是否可编译
+        在独立的临时检出目录中验证指定commit是否可编译
         
         Args:
             commit_hash: commit的hash
@@ -264,63 +290,65 @@ class FilteredVersionGenerator:
         Returns:
             bool: 是否可编译
         """
+        backend = self._get_checkout_backend()
+        path = backend.acquire(commit_hash, f"{commit_hash[:8]}_verify")
+        if not path:
+            logger.error(f"验证编译失败: 无法检出 {commit_hash[:8]}")
+            return False
+        
         try:
-            # 切换到该commit并确保工作区干净
-            self.repo.git.checkout(commit_hash)
-            self.repo.git.reset('--hard')
-            self.repo.git.clean('-fd')  # 清理编译前的状态
-            
-            # 确保工作区干净
-            self.repo.git.reset('--hard', commit_hash)
-            self.repo.git.clean('-fd')
-            
             # 检查是否有pom.xml
-            pom_path = os.path.join(self.repo.working_dir, 'pom.xml')
-            if not os.path.exists(pom_path):
+            if not os.path.exists(os.path.join(path, 'pom.xml')):
                 logger.warning(f"未找到pom.xml，跳过编译验证")
                 return True  # 假设可以编译
             
             # 尝试编译
-            from .maven_executor import MavenExecutor
-            maven = MavenExecutor(self.repo.working_dir)
+            maven = MavenExecutor(path)
             success, _ = maven._run_maven_command('clean compile -DskipTests')
-            
-            # 编译验证后，清理编译产物，确保分支干净
-            if success:
-                logger.debug("编译成功，清理编译产物...")
-                target_dir = os.path.join(self.repo.working_dir, 'target')
-                if os.path.exists(target_dir):
-                    import shutil
-                    shutil.rmtree(target_dir)
-                    logger.debug(f"已删除target目录")
-            
             return success
         
         except Exception as e:
             logger.error(f"验证编译失败: {e}")
             return False
+        
+        finally:
+            backend.release(path)
+    
+    def _get_checkout_backend(self):
+        """获取编译验证使用的检出策略（每个进程一个工作目录）"""
+        with self._backend_lock:
+            if self._checkout_backend is None:
+                work_dir = os.path.join(
+                    self._scratch_base,
+                    f"{os.path.basename(self.repo_path)}_{os.getpid()}"
+                )
+                os.makedirs(work_dir, exist_ok=True)
+                self._checkout_backend = create_checkout_backend(self.repo_path, work_dir)
+            return self._checkout_backend
     
     def _cleanup_branch(self, branch_name):
         """
-        清理创建的分支
+        清理同名的旧分支（失败的版本不保留上一次生成的分支）
         
         Args:
             branch_name: 分支名称
         """
         try:
-            # 切换回主分支
-            self.repo.git.checkout('HEAD', '--detach')
-            # 删除分支
-            self.repo.git.branch('-D', branch_name)
+            self.repo.git.update_ref('-d', f"refs/heads/{branch_name}")
             logger.debug(f"已清理分支: {branch_name}")
-        except Exception as e:
+        except GitCommandError as e:
             logger.warning(f"清理分支失败 [{branch_name}]: {e}")
     
+    def close(self):
+        """删除编译验证使用的临时检出目录"""
+        with self._backend_lock:
+            backend = self._checkout_backend
+            self._checkout_backend = None
+        if backend is not None:
+            backend.close()
+            cleanup_checkout_caches(self.repo_path, self._scratch_base)
+            shutil.rmtree(backend.work_dir, ignore_errors=True)
+    
     def restore_original_branch(self):
-        """恢复到原始分支/状态"""
-        try:
-            # 切换回HEAD
-            self.repo.git.checkout('HEAD', '--detach')
-            logger.debug("已恢复到原始状态")
-        except Exception as e:
-            logger.warning(f"恢复原始状态失败: {e}")
+        """兼容旧接口：工作区不再被修改，只需清理临时检出目录"""
+        self.close()
@@ -3,11 +3,15 @@ Git分析模块 - 负责提取commits、diff分析等Git操作
 """
 
 import os
+import subprocess
+import threading
 from datetime import datetime
 from git import Repo, GitCommandError
 from config import Config
 from utils.logger import get_logger
 from utils.exceptions import RepositoryError, GitOperationError
+from .blob_reader import BlobReader
+from .commit_diff import CommitDiff
 
 logger = get_logger()
 
@@ -29,6 +33,16 @@ class GitAnalyzer:
         except Exception as e:
             logger.error(f"加载Git仓库失败: {e}")
             raise RepositoryError(f"无法加载Git仓库: {repo_path}", {"original_error": str(e)})
+        
+        # 常驻的cat-file读取器，首次读取文件时才启动
+        self._blob_reader = None
+    
+    @property
+    def blob_reader(self):
+        """获取常驻blob读取器"""
+        if self._blob_reader is None:
+            self._blob_reader = BlobReader(self.repo_path)
+        return self._blob_reader
     
     def get_all_commits(self, since_date=None, branch='HEAD'):
         """
@@ -97,35 +111,375 @@ class GitAnalyzer:
             parent = commit.parents[0]
             diffs = parent.diff(commit)
             
-            test_files = []
-            source_files = []
-            other_files = []
+            # 获取文件路径（新文件或修改的文件）
+            return self._classify_changed_paths(
+                diff.b_path if diff.b_path else diff.a_path for diff in diffs
+            )
+        
+        except Exception as e:
+            logger.error(f"获取变更文件失败 [{commit.hexsha}]: {e}")
+            return {'test_files': [], 'source_files': [], 'other_files': []}
+    
+    def iter_changed_files(self, since_date=None, branch='HEAD'):
+        """
+        流式扫描所有commit的变更文件
+        
+        只启动一个 `git log --name-status -z` 进程，边读边分类，
+        不为每个commit单独计算diff，内存占用与历史长度无关。
+        与get_changed_files保持一致：遍历完整历史，merge commit只与第一个父commit比较，
+        开启重命名检测，根commit视为没有变更。
+        
+        Args:
+            since_date: 起始日期（datetime对象），早于该日期的commit不输出
+            branch: 分支名称
             
-            for diff in diffs:
-                # 获取文件路径（新文件或修改的文件）
-                file_path = diff.b_path if diff.b_path else diff.a_path
+        Yields:
+            tuple: (commit_hash, changed_files)，changed_files格式同get_changed_files
+        """
+        for commit_hash, committed_date, _, changed_files in self.iter_commit_changes(branch):
+            if since_date and datetime.fromtimestamp(committed_date) < since_date:
+                continue
+            yield commit_hash, changed_files
+    
+    def iter_commit_changes(self, revision='HEAD'):
+        """
+        流式输出commit的基本信息和分类后的变更文件
+        
+        Args:
+            revision: git log可接受的版本范围（如 'HEAD' 或 'abc123..HEAD'）
+            
+        Yields:
+            tuple: (commit_hash, committed_date, parent_hash, changed_files)
+        """
+        cmd = [
+            'git', 'log', '-z', '--name-status', '-M',
+            '--diff-merges=first-parent',
+            '--format=%x01%H %ct %P',
+            revision, '--'
+        ]
+        for commit_hash, committed_date, parents, paths in self._iter_name_status(cmd):
+            if not parents:
+                paths = []
+            parent_hash = parents[0] if parents else None
+            yield commit_hash, committed_date, parent_hash, self._classify_changed_paths(paths)
+    
+    def get_head_commit(self, branch='HEAD'):
+        """
+        获取分支当前指向的commit hash
+        
+        Returns:
+            str or None: commit hash，空仓库返回None
+        """
+        try:
+            return self.repo.git.rev_parse('--verify', '-q', f"{branch}^{{commit}}")
+        except GitCommandError:
+            return None
+    
+    def is_ancestor(self, ancestor, commit):
+        """
+        判断ancestor是否为commit的祖先（ancestor不存在时返回False）
+        """
+        try:
+            self.repo.git.merge_base('--is-ancestor', ancestor, commit)
+            return True
+        except GitCommandError:
+            return False
+    
+    def _iter_name_status(self, cmd, stdin_data=None):
+        """
+        解析 `--name-status -z --format=%x01%H %ct %P` 格式的输出流
+        
+        Args:
+            cmd: git命令参数列表
+            stdin_data: 写入进程stdin的数据（用于 `git diff-tree --stdin`）
+            
+        Yields:
+            tuple: (commit_hash, committed_date, parents, paths)
+        """
+        process = subprocess.Popen(
+            cmd,
+            cwd=self.repo_path,
+            stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        
+        try:
+            if stdin_data is not None:
+                # 在独立线程中写入，避免stdout管道写满导致死锁
+                def _feed():
+                    try:
+                        process.stdin.write(stdin_data)
+                    except (BrokenPipeError, OSError):
+                        pass
+                    finally:
+                        try:
+                            process.stdin.close()
+                        except OSError:
+                            pass
                 
-                if not file_path or not file_path.endswith('.java'):
-                    continue
+                threading.Thread(target=_feed, daemon=True).start()
+            
+            current = None
+            pending_paths = 0
+            buffer = b''
+            
+            while True:
+                chunk = process.stdout.read(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                tokens = buffer.split(b'\0')
+                buffer = tokens.pop()
                 
-                # 分类文件
-                if self._is_test_file(file_path):
-                    test_files.append(file_path)
-                elif self._is_source_file(file_path):
-                    source_files.append(file_path)
-                else:
-                    other_files.append(file_path)
+                for token in tokens:
+                    token = token.lstrip(b'\n')
+                    if token.startswith(b'\x01'):
+                        if current:
+                            yield current
+                        fields = token[1:].decode('ascii').split()
+                        current = (fields[0], int(fields[1]), fields[2:], [])
+                        pending_paths = 0
+                    elif current is None or not token:
+                        continue
+                    elif pending_paths:
+                        # 重命名/复制记录包含旧路径和新路径，只保留新路径
+                        pending_paths -= 1
+                        if pending_paths == 0:
+                            current[3].append(token.decode('utf-8', errors='ignore'))
+                    else:
+                        status = token[:1]
+                        pending_paths = 2 if status in (b'R', b'C') else 1
             
-            return {
-                'test_files': test_files,
-                'source_files': source_files,
-                'other_files': other_files
-            }
+            if current:
+                yield current
+            
+            process.wait()
+            if process.returncode not in (0, None):
+                raise GitOperationError(f"git命令执行失败: {' '.join(cmd[:3])}",
+                                        {"return_code": process.returncode})
         
-        except Exception as e:
-            logger.error(f"获取变更文件失败 [{commit.hexsha}]: {e}")
-            return {'test_files': [], 'source_files': [], 'other_files': []}
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
     
+    def _classify_changed_paths(self, paths):
+        """
+        将变更文件路径分类为测试文件、源代码文件和其他文件（只保留.java文件）
+        
+        Args:
+            paths: 文件路径可迭代对象
+            
+        Returns:
+            dict: {'test_files': [], 'source_files': [], 'other_files': []}
+        """
+        test_files = []
+        source_files = []
+        other_files = []
+        
+        for file_path in paths:
+            if not file_path or not file_path.endswith('.java'):
+                continue
+            
+            # 分类文件
+            if self._is_test_file(file_path):
+                test_files.append(file_path)
+            elif self._is_source_file(file_path):
+                source_files.append(file_path)
+            else:
+                other_files.append(file_path)
+        
+        return {
+            'test_files': test_files,
+            'source_files': source_files,
+            'other_files': other_files
+        }
+
+    def iter_changed_files_of(self, commit_hashes):
+        """
+        对指定的commit列表流式计算变更文件
+
+        Args:
+            commit_hashes: commit hash列表
+
+        Yields:
+            tuple: (commit_hash, changed_files)，changed_files格式同get_changed_files
+        """
+        for commit_hash, _, _, changed_files in self.iter_commit_changes_of(commit_hashes):
+            yield commit_hash, changed_files
+
+    def iter_commit_changes_of(self, commit_hashes):
+        """
+        对指定的commit列表流式输出基本信息和分类后的变更文件
+
+        通过单个 `git diff-tree --stdin` 进程处理，比较规则与iter_commit_changes一致，
+        输出顺序与输入顺序相同
+
+        Args:
+            commit_hashes: commit hash列表
+
+        Yields:
+            tuple: (commit_hash, committed_date, parent_hash, changed_files)
+        """
+        commit_hashes = list(commit_hashes)
+        if not commit_hashes:
+            return
+
+        cmd = [
+            'git', 'diff-tree', '--stdin', '--always', '-r', '-z',
+            '--name-status', '-M', '--diff-merges=first-parent',
+            '--format=%x01%H %ct %P'
+        ]
+        stdin_data = ''.join(f"{commit_hash}\n" for commit_hash in commit_hashes).encode('ascii')
+        for commit_hash, committed_date, parents, paths in self._iter_name_status(cmd, stdin_data=stdin_data):
+            if not parents:
+                paths = []
+            parent_hash = parents[0] if parents else None
+            yield commit_hash, committed_date, parent_hash, self._classify_changed_paths(paths)
+
+    def iter_rev_list(self, pathspecs=None, since_date=None, branch='HEAD'):
+        """
+        流式读取 `git rev-list` 输出
+
+        Args:
+            pathspecs: 字面路径列表，为None时不限制路径
+            since_date: 起始日期（datetime对象），早于该日期的commit不输出
+            branch: 分支名称
+
+        Yields:
+            str: commit hash（从新到旧）
+        """
+        # 字面pathspec才能命中changed-path Bloom过滤器
+        cmd = ['git', '--literal-pathspecs', 'rev-list', '--timestamp']
+        if pathspecs is not None:
+            cmd.append('--full-history')
+        cmd += [branch, '--']
+        if pathspecs:
+            cmd += list(pathspecs)
+
+        process = subprocess.Popen(
+            cmd,
+            cwd=self.repo_path,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            for line in process.stdout:
+                fields = line.split()
+                if len(fields) != 2:
+                    continue
+                if since_date and datetime.fromtimestamp(int(fields[0])) < since_date:
+                    continue
+                yield fields[1].decode('ascii')
+
+            process.wait()
+            if process.returncode != 0:
+                raise GitOperationError("git rev-list执行失败",
+                                        {"return_code": process.returncode})
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+    def get_pattern_pathspecs(self, patterns, branch='HEAD'):
+        """
+        将路径模式转换为字面目录pathspec
+
+        路径模式是子串匹配，无法直接作为pathspec（通配符会让Bloom过滤器失效），
+        因此在当前tree中找出所有包含该模式的目录，只保留最顶层的目录。
+        注意：只在当前tree中已删除的模块不会被覆盖。
+
+        Args:
+            patterns: 路径模式列表（如Config.TEST_PATH_PATTERNS）
+            branch: 分支名称
+
+        Returns:
+            list: 字面目录路径列表
+        """
+        try:
+            output = self.repo.git.ls_tree('-r', '-d', '-z', '--name-only', branch)
+        except GitCommandError as e:
+            raise GitOperationError(f"读取目录树失败: {branch}", {"original_error": str(e)})
+
+        matched = sorted(
+            directory for directory in output.split('\0')
+            if directory and any(pattern in directory for pattern in patterns)
+        )
+
+        # 排序后祖先目录排在子目录之前，只保留最顶层目录
+        pathspecs = []
+        for directory in matched:
+            if pathspecs and directory.startswith(pathspecs[-1] + '/'):
+                continue
+            pathspecs.append(directory)
+        return pathspecs
+
+    def ensure_changed_path_bloom_filters(self):
+        """
+        确保仓库存在带changed-path Bloom过滤器的commit-graph，缺失时写入
+
+        Returns:
+            bool: Bloom过滤器是否可用
+        """
+        if self._has_changed_path_bloom_filters():
+            return True
+
+        logger.info("写入commit-graph（--changed-paths），首次执行可能需要一段时间...")
+        try:
+            subprocess.run(
+                ['git', 'commit-graph', 'write', '--reachable', '--changed-paths'],
+                cwd=self.repo_path,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                check=True
+            )
+        except (subprocess.CalledProcessError, OSError) as e:
+            # 写入失败不影响正确性，rev-list会退化为逐个计算diff
+            logger.warning(f"写入commit-graph失败，将不使用Bloom过滤器: {e}")
+            return False
+
+        return self._has_changed_path_bloom_filters()
+
+    def _has_changed_path_bloom_filters(self):
+        """检查commit-graph文件是否都包含Bloom过滤器数据块（BIDX/BDAT）"""
+        info_dir = os.path.join(self.repo.common_dir, 'objects', 'info')
+
+        graph_files = []
+        single = os.path.join(info_dir, 'commit-graph')
+        chain = os.path.join(info_dir, 'commit-graphs', 'commit-graph-chain')
+        if os.path.exists(chain):
+            with open(chain, 'r') as f:
+                graph_files = [
+                    os.path.join(info_dir, 'commit-graphs', f"graph-{line.strip()}.graph")
+                    for line in f if line.strip()
+                ]
+        elif os.path.exists(single):
+            graph_files = [single]
+
+        if not graph_files:
+            return False
+        return all(self._graph_has_bloom_chunks(path) for path in graph_files)
+
+    @staticmethod
+    def _graph_has_bloom_chunks(graph_path):
+        """读取commit-graph文件头的chunk表"""
+        try:
+            with open(graph_path, 'rb') as f:
+                header = f.read(8)
+                if len(header) != 8 or header[:4] != b'CGPH':
+                    return False
+                num_chunks = header[6]
+                table = f.read((num_chunks + 1) * 12)
+        except OSError:
+            return False
+
+        chunk_ids = {table[i:i + 4] for i in range(0, len(table), 12)}
+        return b'BIDX' in chunk_ids and b'BDAT' in chunk_ids
+
     def get_file_diff(self, commit, file_path):
         """
         获取指定文件的diff内容
@@ -170,13 +524,35 @@ class GitAnalyzer:
         Returns:
             str: 文件内容
         """
+        blob = self.get_file_contents([(commit_hash, file_path)])[0]
+        return blob[1] if blob else None
+    
+    def get_file_contents(self, specs):
+        """
+        批量获取文件内容（通过cat-file流水线读取）
+        
+        Args:
+            specs: [(commit_hash, file_path), ...]
+            
+        Returns:
+            list: 与specs一一对应的 (blob_sha, 文件内容)，不存在的文件为None
+        """
+        specs = list(specs)
         try:
-            commit = self.repo.commit(commit_hash)
-            blob = commit.tree / file_path
-            return blob.data_stream.read().decode('utf-8', errors='ignore')
+            blobs = self.blob_reader.read_many(specs)
         except Exception as e:
-            logger.debug(f"获取文件内容失败 [{commit_hash}:{file_path}]: {e}")
-            return None
+            logger.debug(f"批量获取文件内容失败: {e}")
+            return [None] * len(specs)
+        
+        contents = []
+        for (commit_hash, file_path), blob in zip(specs, blobs):
+            if blob is None:
+                logger.debug(f"获取文件内容失败 [{commit_hash}:{file_path}]: 文件不存在")
+                contents.append(None)
+            else:
+                # 保留git的blob SHA作为解析缓存key，与解码方式无关
+                contents.append((blob[0], blob[1].decode('utf-8', errors='ignore')))
+        return contents
     
     def create_worktree(self, commit_hash, worktree_path):
         """
@@ -259,4 +635,17 @@ class GitAnalyzer:
         except Exception as e:
             logger.error(f"获取完整diff失败 [{commit.hexsha}]: {e}")
             return ""
-
+    
+    def get_commit_diff(self, commit):
+        """
+        获取commit的完整diff对象
+        
+        只调用一次 `git diff`，按文件建立偏移索引，供各模块按文件切片使用
+        
+        Args:
+            commit: commit对象
+            
+        Returns:
+            CommitDiff: 完整diff对象
+        """
+        return CommitDiff(self.get_full_diff(commit))
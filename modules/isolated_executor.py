@@ -1,15 +1,17 @@
 """
 隔离执行器 - 在临时worktree中执行构建和测试，不污染原始仓库
-使用方案B：临时worktree + patch应用，分析完即删除
+使用方案B：独立工作目录 + patch应用（patch先在临时索引中生成tree对象），
+工作目录的检出方式由CHECKOUT_BACKEND选择
 """
 
 import os
+import re
 import shutil
 import subprocess
 import tempfile
 import threading
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 from git import Repo, GitCommandError
 from config import Config, AnalysisConfig
@@ -17,6 +19,13 @@ from utils.logger import get_logger
 from modules.maven_executor import MavenExecutor
 from modules.coverage_analyzer import CoverageAnalyzer
 from modules.code_analyzer import CodeAnalyzer
+from modules.blob_reader import BlobReader
+from modules.maven_reactor import MavenReactor
+from modules.execution_cache import ExecutionCache
+from modules.maven_repository import MavenRepository
+from modules.patch_tree import write_patched_tree, commit_tree
+from utils.exceptions import GitOperationError
+from modules.checkout_backends import create_checkout_backend, cleanup_checkout_caches, copy_tree
 
 logger = get_logger()
 
@@ -24,13 +33,24 @@ logger = get_logger()
 class IsolatedExecutor:
     """隔离执行器 - 确保不污染原始仓库"""
     
-    def __init__(self, repo_path: str, work_dir: str = None):
+    # 合成commit使用固定的身份和时间，保证hash只取决于tree和父commit
+    PATCHED_COMMIT_IDENTITY = {
+        'GIT_AUTHOR_NAME': 'TUBench',
+        'GIT_AUTHOR_EMAIL': 'tubench@localhost',
+        'GIT_AUTHOR_DATE': '1970-01-01T00:00:00+0000',
+        'GIT_COMMITTER_NAME': 'TUBench',
+        'GIT_COMMITTER_EMAIL': 'tubench@localhost',
+        'GIT_COMMITTER_DATE': '1970-01-01T00:00:00+0000',
+    }
+    
+    def __init__(self, repo_path: str, work_dir: str = None, blob_reader: BlobReader = None):
         """
         初始化隔离执行器
         
         Args:
             repo_path: 原始仓库路径
             work_dir: 工作目录，默认为临时目录
+            blob_reader: 共享的blob读取器，默认新建
         """
         self.repo_path = repo_path
         self.project_name = os.path.basename(repo_path)
@@ -43,12 +63,24 @@ class IsolatedExecutor:
         self.work_dir = os.path.join(base_dir, f"{self.project_name}_{os.getpid()}")
         os.makedirs(self.work_dir, exist_ok=True)
         
-        # 记录创建的worktree，用于清理（需要线程安全）
-        self._created_worktrees = []
-        self._worktrees_lock = threading.Lock()
-        
         # 覆盖率分析器
         self.coverage_analyzer = CoverageAnalyzer()
+        
+        # 读取已提交版本的文件内容，无需访问worktree磁盘
+        self.blob_reader = blob_reader or BlobReader(repo_path)
+        
+        # 版本检出策略（worktree / archive / reflink）
+        self.checkout_backend = create_checkout_backend(repo_path, self.work_dir)
+        
+        # 以tree hash为键的执行结果缓存（进程内共享）
+        self.execution_cache = ExecutionCache.shared()
+        
+        # V-1构建完成后的target/快照 {父commit: 快照目录}，用于预置V-0.5/T-0.5的增量构建
+        self._target_seeds: Dict[str, str] = {}
+        self._seeds_lock = threading.Lock()
+        
+        # 多模块项目的稀疏检出计划（由plan_sparse_checkout按commit计算）
+        self.sparse_plan = None
     
     @property
     def repo(self) -> Repo:
@@ -57,6 +89,40 @@ class IsolatedExecutor:
             self._thread_local.repo = Repo(self.repo_path)
         return self._thread_local.repo
     
+    def plan_sparse_checkout(self, commit_hash: str, parent_hash: str) -> Optional[dict]:
+        """
+        计算commit构建所需的模块，之后执行的各版本只检出这些模块
+        
+        需要的模块 = 变更文件所在的模块 + 其reactor依赖闭包 + 父模块；
+        其余模块只保留pom.xml，使Maven仍能加载完整的reactor。
+        
+        Args:
+            commit_hash: 当前commit hash
+            parent_hash: 父commit hash
+            
+        Returns:
+            dict or None: MavenReactor.required_modules的结果，不需要稀疏检出时返回None
+        """
+        self.sparse_plan = None
+        if not AnalysisConfig.SPARSE_CHECKOUT or not self.checkout_backend.supports_sparse_checkout:
+            return None
+        
+        try:
+            output = self.repo.git.diff('--name-only', '-z', '--no-renames', parent_hash, commit_hash)
+            changed_paths = [path for path in output.split('\0') if path]
+            reactor = MavenReactor(self.repo_path, self.blob_reader)
+            self.sparse_plan = reactor.required_modules([parent_hash, commit_hash], changed_paths)
+        except Exception as e:
+            logger.debug(f"计算稀疏检出模块失败 [{commit_hash[:8]}]: {e}")
+            self.sparse_plan = None
+        
+        if self.sparse_plan:
+            logger.debug(
+                f"稀疏检出 [{commit_hash[:8]}]: 变更模块 {self.sparse_plan['touched']}，"
+                f"共需 {len(self.sparse_plan['required'])} 个模块"
+            )
+        return self.sparse_plan
+    
     def execute_version(self,
                        commit_hash: str,
                        version_type: str,
@@ -82,141 +148,304 @@ class IsolatedExecutor:
             'coverage': {'available': False}
         }
         
-        # 生成worktree路径
-        worktree_path = self._get_worktree_path(commit_hash, version_type)
+        worktree_path = None
+        
+        # 检出和读取文件内容使用的git对象（打patch的版本为合成commit）
+        content_rev = commit_hash
         
         try:
-            # 1. 创建worktree
-            if not self._create_worktree(commit_hash, worktree_path):
-                result['build']['error_message'] = "Failed to create worktree"
-                return result
-            
-            result['worktree_path'] = worktree_path
-            
-            # 2. 应用patch（如果需要）
+            # 1. 应用patch（如果需要）：在临时索引中生成版本的tree对象，不写入工作区
             if patch_content and version_type in ('v05', 't05'):
-                patch_result = self._apply_patch(patch_content, worktree_path)
+                patch_result = self._write_patched_version(commit_hash, patch_content)
                 result['patch_applied'] = patch_result['success']
                 
                 if not patch_result['success']:
                     result['build']['error_message'] = f"Failed to apply patch: {patch_result.get('error')}"
                     return result
+                
+                if patch_result.get('commit'):
+                    content_rev = patch_result['commit']
+                    result['tree_hash'] = patch_result['tree']
             
-            # 3. 执行编译
-            build_result = self._run_maven_compile(worktree_path)
-            result['build'] = build_result
-            
-            if not build_result['success']:
-                return result
-            
-            # 4. 执行测试
-            test_result = self._run_maven_test(worktree_path, changed_test_methods)
-            result['test'] = test_result
+            # 2. 查询执行结果缓存（同一tree、参数、测试集合和JDK只执行一次）
+            if not result.get('tree_hash'):
+                result['tree_hash'] = self.repo.git.rev_parse(f"{content_rev}^{{tree}}")
+            selected_tests = self._build_test_selectors(None, changed_test_methods, content_rev)
+            coverage_classes = self._coverage_classes(changed_source_methods)
+            cache_key = self._execution_cache_key(
+                result['tree_hash'], changed_test_methods, selected_tests, coverage_classes
+            )
             
-            # 5. 收集覆盖率（无论测试是否成功都尝试收集）
-            if build_result['success']:
-                coverage_result = self._collect_coverage(
-                    worktree_path,
-                    changed_source_methods=changed_source_methods,
-                    changed_test_methods=changed_test_methods
-                )
-                result['coverage'] = coverage_result
+            with self.execution_cache.reserve(cache_key):
+                cached = self.execution_cache.get(cache_key) if cache_key else None
+                if cached:
+                    result['build'] = cached['build']
+                    result['test'] = cached['test']
+                    result['execution_cache'] = {'hit': True, 'source': cached.get('source')}
+                    if result['build'].get('success'):
+                        result['coverage'] = self._collect_coverage(
+                            None,
+                            changed_source_methods=changed_source_methods,
+                            changed_test_methods=changed_test_methods,
+                            content_rev=content_rev,
+                            jacoco_report=cached.get('jacoco_report')
+                        )
+                    return result
+                
+                # 3. 创建worktree（启用复用时从池中取出并切换版本）
+                worktree_path = self._acquire_worktree(content_rev, f"{commit_hash[:8]}_{version_type}")
+                if not worktree_path:
+                    result['build']['error_message'] = "Failed to create worktree"
+                    return result
+                
+                result['worktree_path'] = worktree_path
+                
+                # V-0.5/T-0.5从V-1的target/快照开始增量构建（不执行clean）
+                clean = True
+                if version_type in ('v05', 't05') and content_rev != commit_hash:
+                    if self._seed_targets(worktree_path, commit_hash, content_rev):
+                        clean = False
+                        result['seeded_from_v1'] = True
+                
+                # 4. 执行编译和测试（默认单次Maven调用，按阶段拆分编译和测试结果）
+                if AnalysisConfig.SINGLE_INVOCATION_BUILD:
+                    build_result, test_result = self._run_maven_build_and_test(
+                        worktree_path, changed_test_methods, content_rev, selected_tests,
+                        clean=clean, coverage_classes=coverage_classes
+                    )
+                else:
+                    build_result = self._run_maven_compile(worktree_path)
+                    test_result = None
+                    if build_result['success']:
+                        # 5. 执行测试
+                        test_result = self._run_maven_test(
+                            worktree_path, changed_test_methods, content_rev, selected_tests,
+                            clean=clean, coverage_classes=coverage_classes
+                        )
+                
+                result['build'] = build_result
+                if build_result['success']:
+                    result['test'] = test_result
+                    
+                    # 6. 收集覆盖率（无论测试是否成功都尝试收集）
+                    result['coverage'] = self._collect_coverage(
+                        worktree_path,
+                        changed_source_methods=changed_source_methods,
+                        changed_test_methods=changed_test_methods,
+                        content_rev=content_rev
+                    )
+                
+                if version_type == 'v1' and build_result['success']:
+                    self._snapshot_targets(worktree_path, commit_hash)
+                
+                if cache_key and self._is_cacheable(result):
+                    self.execution_cache.put(
+                        cache_key,
+                        result['build'],
+                        result['test'],
+                        jacoco_report=result['coverage'].get('jacoco_report_path'),
+                        source={'commit': commit_hash, 'version': version_type}
+                    )
             
         except Exception as e:
             logger.error(f"执行版本 {version_type} 失败: {e}")
             result['error'] = str(e)
         
         finally:
-            # 清理worktree
-            self._cleanup_worktree(worktree_path)
+            # 归还或清理worktree
+            if worktree_path:
+                self._release_worktree(worktree_path)
         
         return result
     
-    def _get_worktree_path(self, commit_hash: str, version_type: str) -> str:
-        """生成worktree路径"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-        return os.path.join(
-            self.work_dir,
-            f"{self.project_name}_{commit_hash[:8]}_{version_type}_{timestamp}"
-        )
+    def _execution_cache_key(self, tree_hash: str, changed_test_methods: Optional[list],
+                             selected_tests: list,
+                             coverage_classes: Optional[List[str]] = None) -> Optional[str]:
+        """生成执行结果缓存键，未启用缓存时返回None"""
+        if not AnalysisConfig.ENABLE_EXECUTION_CACHE:
+            return None
+        # 限定类时只插桩这些类，报告内容与变更类有关
+        maven_args = [
+            AnalysisConfig.MAVEN_EXECUTABLE or Config.MAVEN_CMD,
+            AnalysisConfig.MAVEN_EXTRA_ARGS,
+            f"jacoco={Config.JACOCO_VERSION}:{Config.JACOCO_INJECTION}",
+            f"single_invocation={AnalysisConfig.SINGLE_INVOCATION_BUILD}",
+            *self._reactor_args(selected_tests),
+            f"coverage_classes={','.join(coverage_classes or [])}"
+        ]
+        # 未提供变更测试时运行全部测试，与"变更测试为空"（跳过测试）区分
+        tests = selected_tests if changed_test_methods is not None else None
+        jdk = ExecutionCache.detect_jdk(AnalysisConfig.JAVA_HOME)
+        return ExecutionCache.make_key(tree_hash, maven_args, tests, jdk)
+    
+    @staticmethod
+    def _is_cacheable(result: Dict[str, Any]) -> bool:
+        """只缓存可复现的结果：超时、异常以及非编译错误导致的构建失败（如依赖下载失败）不缓存"""
+        if result.get('error'):
+            return False
+        build = result['build']
+        if not build.get('success'):
+            return bool(build.get('compile_errors'))
+        test = result['test']
+        return 'timed out' not in (test.get('error_message') or '')
+    
+    def _acquire_worktree(self, revision: str, label: str) -> Optional[str]:
+        """获取检出到指定版本的工作目录"""
+        sparse_dirs = self.sparse_plan['sparse_dirs'] if self.sparse_plan else None
+        return self.checkout_backend.acquire(revision, label, sparse_dirs)
+    
+    def _release_worktree(self, worktree_path: str):
+        """执行完成后归还或删除工作目录"""
+        self.checkout_backend.release(worktree_path)
+    
+    def _reactor_args(self, selected_tests: Optional[list] = None) -> list:
+        """稀疏检出时只构建变更模块及其上游模块"""
+        if not self.sparse_plan:
+            return []
+        args = ['-pl', ','.join(self.sparse_plan['touched']), '-am']
+        if selected_tests:
+            # 上游模块中没有被选中的测试
+            args += ['-Dsurefire.failIfNoSpecifiedTests=false', '-DfailIfNoTests=false']
+        return args
+    
+    # 快照中删除的上一次执行的报告和覆盖率数据（JaCoCo agent默认追加写入jacoco.exec）
+    SEED_EXCLUDED_PATHS = ('surefire-reports', 'jacoco.exec', 'site')
+    
+    # 预置target/后未变更源文件的修改时间，早于快照中的class文件，编译器只重新编译patch涉及的文件
+    SEED_SOURCE_MTIME = 946684800  # 2000-01-01
     
-    def _create_worktree(self, commit_hash: str, worktree_path: str) -> bool:
-        """创建git worktree"""
+    def _find_target_dirs(self, worktree_path: str) -> List[str]:
+        """查找工作区中各模块的target目录（相对路径）"""
+        target_dirs = []
+        for root, dirs, files in os.walk(worktree_path):
+            if 'pom.xml' in files and 'target' in dirs:
+                target_dirs.append(os.path.relpath(os.path.join(root, 'target'), worktree_path))
+            dirs[:] = [d for d in dirs if d not in ('.git', 'target', 'src')]
+        return target_dirs
+    
+    def _snapshot_targets(self, worktree_path: str, commit_hash: str):
+        """
+        保存V-1构建后的target/目录快照（写时复制），供同一父commit的V-0.5/T-0.5增量构建
+        
+        javac和JaCoCo agent会原地改写已有文件，硬链接会让快照和其他版本互相污染，
+        因此使用 `cp --reflink=auto`（不支持reflink的文件系统退化为普通复制）。
+        """
+        if not AnalysisConfig.SEED_FROM_PARENT_BUILD:
+            return
+        
+        seed_dir = os.path.join(self.work_dir, 'seeds', commit_hash)
+        shutil.rmtree(seed_dir, ignore_errors=True)
         try:
-            # 确保路径不存在
-            if os.path.exists(worktree_path):
-                shutil.rmtree(worktree_path)
+            for target_dir in self._find_target_dirs(worktree_path):
+                dest = os.path.join(seed_dir, target_dir)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                copy_tree(os.path.join(worktree_path, target_dir), dest)
+                for name in self.SEED_EXCLUDED_PATHS:
+                    path = os.path.join(dest, name)
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    elif os.path.exists(path):
+                        os.remove(path)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.debug(f"保存target快照失败 [{commit_hash[:8]}]: {e}")
+            shutil.rmtree(seed_dir, ignore_errors=True)
+            return
+        
+        with self._seeds_lock:
+            self._target_seeds[commit_hash] = seed_dir
+    
+    def _seed_targets(self, worktree_path: str, base_hash: str, revision: str) -> bool:
+        """
+        用V-1的target/快照预置工作区，并将未变更源文件的修改时间设为早于快照
+        
+        Args:
+            worktree_path: 工作区路径
+            base_hash: 父commit hash（快照来源）
+            revision: 工作区检出的版本（合成commit）
             
-            # 创建worktree
-            self.repo.git.worktree('add', '--detach', worktree_path, commit_hash)
+        Returns:
+            bool: 是否已预置（未启用、没有快照或失败时返回False，需完整构建）
+        """
+        if not AnalysisConfig.SEED_FROM_PARENT_BUILD:
+            return False
+        with self._seeds_lock:
+            seed_dir = self._target_seeds.get(base_hash)
+        if not seed_dir or not os.path.isdir(seed_dir):
+            return False
+        
+        try:
+            for target_dir in self._find_target_dirs(worktree_path):
+                shutil.rmtree(os.path.join(worktree_path, target_dir), ignore_errors=True)
             
-            with self._worktrees_lock:
-                self._created_worktrees.append(worktree_path)
-            logger.debug(f"创建worktree: {worktree_path}")
-            return True
+            for root, dirs, _ in os.walk(seed_dir):
+                if 'target' in dirs:
+                    target_dir = os.path.relpath(os.path.join(root, 'target'), seed_dir)
+                    module_dir = os.path.join(worktree_path, os.path.dirname(target_dir))
+                    # 稀疏检出时未检出的模块不需要预置
+                    if os.path.isdir(module_dir):
+                        copy_tree(os.path.join(seed_dir, target_dir), os.path.join(worktree_path, target_dir))
+                    dirs.remove('target')
             
-        except GitCommandError as e:
-            logger.error(f"创建worktree失败: {e}")
+            changed = set(
+                path for path in self.repo.git.diff('--name-only', '-z', base_hash, revision).split('\0') if path
+            )
+            for path in self.repo.git.ls_tree('-r', '-z', '--name-only', revision).split('\0'):
+                if not path or path in changed:
+                    continue
+                abs_path = os.path.join(worktree_path, path)
+                if os.path.isfile(abs_path):
+                    os.utime(abs_path, (self.SEED_SOURCE_MTIME, self.SEED_SOURCE_MTIME))
+        except (subprocess.CalledProcessError, OSError, GitCommandError) as e:
+            logger.debug(f"预置target失败 [{base_hash[:8]}]: {e}")
+            for target_dir in self._find_target_dirs(worktree_path):
+                shutil.rmtree(os.path.join(worktree_path, target_dir), ignore_errors=True)
             return False
+        
+        return True
     
-    def _apply_patch(self, patch_content: str, worktree_path: str) -> Dict[str, Any]:
-        """应用patch到worktree"""
-        result = {'success': False}
+    def _write_patched_version(self, base_hash: str, patch_content: str) -> Dict[str, Any]:
+        """
+        将patch应用到基础版本的tree上，生成新的tree对象和对应的合成commit
         
+        在临时索引中执行 `git apply --cached`（失败时再尝试 `--3way`）+ `git write-tree`，
+        只写入git对象库，不接触任何工作区：patch无法应用时在检出之前即可发现。
+        合成commit的作者、时间和提交信息固定，同一基础版本和patch总是得到相同的hash。
+        
+        Args:
+            base_hash: 基础commit hash
+            patch_content: unified diff格式的patch
+            
+        Returns:
+            dict: {'success': bool, 'tree': tree hash, 'commit': 合成commit hash, 'error': str}；
+            空patch时不生成对象（tree/commit为None）
+        """
         if not patch_content or not patch_content.strip():
-            result['success'] = True
-            result['message'] = "Empty patch, nothing to apply"
+            return {
+                'success': True,
+                'tree': None,
+                'commit': None,
+                'message': "Empty patch, nothing to apply"
+            }
+        
+        result = write_patched_tree(
+            self.repo_path, base_hash, patch_content,
+            three_way=True, index_dir=self.work_dir
+        )
+        result['commit'] = None
+        if not result['success']:
+            logger.debug(f"Patch应用失败: {result.get('error')}")
             return result
         
-        patch_file = os.path.join(worktree_path, '.tubench_patch.diff')
-
+        # worktree需要commit才能检出，创建指向该tree的合成commit（不更新任何引用）
         try:
-            # 将patch写入临时文件
-            # Ensure patch ends with newline to avoid "corrupt patch" from git apply
-            if not patch_content.endswith('\n'):
-                patch_content = patch_content + '\n'
-            with open(patch_file, 'w', encoding='utf-8') as f:
-                f.write(patch_content)
-
-            # 应用patch
-            process = subprocess.run(
-                ['git', 'apply', '--verbose', patch_file],
-                cwd=worktree_path,
-                capture_output=True,
-                text=True,
-                timeout=60
+            result['commit'] = commit_tree(
+                self.repo_path, result['tree'], base_hash,
+                f"TUBench patched version of {base_hash}",
+                env_overrides=self.PATCHED_COMMIT_IDENTITY
             )
-
-            if process.returncode == 0:
-                result['success'] = True
-                result['output'] = process.stdout
-            else:
-                # 尝试使用 --3way 选项
-                process2 = subprocess.run(
-                    ['git', 'apply', '--3way', patch_file],
-                    cwd=worktree_path,
-                    capture_output=True,
-                    text=True,
-                    timeout=60
-                )
-
-                if process2.returncode == 0:
-                    result['success'] = True
-                else:
-                    result['error'] = process.stderr or process2.stderr
-                    logger.debug(f"Patch应用失败: {result['error']}")
-
-        except subprocess.TimeoutExpired:
-            result['error'] = "Patch application timed out"
-        except Exception as e:
+        except GitOperationError as e:
+            result['success'] = False
             result['error'] = str(e)
-        finally:
-            # 清理patch文件
-            if os.path.exists(patch_file):
-                try:
-                    os.remove(patch_file)
-                except Exception:
-                    pass
         
         return result
     
@@ -240,6 +469,7 @@ class IsolatedExecutor:
             # 构建Maven命令
             maven_cmd = AnalysisConfig.MAVEN_EXECUTABLE or 'mvn'
             cmd = [maven_cmd, 'compile', '-DskipTests', '-B', '-q']
+            cmd.extend(self._reactor_args())
             
             # 添加额外的Maven参数
             if AnalysisConfig.MAVEN_EXTRA_ARGS:
@@ -252,15 +482,25 @@ class IsolatedExecutor:
                 env['JAVA_HOME'] = AnalysisConfig.JAVA_HOME
                 env['PATH'] = f"{AnalysisConfig.JAVA_HOME}/bin:{env.get('PATH', '')}"
             
-            # 执行编译
-            process = subprocess.run(
-                cmd,
-                cwd=worktree_path,
-                capture_output=True,
-                text=True,
-                timeout=AnalysisConfig.COMPILE_TIMEOUT,
-                env=env
-            )
+            def run_compile(repository_args):
+                return subprocess.run(
+                    cmd + repository_args,
+                    cwd=worktree_path,
+                    capture_output=True,
+                    text=True,
+                    timeout=AnalysisConfig.COMPILE_TIMEOUT,
+                    env=env
+                )
+            
+            # 执行编译（离线执行，缺少构件时在线重试一次）
+            repository = MavenRepository.shared()
+            with repository.lease(maven_cmd) as (offline_args, online_args):
+                process = run_compile(offline_args)
+                if (process.returncode != 0 and online_args is not None
+                        and repository.is_offline_failure(process.stdout + process.stderr)):
+                    logger.debug("离线编译缺少构件，在线重试")
+                    with repository.online(online_args):
+                        process = run_compile(online_args)
             
             result['return_code'] = process.returncode
             result['stdout'] = process.stdout[-5000:] if len(process.stdout) > 5000 else process.stdout
@@ -269,16 +509,7 @@ class IsolatedExecutor:
             if process.returncode == 0:
                 result['success'] = True
             else:
-                error_output = process.stderr or process.stdout
-                result['error_message'] = self._extract_compile_error(error_output)
-                result['compile_errors'] = self._parse_compile_errors(error_output)
-                
-                # 检测是否是兼容性问题
-                compat_issues = self._detect_compatibility_issues(error_output)
-                if compat_issues:
-                    result['compatibility_issues'] = compat_issues
-                    if AnalysisConfig.SKIP_INCOMPATIBLE_COMMITS:
-                        result['skip_reason'] = "compatibility_issue"
+                self._record_compile_failure(result, process.stderr or process.stdout)
                 
         except subprocess.TimeoutExpired:
             result['error_message'] = f"Compilation timed out after {AnalysisConfig.COMPILE_TIMEOUT}s"
@@ -288,8 +519,122 @@ class IsolatedExecutor:
         result['duration_seconds'] = (datetime.now() - start_time).total_seconds()
         return result
     
-    def _run_maven_test(self, worktree_path: str, changed_test_methods: Optional[list] = None) -> Dict[str, Any]:
-        """执行Maven测试并收集覆盖率"""
+    def _record_compile_failure(self, result: Dict[str, Any], error_output: str):
+        """记录编译失败的错误信息和兼容性诊断"""
+        result['error_message'] = self._extract_compile_error(error_output)
+        result['compile_errors'] = self._parse_compile_errors(error_output)
+        
+        # 检测是否是兼容性问题
+        compat_issues = self._detect_compatibility_issues(error_output)
+        if compat_issues:
+            result['compatibility_issues'] = compat_issues
+            if AnalysisConfig.SKIP_INCOMPATIBLE_COMMITS:
+                result['skip_reason'] = "compatibility_issue"
+    
+    def _run_maven_build_and_test(self, worktree_path: str, changed_test_methods: Optional[list] = None,
+                                  content_rev: Optional[str] = None,
+                                  selected_tests: Optional[list] = None,
+                                  clean: bool = True,
+                                  coverage_classes: Optional[List[str]] = None) -> tuple:
+        """
+        单次Maven调用（clean test）完成编译和测试，按输出中的阶段边界拆分结果
+        
+        - 主代码编译（compiler:compile）失败：构建失败
+        - 失败发生在testResources/testCompile/surefire等测试阶段：构建成功，测试结果记录失败原因
+        - 无法从输出判断（如 -q 模式或依赖解析失败）：单独执行一次编译确定构建状态
+        
+        Returns:
+            tuple: (build_result, test_result)，构建失败时test_result为None
+        """
+        if selected_tests is None:
+            selected_tests = self._build_test_selectors(worktree_path, changed_test_methods, content_rev)
+        if changed_test_methods is not None and not selected_tests:
+            # 没有需要运行的测试，只编译
+            build_result = self._run_maven_compile(worktree_path)
+            test_result = None
+            if build_result['success']:
+                test_result = self._run_maven_test(
+                    worktree_path, changed_test_methods, content_rev, selected_tests,
+                    clean=clean, coverage_classes=coverage_classes
+                )
+            return build_result, test_result
+        
+        build_result = {
+            'success': False,
+            'duration_seconds': 0,
+            'command': f"mvn {'clean test' if clean else 'test'} (single invocation)",
+            'single_invocation': True
+        }
+        if not os.path.exists(os.path.join(worktree_path, 'pom.xml')):
+            build_result['error_message'] = "pom.xml not found"
+            return build_result, None
+        
+        start_time = datetime.now()
+        raw_output = []
+        test_result = self._run_maven_test(
+            worktree_path, changed_test_methods, content_rev, selected_tests,
+            raw_output=raw_output, clean=clean, coverage_classes=coverage_classes
+        )
+        output = raw_output[0] if raw_output else ''
+        build_result['duration_seconds'] = (datetime.now() - start_time).total_seconds()
+        build_result['return_code'] = test_result.get('return_code', -1)
+        build_result['stdout'] = output[-5000:]
+        
+        phase = self._detect_failed_phase(output, test_result.get('return_code', -1))
+        if phase == 'compile':
+            self._record_compile_failure(build_result, output)
+            return build_result, None
+        if phase is None:
+            # 无法判断失败发生在哪个阶段（包括超时），单独编译一次确定构建状态
+            compile_result = self._run_maven_compile(worktree_path)
+            if not compile_result['success']:
+                return compile_result, None
+        
+        build_result['success'] = True
+        return build_result, test_result
+    
+    # Maven输出中的goal执行标记: "[INFO] --- maven-compiler-plugin:3.8.1:testCompile (default-testCompile) @ x ---"
+    _GOAL_START_PATTERN = re.compile(r'^\[INFO\] --- (\S+) \(', re.MULTILINE)
+    # 失败的goal: "[ERROR] Failed to execute goal org.apache.maven.plugins:maven-compiler-plugin:3.8.1:compile (default-compile) on project x"
+    _GOAL_FAILED_PATTERN = re.compile(r'Failed to execute goal (\S+) \(')
+    # 主代码编译完成之后才会执行的goal
+    _TEST_PHASE_GOALS = ('testResources', 'testCompile', 'test', 'report')
+    
+    def _detect_failed_phase(self, output: str, return_code: int) -> Optional[str]:
+        """
+        根据单次调用的输出判断失败阶段
+        
+        Returns:
+            str or None: 'none'（成功）、'compile'（主代码编译失败）、'test'（测试阶段失败），
+            无法判断时返回None
+        """
+        if return_code == 0:
+            return 'none'
+        if not output:
+            return None
+        
+        failed = self._GOAL_FAILED_PATTERN.search(output)
+        if failed:
+            coords = failed.group(1).split(':')
+            if coords[-1] == 'compile' and any('compiler' in part for part in coords[:-1]):
+                return 'compile'
+            if coords[-1] in self._TEST_PHASE_GOALS:
+                return 'test'
+        
+        # 测试阶段的goal已经开始执行，说明主代码编译已完成
+        for match in self._GOAL_START_PATTERN.finditer(output):
+            if match.group(1).split(':')[-1] in self._TEST_PHASE_GOALS[:3]:
+                return 'test'
+        return None
+    
+    def _run_maven_test(self, worktree_path: str, changed_test_methods: Optional[list] = None,
+                        content_rev: Optional[str] = None,
+                        selected_tests: Optional[list] = None,
+                        raw_output: Optional[list] = None,
+                        clean: bool = True,
+                        coverage_classes: Optional[List[str]] = None) -> Dict[str, Any]:
+        """执行Maven测试并收集覆盖率（raw_output不为None时追加完整的Maven输出，
+        coverage_classes为JaCoCo插桩和报告限定的类）"""
         result = {
             'success': False,
             'duration_seconds': 0,
@@ -308,7 +653,8 @@ class IsolatedExecutor:
         try:
             # 使用JaCoCo运行测试
             maven_executor = MavenExecutor(worktree_path)
-            selected_tests = self._build_test_selectors(worktree_path, changed_test_methods)
+            if selected_tests is None:
+                selected_tests = self._build_test_selectors(worktree_path, changed_test_methods, content_rev)
             if changed_test_methods is not None and not selected_tests:
                 result['selection_skipped'] = True
                 result['status'] = 'skip'
@@ -317,10 +663,17 @@ class IsolatedExecutor:
                 result['success'] = False
                 return result
 
-            test_result = maven_executor.test_with_jacoco(selected_tests=selected_tests)
+            test_result = maven_executor.test_with_jacoco(
+                selected_tests=selected_tests,
+                extra_args=self._reactor_args(selected_tests),
+                clean=clean,
+                coverage_classes=coverage_classes
+            )
             
             result['return_code'] = test_result.get('return_code', -1)
             test_output = test_result.get('stdout', '') or ''
+            if raw_output is not None:
+                raw_output.append(test_output)
             test_error_output = test_result.get('stderr', '') or ''
             result['stdout'] = test_output[-5000:]
             result['stderr'] = test_error_output[-5000:]
@@ -362,20 +715,28 @@ class IsolatedExecutor:
         result['duration_seconds'] = (datetime.now() - start_time).total_seconds()
         return result
 
-    def _build_test_selectors(self, worktree_path: str, changed_test_methods: Optional[list]) -> list:
+    def _build_test_selectors(self, worktree_path: str, changed_test_methods: Optional[list],
+                              content_rev: Optional[str] = None) -> list:
         """构建Maven Surefire测试选择器列表"""
         if not changed_test_methods:
             return []
 
         class_methods = {}
         class_only = set()
-        resolved = self._resolve_changed_methods(worktree_path, changed_test_methods)
+        resolved = self._resolve_changed_methods(worktree_path, changed_test_methods, content_rev)
         resolved_keys = {
             (m.get('file'), m.get('class'), m.get('method'))
             for m in resolved
         }
         use_resolved = len(resolved_keys) > 0
 
+        # 提供版本对象时从git对象判断文件是否存在，不需要检出工作区
+        existing_files = None
+        if content_rev:
+            file_paths = sorted({m.get('file') for m in changed_test_methods if m.get('file')})
+            blobs = self.blob_reader.read_many((content_rev, path) for path in file_paths)
+            existing_files = {path for path, blob in zip(file_paths, blobs) if blob is not None}
+
         for method in changed_test_methods:
             class_name = method.get('class')
             package = method.get('package')
@@ -387,8 +748,10 @@ class IsolatedExecutor:
                 continue
 
             if file_path:
-                abs_path = os.path.join(worktree_path, file_path)
-                if not os.path.exists(abs_path):
+                if existing_files is not None:
+                    if file_path not in existing_files:
+                        continue
+                elif not os.path.exists(os.path.join(worktree_path, file_path)):
                     continue
 
             if use_resolved and (file_path, class_name, method_name) not in resolved_keys:
@@ -413,18 +776,46 @@ class IsolatedExecutor:
 
         return selectors
     
+    @staticmethod
+    def _coverage_classes(changed_source_methods: Optional[list]) -> Optional[List[str]]:
+        """
+        变更方法所在的顶层类（按源文件名和类名推断，内部类由顶层类的 `$*` 形式覆盖）
+        
+        Returns:
+            list or None: 与覆盖率数据键一致的 "包名.类名" 列表；未启用裁剪或没有变更方法时返回None
+        """
+        if not Config.JACOCO_SCOPE_TO_CHANGED_CLASSES or not changed_source_methods:
+            return None
+        
+        classes = set()
+        for method in changed_source_methods:
+            names = []
+            if method.get('file'):
+                names.append(os.path.splitext(os.path.basename(method['file']))[0])
+            if method.get('class'):
+                names.append(method['class'].split('.')[0])
+            for name in names:
+                classes.add(f"{method.get('package', '')}.{name}")
+        return sorted(classes) or None
+    
     def _collect_coverage(self,
                           worktree_path: str,
                           changed_source_methods: Optional[list] = None,
-                          changed_test_methods: Optional[list] = None) -> Dict[str, Any]:
-        """收集覆盖率信息"""
+                          changed_test_methods: Optional[list] = None,
+                          content_rev: Optional[str] = None,
+                          jacoco_report: Optional[str] = None) -> Dict[str, Any]:
+        """收集覆盖率信息（jacoco_report为空时读取工作区中的报告）"""
         result = {'available': False}
         
         try:
-            jacoco_report = os.path.join(worktree_path, Config.JACOCO_REPORT_PATH)
+            if not jacoco_report:
+                jacoco_report = os.path.join(worktree_path, Config.JACOCO_REPORT_PATH)
             
             if os.path.exists(jacoco_report):
-                coverage_data = self.coverage_analyzer.parse_jacoco_report(jacoco_report)
+                coverage_data = self.coverage_analyzer.parse_jacoco_report(
+                    jacoco_report,
+                    include_classes=self._coverage_classes(changed_source_methods)
+                )
                 
                 if coverage_data:
                     result['available'] = True
@@ -433,7 +824,8 @@ class IsolatedExecutor:
                     if changed_source_methods:
                         resolved_methods = self._resolve_changed_methods(
                             worktree_path,
-                            changed_source_methods
+                            changed_source_methods,
+                            content_rev
                         )
                         method_coverage = self.coverage_analyzer.analyze_test_coverage_for_changes(
                             coverage_data,
@@ -460,8 +852,15 @@ class IsolatedExecutor:
         
         return result
 
-    def _resolve_changed_methods(self, worktree_path: str, changed_methods: list) -> list:
-        """在指定版本的工作区内重新定位变更方法的起止行"""
+    def _resolve_changed_methods(self, worktree_path: str, changed_methods: list,
+                                 content_rev: Optional[str] = None) -> list:
+        """在指定版本的工作区内重新定位变更方法的起止行
+        
+        Args:
+            worktree_path: 工作区路径
+            changed_methods: 变更方法列表
+            content_rev: 版本对应的git对象，提供时通过cat-file读取文件，否则读取工作区文件
+        """
         if not changed_methods:
             return []
 
@@ -469,24 +868,31 @@ class IsolatedExecutor:
         resolved = []
         parsed_cache = {}
 
-        for method in changed_methods:
-            file_rel_path = method.get('file')
-            if not file_rel_path:
-                continue
-
-            file_path = os.path.join(worktree_path, file_rel_path)
-            if not os.path.exists(file_path):
-                continue
-
-            if file_path not in parsed_cache:
+        file_paths = sorted({m.get('file') for m in changed_methods if m.get('file')})
+        if content_rev:
+            blobs = self.blob_reader.read_many((content_rev, path) for path in file_paths)
+            for path, blob in zip(file_paths, blobs):
+                if blob is not None:
+                    content = blob[1].decode('utf-8', errors='ignore')
+                    parsed_cache[path] = code_analyzer.parse_java_file(content, blob_sha=blob[0])
+        else:
+            for path in file_paths:
+                abs_path = os.path.join(worktree_path, path)
+                if not os.path.exists(abs_path):
+                    continue
                 try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
                         content = f.read()
-                    parsed_cache[file_path] = code_analyzer.parse_java_file(content)
+                    parsed_cache[path] = code_analyzer.parse_java_file(content)
                 except Exception:
-                    parsed_cache[file_path] = {'classes': []}
+                    parsed_cache[path] = {'classes': []}
+
+        for method in changed_methods:
+            file_rel_path = method.get('file')
+            if file_rel_path not in parsed_cache:
+                continue
 
-            classes_info = parsed_cache[file_path]
+            classes_info = parsed_cache[file_rel_path]
             class_name = method.get('class')
             method_name = method.get('method')
             parameters = method.get('parameters', [])
@@ -637,8 +1043,6 @@ class IsolatedExecutor:
             'errors': 0
         }
         
-        import re
-        
         # 查找 "Tests run: X, Failures: Y, Errors: Z, Skipped: W"
         pattern = r'Tests run:\s*(\d+),\s*Failures:\s*(\d+),\s*Errors:\s*(\d+),\s*Skipped:\s*(\d+)'
         matches = re.findall(pattern, output)
@@ -777,53 +1181,23 @@ class IsolatedExecutor:
 
         return None
     
-    def _cleanup_worktree(self, worktree_path: str):
-        """清理worktree"""
-        try:
-            if os.path.exists(worktree_path):
-                # 先尝试用git命令删除
-                try:
-                    self.repo.git.worktree('remove', '--force', worktree_path)
-                except:
-                    pass
-                
-                # 如果还存在，强制删除目录
-                if os.path.exists(worktree_path):
-                    shutil.rmtree(worktree_path, ignore_errors=True)
-                
-                logger.debug(f"清理worktree: {worktree_path}")
-                
-                with self._worktrees_lock:
-                    if worktree_path in self._created_worktrees:
-                        self._created_worktrees.remove(worktree_path)
-                    
-        except Exception as e:
-            logger.warning(f"清理worktree失败 {worktree_path}: {e}")
-    
     def cleanup_all(self):
-        """清理所有创建的worktree"""
-        # 清理记录的worktree（获取副本以避免并发修改）
-        with self._worktrees_lock:
-            worktrees_copy = list(self._created_worktrees)
-        for worktree_path in worktrees_copy:
-            self._cleanup_worktree(worktree_path)
-        
-        # 清理可能遗留的worktree
-        try:
-            # 获取所有worktree
-            output = self.repo.git.worktree('list', '--porcelain')
-            
-            for line in output.split('\n'):
-                if line.startswith('worktree '):
-                    path = line.replace('worktree ', '').strip()
-                    # 只清理我们创建的临时worktree
-                    if self.work_dir in path and self.project_name in path:
-                        self._cleanup_worktree(path)
-        except Exception as e:
-            logger.debug(f"清理遗留worktree失败: {e}")
+        """清理本次创建的所有临时工作目录"""
+        self.checkout_backend.close()
         
-        # 执行git worktree prune
-        try:
-            self.repo.git.worktree('prune')
-        except:
-            pass
+        with self._seeds_lock:
+            seeds = list(self._target_seeds.values())
+            self._target_seeds.clear()
+        for seed_dir in seeds:
+            shutil.rmtree(seed_dir, ignore_errors=True)
+    
+    @staticmethod
+    def cleanup_checkout_caches(repo_path: str, work_dir: str = None):
+        """
+        删除所有进程的worktree池和原始副本缓存（Phase 3结束后调用）
+        
+        Args:
+            repo_path: 原始仓库路径
+            work_dir: 工作目录，默认为配置的worktree目录
+        """
+        cleanup_checkout_caches(repo_path, work_dir or AnalysisConfig.ANALYSIS_WORKTREE_DIR)
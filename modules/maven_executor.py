@@ -7,6 +7,8 @@ import subprocess
 from config import Config, AnalysisConfig
 from utils.logger import get_logger
 from utils.pom_modifier import PomModifier
+from modules.maven_repository import MavenRepository
+from modules.coverage_analyzer import CoverageAnalyzer
 
 logger = get_logger()
 
@@ -14,6 +16,9 @@ logger = get_logger()
 class MavenExecutor:
     """Maven执行器"""
     
+    # 命令行注入JaCoCo时使用的插件坐标
+    JACOCO_PLUGIN = f"org.jacoco:jacoco-maven-plugin:{Config.JACOCO_VERSION}"
+    
     def __init__(self, project_path):
         """
         初始化Maven执行器
@@ -40,12 +45,15 @@ class MavenExecutor:
         """执行Maven test"""
         return self._run_maven_command('test')
     
-    def test_with_jacoco(self, selected_tests=None):
+    def test_with_jacoco(self, selected_tests=None, extra_args=None, clean=True, coverage_classes=None):
         """
         使用JaCoCo执行测试
 
         Args:
             selected_tests: 仅执行指定测试（列表或逗号分隔字符串）
+            extra_args: 额外的Maven参数（如 -pl/-am）
+            clean: 是否先执行clean（使用预置的target/增量构建时为False）
+            coverage_classes: 限定插桩和报告的顶层类（"包名.类名"）
         
         Returns:
             dict: {'success': bool, 'output': str, 'jacoco_report': str}
@@ -59,22 +67,30 @@ class MavenExecutor:
             'return_code': -1
         }
         
-        # 修改pom.xml添加JaCoCo
-        pom_modifier = PomModifier(self.pom_path)
+        # 'pom'方式：修改pom.xml添加JaCoCo
+        pom_modifier = PomModifier(self.pom_path) if Config.JACOCO_INJECTION == 'pom' else None
+        cli_injection = pom_modifier is None
         
         try:
-            # 备份并修改POM
-            if not pom_modifier.backup():
-                logger.error("无法备份pom.xml")
-                return result
+            if pom_modifier is not None:
+                # 备份并修改POM
+                if not pom_modifier.backup():
+                    logger.error("无法备份pom.xml")
+                    return result
+                
+                if not pom_modifier.add_jacoco_plugin(include_classes=coverage_classes):
+                    logger.error("无法添加JaCoCo插件")
+                    pom_modifier.restore()
+                    return result
             
-            if not pom_modifier.add_jacoco_plugin():
-                logger.error("无法添加JaCoCo插件")
-                pom_modifier.restore()
-                return result
+            # 删除遗留的报告（预置的target/快照可能带有旧报告，不在reactor中的模块不会被clean）
+            root_report = os.path.join(self.project_path, Config.JACOCO_REPORT_PATH)
+            for report in self._find_module_reports() + [root_report]:
+                if os.path.exists(report):
+                    os.remove(report)
             
-            # 执行clean test
-            extra_args = []
+            # 执行clean test（增量构建时只执行test）
+            extra_args = list(extra_args or [])
             if selected_tests:
                 if isinstance(selected_tests, (list, tuple)):
                     test_value = ",".join([t for t in selected_tests if t])
@@ -83,7 +99,18 @@ class MavenExecutor:
                 if test_value:
                     extra_args.append(f"-Dtest={test_value}")
 
-            success, output = self._run_maven_command('clean test', extra_args=extra_args)
+            goals = ['clean'] if clean else []
+            if cli_injection:
+                agent_arg = self._jacoco_agent_arg(coverage_classes)
+                if agent_arg:
+                    extra_args.append(f"-DargLine={agent_arg}")
+                else:
+                    goals.append(f"{self.JACOCO_PLUGIN}:prepare-agent")
+                goals += ['test', f"{self.JACOCO_PLUGIN}:report"]
+            else:
+                goals.append('test')
+            goal = ' '.join(goals)
+            success, output = self._run_maven_command(goal, extra_args=extra_args)
             result['success'] = success
             result['output'] = output
             result['stdout'] = output
@@ -92,6 +119,11 @@ class MavenExecutor:
             # 获取JaCoCo报告路径
             if success:
                 jacoco_report_path = os.path.join(self.project_path, Config.JACOCO_REPORT_PATH)
+                if not os.path.exists(jacoco_report_path):
+                    # 多模块项目：合并各模块的报告
+                    module_reports = self._find_module_reports()
+                    if module_reports:
+                        CoverageAnalyzer.merge_jacoco_reports(module_reports, jacoco_report_path)
                 if os.path.exists(jacoco_report_path):
                     result['jacoco_report'] = jacoco_report_path
                     logger.debug(f"JaCoCo报告生成: {jacoco_report_path}")
@@ -103,20 +135,107 @@ class MavenExecutor:
         
         finally:
             # 恢复原始POM
-            pom_modifier.restore()
+            if pom_modifier is not None:
+                pom_modifier.restore()
         
         return result
     
-    def _run_maven_command(self, goal, extra_args=None):
+    @staticmethod
+    def _jacoco_agent_arg(coverage_classes):
+        """
+        限定类的JaCoCo agent参数（`-javaagent:<runtime jar>=destfile=...,includes=...`）
+
+        prepare-agent的includes没有命令行属性，'cli'方式限定类时不执行prepare-agent，
+        直接通过surefire的argLine挂载预热时下载的agent运行时jar；
+        报告仍由report goal生成，解析时按同一组类过滤。
+
+        Args:
+            coverage_classes: 限定的顶层类（"包名.类名"）
+
+        Returns:
+            str or None: argLine的值；未限定类或找不到agent jar时返回None
+        """
+        if not coverage_classes:
+            return None
+        agent_jar = MavenRepository.shared().jacoco_agent_jar()
+        if not agent_jar:
+            logger.debug("未找到JaCoCo agent运行时jar，使用prepare-agent（不限定插桩的类）")
+            return None
+
+        includes = []
+        for class_name in coverage_classes:
+            name = class_name.lstrip('.')
+            includes += [name, f"{name}$*"]
+        # surefire默认在模块目录中运行测试，与report goal默认读取的 target/jacoco.exec 一致
+        return f"-javaagent:{agent_jar}=destfile=target/jacoco.exec,includes={':'.join(includes)}"
+    
+    def _find_module_reports(self):
+        """查找各子模块已生成的JaCoCo XML报告（不含根目录）"""
+        reports = []
+        for root, dirs, files in os.walk(self.project_path):
+            if root != self.project_path and 'pom.xml' in files:
+                report = os.path.join(root, Config.JACOCO_REPORT_PATH)
+                if os.path.exists(report):
+                    reports.append(report)
+            dirs[:] = [d for d in dirs if d not in ('.git', 'target', 'src', 'node_modules')]
+        return sorted(reports)
+    
+    def go_offline(self, repository_args):
+        """
+        解析构建所需的全部依赖和插件（包括JaCoCo插件及其运行时agent）
+        
+        Args:
+            repository_args: 本地仓库参数（如 -Dmaven.repo.local=<共享仓库>）
+            
+        Returns:
+            tuple: (success: bool, output: str)
+        """
+        pom_modifier = PomModifier(self.pom_path)
+        if not pom_modifier.backup():
+            return False, "pom.xml not found"
+        
+        try:
+            if Config.JACOCO_INJECTION == 'pom' and not pom_modifier.add_jacoco_plugin():
+                return False, "无法添加JaCoCo插件"
+            
+            # 执行插件的help goal会解析插件本身及其依赖（命令行注入时pom中没有JaCoCo插件）
+            return self._run_maven_command(
+                f"dependency:go-offline dependency:get {self.JACOCO_PLUGIN}:help",
+                extra_args=[f"-Dartifact=org.jacoco:org.jacoco.agent:{Config.JACOCO_VERSION}:jar:runtime"],
+                repository_args=repository_args
+            )
+        finally:
+            pom_modifier.restore()
+    
+    def _run_maven_command(self, goal, extra_args=None, repository_args=None):
         """
         执行Maven命令
         
+        默认离线执行（-o -nsu，使用共享的预热仓库和本进程租用的覆盖仓库），
+        因缺少构件失败时在线重试一次。
+        
         Args:
             goal: Maven目标（如：clean, test, compile）
+            extra_args: 额外的Maven参数
+            repository_args: 指定的本地仓库参数（不使用共享仓库，也不重试）
             
         Returns:
             tuple: (success: bool, output: str)
         """
+        if repository_args is not None:
+            return self._invoke_maven(goal, extra_args, repository_args)
+        
+        repository = MavenRepository.shared()
+        with repository.lease() as (offline_args, online_args):
+            retry_online = online_args is not None
+            success, output = self._invoke_maven(goal, extra_args, offline_args, retry_online=retry_online)
+            if not success and retry_online and repository.is_offline_failure(output):
+                with repository.online(online_args):
+                    success, output = self._invoke_maven(goal, extra_args, online_args)
+        return success, output
+    
+    def _invoke_maven(self, goal, extra_args, repository_args, retry_online=False):
+        """执行一次Maven进程，返回 (success, output)；retry_online表示离线缺少构件时调用方会在线重试"""
         try:
             # 使用配置的Maven可执行文件
             maven_cmd = AnalysisConfig.MAVEN_EXECUTABLE or Config.MAVEN_CMD
@@ -129,6 +248,7 @@ class MavenExecutor:
             if AnalysisConfig.MAVEN_EXTRA_ARGS:
                 cmd += AnalysisConfig.MAVEN_EXTRA_ARGS.split()
             
+            cmd += list(repository_args)
             if extra_args:
                 cmd += list(extra_args)
             cmd += goal.split()
@@ -157,6 +277,8 @@ class MavenExecutor:
                 
                 if success:
                     logger.debug(f"Maven命令执行成功: {goal}")
+                elif retry_online and MavenRepository.shared().is_offline_failure(output):
+                    logger.debug(f"离线构建缺少构件，在线重试: {goal}")
                 else:
                     logger.warning(f"Maven命令执行失败 (返回码: {process.returncode}): {goal}")
                     # Log last part of output for debugging
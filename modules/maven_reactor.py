@@ -0,0 +1,242 @@
+"""
+Maven Reactor模块 - 从git对象解析多模块项目的模块结构，计算commit需要检出的模块
+"""
+
+import posixpath
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional, Set
+
+from git import Git, GitCommandError
+from utils.logger import get_logger
+from modules.blob_reader import BlobReader
+
+logger = get_logger()
+
+
+class MavenReactor:
+    """多模块Maven项目的模块依赖图
+
+    直接通过 `git cat-file` 读取各版本的pom.xml，不需要检出工作区：
+    - 从根pom.xml的 `<modules>`（包括profile中声明的）递归收集所有模块目录
+    - 记录每个模块的坐标、父模块以及依赖/插件/扩展引用的其他模块
+    - 对变更文件所在的模块求依赖闭包，得到构建所需的模块集合
+    """
+
+    # 只保留pom文件的模块在稀疏检出中列出的占位目录：
+    # cone模式会包含所列目录的各级父目录下的文件，但不包含其子目录
+    POM_ONLY_PLACEHOLDER = '.tubench-pom-only'
+
+    def __init__(self, repo_path: str, blob_reader: Optional[BlobReader] = None):
+        """
+        初始化Reactor解析器
+
+        Args:
+            repo_path: 仓库路径
+            blob_reader: 共享的blob读取器，默认新建
+        """
+        self.repo_path = repo_path
+        self.blob_reader = blob_reader or BlobReader(repo_path)
+
+    def load(self, revision: str) -> Dict[str, dict]:
+        """
+        解析指定版本的模块结构
+
+        Args:
+            revision: commit hash
+
+        Returns:
+            dict: {模块目录（根模块为''）: {'coords', 'parent', 'references', 'submodules'}}
+        """
+        modules = {}
+        pending = ['']
+        while pending:
+            module_dir = pending.pop()
+            if module_dir in modules:
+                continue
+            blob = self.blob_reader.read(revision, posixpath.join(module_dir, 'pom.xml'))
+            if blob is None:
+                continue
+            info = self._parse_pom(blob[1], module_dir)
+            if info is None:
+                continue
+            modules[module_dir] = info
+            pending.extend(info['submodules'])
+        return modules
+
+    def required_modules(self, revisions: Iterable[str], changed_paths: Iterable[str]) -> Optional[dict]:
+        """
+        计算commit构建所需的模块
+
+        Args:
+            revisions: 需要合并考虑的版本（父commit和当前commit，模块结构可能发生变化）
+            changed_paths: 变更文件路径（删除和新增的路径都应包含）
+
+        Returns:
+            dict or None: {'touched': 变更涉及的模块目录, 'required': 依赖闭包（含父模块）,
+            'sparse_dirs': cone模式的稀疏检出目录}；
+            单模块项目、无法定位模块或已需要全部模块时返回None（完整检出）
+        """
+        modules = {}
+        top_level_dirs = set()
+        for revision in revisions:
+            top_level_dirs.update(self._top_level_dirs(revision))
+            for module_dir, info in self.load(revision).items():
+                if module_dir in modules:
+                    merged = modules[module_dir]
+                    merged['references'] |= info['references']
+                    merged['submodules'] = sorted(set(merged['submodules']) | set(info['submodules']))
+                else:
+                    modules[module_dir] = dict(info, references=set(info['references']))
+
+        leaf_modules = [d for d, info in modules.items() if d and not info['submodules']]
+        if not leaf_modules:
+            return None
+
+        touched = set()
+        for path in changed_paths:
+            owner = self._owning_module(modules, path)
+            if owner:
+                touched.add(owner)
+            elif owner == '' and posixpath.basename(path) == 'pom.xml' and '/' not in path:
+                # 根pom的变化会影响所有模块
+                return None
+
+        if not touched:
+            return None
+
+        # 修改聚合模块的pom会影响其下所有模块
+        for module_dir in list(touched):
+            if modules[module_dir]['submodules']:
+                prefix = module_dir + '/'
+                touched.update(d for d in leaf_modules if d.startswith(prefix))
+
+        required = self._dependency_closure(modules, touched)
+        if all(d in required for d in leaf_modules):
+            return None
+
+        sparse_dirs = []
+        for module_dir in sorted(modules):
+            if not module_dir:
+                continue
+            if module_dir in required and not modules[module_dir]['submodules']:
+                sparse_dirs.append(module_dir)
+            else:
+                sparse_dirs.append(posixpath.join(module_dir, self.POM_ONLY_PLACEHOLDER))
+
+        # 不属于任何模块的顶层目录（.mvn、共享的checkstyle配置等）可能被构建引用，完整保留
+        for directory in sorted(top_level_dirs):
+            if not any(d == directory or d.startswith(directory + '/') for d in modules if d):
+                sparse_dirs.append(directory)
+
+        return {
+            'touched': sorted(d for d in touched if not modules[d]['submodules']),
+            'required': sorted(d for d in required if d),
+            'sparse_dirs': sparse_dirs
+        }
+
+    def _top_level_dirs(self, revision: str) -> List[str]:
+        """列出版本根目录下的子目录"""
+        try:
+            output = Git(self.repo_path).ls_tree('-d', '-z', '--name-only', revision)
+        except GitCommandError as e:
+            logger.debug(f"列出顶层目录失败 [{revision[:8]}]: {e}")
+            return []
+        return [name for name in output.split('\0') if name]
+
+    def _parse_pom(self, content: bytes, module_dir: str) -> Optional[dict]:
+        """解析单个pom.xml（忽略命名空间）"""
+        try:
+            root = ET.fromstring(content)
+        except ET.ParseError as e:
+            logger.debug(f"解析pom.xml失败 [{module_dir or '.'}]: {e}")
+            return None
+
+        for element in root.iter():
+            if isinstance(element.tag, str) and '}' in element.tag:
+                element.tag = element.tag.split('}', 1)[1]
+
+        parent = root.find('parent')
+        parent_coords = None
+        parent_group = None
+        if parent is not None:
+            parent_group = self._text(parent, 'groupId')
+            parent_coords = (parent_group, self._text(parent, 'artifactId'))
+
+        coords = (self._text(root, 'groupId') or parent_group, self._text(root, 'artifactId'))
+
+        submodules = []
+        for module in root.iter('module'):
+            if module.text and module.text.strip():
+                path = posixpath.normpath(posixpath.join(module_dir, module.text.strip()))
+                if path.endswith('/pom.xml') or path == 'pom.xml':
+                    path = posixpath.dirname(path)
+                if path and path != '.' and not path.startswith('..'):
+                    submodules.append(path)
+
+        references = set()
+        if parent_coords:
+            references.add(parent_coords)
+        for section in [root] + root.findall('profiles/profile'):
+            for dep in section.findall('dependencies/dependency'):
+                references.add((self._text(dep, 'groupId'), self._text(dep, 'artifactId')))
+            # dependencyManagement只有import的BOM会参与构建
+            for dep in section.findall('dependencyManagement/dependencies/dependency'):
+                if self._text(dep, 'scope') == 'import':
+                    references.add((self._text(dep, 'groupId'), self._text(dep, 'artifactId')))
+            for plugin in section.findall('build/plugins/plugin'):
+                references.add((self._text(plugin, 'groupId'), self._text(plugin, 'artifactId')))
+                for dep in plugin.findall('dependencies/dependency'):
+                    references.add((self._text(dep, 'groupId'), self._text(dep, 'artifactId')))
+            for extension in section.findall('build/extensions/extension'):
+                references.add((self._text(extension, 'groupId'), self._text(extension, 'artifactId')))
+
+        return {
+            'coords': coords,
+            'parent': parent_coords,
+            'references': references,
+            'submodules': sorted(set(submodules))
+        }
+
+    @staticmethod
+    def _text(element, tag: str) -> Optional[str]:
+        child = element.find(tag)
+        if child is None or child.text is None:
+            return None
+        return child.text.strip() or None
+
+    @staticmethod
+    def _owning_module(modules: Dict[str, dict], path: str) -> Optional[str]:
+        """返回包含该路径的最深模块目录（根模块为''）"""
+        directory = posixpath.dirname(path)
+        while True:
+            if directory in modules:
+                return directory
+            if not directory:
+                return None
+            directory = posixpath.dirname(directory)
+
+    @staticmethod
+    def _dependency_closure(modules: Dict[str, dict], touched: Set[str]) -> Set[str]:
+        """求变更模块的依赖闭包（依赖、插件、扩展和父模块）"""
+        by_artifact: Dict[str, List[tuple]] = {}
+        for module_dir, info in modules.items():
+            group_id, artifact_id = info['coords']
+            if artifact_id:
+                by_artifact.setdefault(artifact_id, []).append((group_id, module_dir))
+
+        required = set()
+        pending = list(touched)
+        while pending:
+            module_dir = pending.pop()
+            if module_dir in required:
+                continue
+            required.add(module_dir)
+            for group_id, artifact_id in modules[module_dir]['references']:
+                for candidate_group, candidate_dir in by_artifact.get(artifact_id, ()):
+                    # groupId使用属性（${project.groupId}）或省略时只按artifactId匹配
+                    if (group_id and candidate_group and '${' not in group_id
+                            and group_id != candidate_group):
+                        continue
+                    if candidate_dir not in required:
+                        pending.append(candidate_dir)
+        return required
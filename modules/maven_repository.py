@@ -0,0 +1,265 @@
+"""
+Maven本地仓库模块 - 预热共享的本地仓库，构建时离线运行，每个worker使用独立的可写覆盖仓库
+"""
+
+import os
+import re
+import fcntl
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from config import Config, AnalysisConfig
+from utils.logger import get_logger
+from modules.checkout_backends import create_checkout_backend, cleanup_checkout_caches
+
+logger = get_logger()
+
+
+class MavenRepository:
+    """共享的Maven本地仓库
+
+    每个项目在Phase 3开始前执行一次预热（`dependency:go-offline`，pom中注入JaCoCo插件，
+    并下载JaCoCo agent），之后所有Maven调用都使用 `-o -nsu`：
+    - 共享仓库只在预热时写入，构建时通过 `maven.repo.local.tail`（Maven 3.9+）只读使用
+    - 每个并发的Maven进程租用一个覆盖仓库（`maven.repo.local`），写入互不冲突
+    - 离线构建因缺少构件失败时，在线重试一次，缺少的构件下载到覆盖仓库并保留给后续构建
+
+    Maven 3.9以下不支持tail，离线构建直接读取共享仓库，在线重试同样写入共享仓库，
+    重试期间持有共享仓库的排他文件锁（与预热共用），同一时刻只有一个Maven进程写入。
+    """
+
+    # 离线模式下缺少构件/插件时的Maven输出
+    OFFLINE_FAILURE_PATTERN = re.compile(
+        r'in offline mode|has not been downloaded from it before|Cannot access \S+ in offline mode'
+    )
+
+    # 支持 maven.repo.local.tail 的最低Maven版本
+    TAIL_MIN_VERSION = (3, 9, 0)
+
+    PREWARM_MARKER_DIR = '.prewarmed'
+
+    # 共享仓库写入锁（预热、Maven 3.9以下的在线重试）
+    LOCK_FILE = '.tubench.lock'
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    # 每个Maven可执行文件的版本（进程内只探测一次）
+    _maven_versions: Dict[str, Optional[tuple]] = {}
+
+    def __init__(self, shared_dir: str, overlay_dir: str):
+        """
+        初始化Maven本地仓库
+
+        Args:
+            shared_dir: 共享（预热后只读）的本地仓库目录
+            overlay_dir: 各worker覆盖仓库的根目录
+        """
+        # Maven在各检出目录中运行，仓库路径必须是绝对路径
+        self.shared_dir = os.path.abspath(shared_dir)
+        self.overlay_dir = os.path.abspath(overlay_dir)
+
+    @classmethod
+    def shared(cls) -> 'MavenRepository':
+        """获取进程内共享的Maven本地仓库（按AnalysisConfig配置创建）"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls(AnalysisConfig.MAVEN_SHARED_REPO, AnalysisConfig.MAVEN_OVERLAY_DIR)
+        return cls._shared
+
+    @classmethod
+    def maven_version(cls, maven_cmd: str) -> Optional[tuple]:
+        """
+        获取Maven版本（`mvn -v`）
+
+        Args:
+            maven_cmd: Maven可执行文件
+
+        Returns:
+            tuple or None: (major, minor, patch)，无法探测时返回None
+        """
+        if maven_cmd in cls._maven_versions:
+            return cls._maven_versions[maven_cmd]
+
+        version = None
+        try:
+            process = subprocess.run(
+                [maven_cmd, '-v'],
+                capture_output=True,
+                text=True,
+                timeout=60
+            )
+            match = re.search(r'Apache Maven (\d+)\.(\d+)\.(\d+)', process.stdout)
+            if match:
+                version = tuple(int(part) for part in match.groups())
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.debug(f"探测Maven版本失败 [{maven_cmd}]: {e}")
+
+        cls._maven_versions[maven_cmd] = version
+        return version
+
+    def supports_overlay(self, maven_cmd: str) -> bool:
+        """Maven是否支持链式本地仓库（maven.repo.local.tail）"""
+        version = self.maven_version(maven_cmd)
+        return version is not None and version >= self.TAIL_MIN_VERSION
+
+    @contextmanager
+    def lease(self, maven_cmd: Optional[str] = None):
+        """
+        租用一个覆盖仓库，返回离线执行和在线重试的仓库参数
+
+        覆盖仓库 `worker_<n>` 通过文件锁在进程间独占，释放后保留已下载的构件。
+
+        Args:
+            maven_cmd: Maven可执行文件，默认读取配置
+
+        Yields:
+            tuple: (离线参数, 在线重试参数)；未启用离线模式时为 ([], None)
+        """
+        if not AnalysisConfig.MAVEN_OFFLINE:
+            yield [], None
+            return
+
+        maven_cmd = maven_cmd or AnalysisConfig.MAVEN_EXECUTABLE or Config.MAVEN_CMD
+        if not self.supports_overlay(maven_cmd):
+            shared_args = [f"-Dmaven.repo.local={self.shared_dir}"]
+            yield ['-o', '-nsu'] + shared_args, ['-nsu'] + shared_args
+            return
+
+        overlay, lock_fd = self._acquire_overlay()
+        try:
+            repo_args = [f"-Dmaven.repo.local={overlay}", f"-Dmaven.repo.local.tail={self.shared_dir}"]
+            yield ['-o', '-nsu'] + repo_args, ['-nsu'] + repo_args
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    @contextmanager
+    def online(self, online_args):
+        """
+        在线重试的上下文：重试写入共享仓库时（Maven 3.9以下）持有共享仓库的排他锁
+
+        Args:
+            online_args: lease() 返回的在线重试参数
+        """
+        if f"-Dmaven.repo.local={self.shared_dir}" in (online_args or []):
+            with self.exclusive():
+                yield
+        else:
+            yield
+
+    @contextmanager
+    def exclusive(self):
+        """在进程间独占共享仓库的写入（阻塞直到获得文件锁）"""
+        os.makedirs(self.shared_dir, exist_ok=True)
+        lock_fd = os.open(os.path.join(self.shared_dir, self.LOCK_FILE), os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    def _acquire_overlay(self) -> Tuple[str, int]:
+        """独占第一个空闲的覆盖仓库，返回 (目录, 锁文件描述符)"""
+        os.makedirs(self.overlay_dir, exist_ok=True)
+        slot = 0
+        while True:
+            lock_path = os.path.join(self.overlay_dir, f"worker_{slot}.lock")
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(lock_fd)
+                slot += 1
+                continue
+            return os.path.join(self.overlay_dir, f"worker_{slot}"), lock_fd
+
+    def jacoco_agent_jar(self) -> Optional[str]:
+        """
+        JaCoCo agent运行时jar（预热时下载到共享仓库，其次查找默认的 ~/.m2）
+
+        Returns:
+            str or None: jar路径，不存在时返回None
+        """
+        version = Config.JACOCO_VERSION
+        relative_path = os.path.join('org', 'jacoco', 'org.jacoco.agent', version,
+                                     f"org.jacoco.agent-{version}-runtime.jar")
+        for repository in (self.shared_dir, os.path.expanduser(os.path.join('~', '.m2', 'repository'))):
+            agent_jar = os.path.join(repository, relative_path)
+            if os.path.exists(agent_jar):
+                return agent_jar
+        return None
+
+    def is_offline_failure(self, output: str) -> bool:
+        """Maven输出是否表示离线模式下缺少构件"""
+        return bool(output) and bool(self.OFFLINE_FAILURE_PATTERN.search(output))
+
+    def prewarm(self, repo_path: str, revision: str) -> bool:
+        """
+        预热共享仓库：在临时检出目录中注入JaCoCo插件后执行 `dependency:go-offline`
+
+        同一项目和版本只预热一次（共享仓库中记录标记文件）。预热期间持有共享仓库的排他锁，
+        并发启动的进程等待锁后重新检查标记，不会重复预热或同时写入共享仓库。
+
+        Args:
+            repo_path: 项目仓库路径
+            revision: 用于解析依赖的版本
+
+        Returns:
+            bool: 是否预热成功（失败时构建仍会通过在线重试补齐依赖）
+        """
+        if not AnalysisConfig.MAVEN_OFFLINE:
+            return False
+
+        project_name = os.path.basename(os.path.abspath(repo_path))
+        marker = os.path.join(self.shared_dir, self.PREWARM_MARKER_DIR, f"{project_name}_{revision}")
+        if os.path.exists(marker):
+            return True
+
+        with self.exclusive():
+            if os.path.exists(marker):
+                return True
+            success = self._prewarm_locked(repo_path, revision, project_name)
+            if success:
+                os.makedirs(os.path.dirname(marker), exist_ok=True)
+                with open(marker, 'w', encoding='utf-8') as f:
+                    f.write(revision)
+        return success
+
+    def _prewarm_locked(self, repo_path: str, revision: str, project_name: str) -> bool:
+        """在持有共享仓库排他锁时执行预热"""
+        # 延迟导入：MavenExecutor在构建时使用本模块
+        from modules.maven_executor import MavenExecutor
+
+        base_dir = os.path.join(AnalysisConfig.ANALYSIS_WORKTREE_DIR, 'prewarm')
+        work_dir = os.path.join(base_dir, f"{project_name}_{os.getpid()}")
+        os.makedirs(work_dir, exist_ok=True)
+        backend = create_checkout_backend(repo_path, work_dir)
+
+        logger.info(f"  预热Maven仓库 [{project_name} @ {revision[:8]}] -> {self.shared_dir}")
+        success = False
+        path = backend.acquire(revision, f"{revision[:8]}_prewarm")
+        try:
+            if not path:
+                logger.warning(f"预热Maven仓库失败: 无法检出 {revision[:8]}")
+            elif not os.path.exists(os.path.join(path, 'pom.xml')):
+                logger.warning("未找到pom.xml，跳过Maven仓库预热")
+            else:
+                success, output = MavenExecutor(path).go_offline(
+                    [f"-Dmaven.repo.local={self.shared_dir}"]
+                )
+                if not success:
+                    logger.warning(f"预热Maven仓库失败，构建时将在线补齐缺少的构件: {output[-1000:]}")
+        finally:
+            if path:
+                backend.release(path)
+            backend.close()
+            cleanup_checkout_caches(repo_path, base_dir)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return success
@@ -0,0 +1,163 @@
+"""
+方法区间索引模块 - 用区间树回答"某行属于哪个方法"和"某范围内有哪些方法"
+"""
+
+
+class _IntervalNode:
+    """区间树节点：保存跨越center的区间，分别按起点升序、终点降序排列"""
+
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, center, by_start, by_end, left, right):
+        self.center = center
+        self.by_start = by_start
+        self.by_end = by_end
+        self.left = left
+        self.right = right
+
+
+class MethodIndex:
+    """单个文件的方法行号区间索引
+
+    静态中心区间树，点查询和范围查询都是 O(log n + k)。
+    查询结果与原先按列表顺序线性扫描的结果一致：
+    - find(): 返回列表中第一个包含该行的方法
+    - overlapping(): 按列表原顺序返回所有与范围重叠的方法
+    """
+
+    def __init__(self, items, key=None):
+        """
+        构建索引
+
+        Args:
+            items: 方法列表
+            key: 从元素中取 (start_line, end_line) 的函数，默认读取dict的start_line/end_line
+        """
+        self.items = list(items)
+        key = key or self._default_key
+
+        intervals = []
+        # 起点大于终点的异常区间不会包含任何行，但线性范围判断仍可能命中，单独保留
+        self._inverted = []
+        for idx, item in enumerate(self.items):
+            start, end = key(item)
+            if start is None or end is None:
+                continue
+            if start <= end:
+                intervals.append((start, end, idx))
+            else:
+                self._inverted.append((start, end, idx))
+
+        self._intervals = intervals
+        self._root = self._build(intervals)
+
+    @staticmethod
+    def _default_key(item):
+        return item.get('start_line', 0), item.get('end_line', 0)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build(self, intervals):
+        """递归构建区间树"""
+        if not intervals:
+            return None
+
+        endpoints = sorted(p for start, end, _ in intervals for p in (start, end))
+        center = endpoints[len(endpoints) // 2]
+
+        left, right, spanning = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                spanning.append(interval)
+
+        by_start = sorted(spanning, key=lambda iv: iv[0])
+        by_end = sorted(spanning, key=lambda iv: -iv[1])
+        return _IntervalNode(center, by_start, by_end, self._build(left), self._build(right))
+
+    def _stab(self, line_no):
+        """返回包含line_no的所有区间下标"""
+        result = []
+        node = self._root
+        while node is not None:
+            if line_no < node.center:
+                for start, _, idx in node.by_start:
+                    if start > line_no:
+                        break
+                    result.append(idx)
+                node = node.left
+            elif line_no > node.center:
+                for _, end, idx in node.by_end:
+                    if end < line_no:
+                        break
+                    result.append(idx)
+                node = node.right
+            else:
+                result.extend(idx for _, _, idx in node.by_start)
+                break
+        return result
+
+    def _collect_range(self, node, start_line, end_line, result):
+        """收集与 [start_line, end_line] 重叠的区间下标"""
+        while node is not None:
+            if end_line < node.center:
+                for start, _, idx in node.by_start:
+                    if start > end_line:
+                        break
+                    result.append(idx)
+                node = node.left
+            elif start_line > node.center:
+                for _, end, idx in node.by_end:
+                    if end < start_line:
+                        break
+                    result.append(idx)
+                node = node.right
+            else:
+                result.extend(idx for _, _, idx in node.by_start)
+                self._collect_range(node.left, start_line, end_line, result)
+                node = node.right
+
+    def find(self, line_no):
+        """
+        查找包含指定行的方法
+
+        Args:
+            line_no: 行号
+
+        Returns:
+            方法（列表中靠前者优先）或None
+        """
+        indices = self._stab(line_no)
+        if not indices:
+            return None
+        return self.items[min(indices)]
+
+    def overlapping(self, start_line, end_line):
+        """
+        查找与行范围重叠的方法
+
+        Args:
+            start_line: 起始行
+            end_line: 结束行
+
+        Returns:
+            list: 方法列表（保持原顺序）
+        """
+        if start_line > end_line:
+            # 反向范围不满足区间树的前提，按原始判断逐个检查
+            candidates = self._intervals + self._inverted
+        else:
+            candidates = self._inverted
+
+        indices = []
+        if start_line <= end_line:
+            self._collect_range(self._root, start_line, end_line, indices)
+        for start, end, idx in candidates:
+            if not (end < start_line or end_line < start):
+                indices.append(idx)
+        return [self.items[idx] for idx in sorted(indices)]
+
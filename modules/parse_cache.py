@@ -0,0 +1,155 @@
+"""
+解析缓存模块 - 以git blob SHA为键缓存Java文件的类/方法结构
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from config import AnalysisConfig
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+def compute_blob_sha(data: bytes) -> str:
+    """按git的方式计算blob SHA（sha1("blob <size>\\0" + data)）"""
+    sha = hashlib.sha1(b'blob %d\0' % len(data))
+    sha.update(data)
+    return sha.hexdigest()
+
+
+class ParseCache:
+    """Java解析结果缓存
+
+    同一个文件版本会在多个位置被重复解析（commit N的子版本、commit N+1的父版本、
+    方法变更统计、各版本工作区的方法定位）。解析结果只取决于文件内容，
+    因此以blob SHA为键缓存，分为两层：
+    - 内存LRU：进程内复用
+    - 磁盘（可选）：跨进程、跨运行复用，按SHA前两位分目录存放JSON
+
+    缓存内容为 {'package': str, 'classes': [...]}，返回的是共享对象，调用方不应修改。
+    """
+
+    # 解析逻辑变化时递增，旧的磁盘缓存自动失效
+    PARSER_VERSION = 2
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_entries: int = 4096, disk_dir: Optional[str] = None):
+        """
+        初始化解析缓存
+
+        Args:
+            max_entries: 内存LRU最大条目数
+            disk_dir: 磁盘缓存目录，None表示只使用内存缓存
+        """
+        self.max_entries = max_entries
+        self.disk_dir = os.path.join(disk_dir, f"v{self.PARSER_VERSION}") if disk_dir else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def shared(cls) -> 'ParseCache':
+        """获取进程内共享的解析缓存（按AnalysisConfig配置创建）"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls(
+                        max_entries=AnalysisConfig.PARSE_CACHE_SIZE,
+                        disk_dir=AnalysisConfig.PARSE_CACHE_DIR if AnalysisConfig.PARSE_CACHE_PERSIST else None
+                    )
+        return cls._shared
+
+    def get(self, blob_sha: str) -> Optional[dict]:
+        """
+        查询缓存
+
+        Args:
+            blob_sha: blob SHA
+
+        Returns:
+            dict or None: 解析结果，未命中时返回None
+        """
+        with self._lock:
+            outline = self._entries.get(blob_sha)
+            if outline is not None:
+                self._entries.move_to_end(blob_sha)
+                self.hits += 1
+                return outline
+
+        outline = self._read_disk(blob_sha)
+        with self._lock:
+            if outline is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(blob_sha, outline)
+        return outline
+
+    def put(self, blob_sha: str, outline: dict):
+        """
+        写入缓存
+
+        Args:
+            blob_sha: blob SHA
+            outline: 解析结果 {'package': str, 'classes': [...]}
+        """
+        with self._lock:
+            self._store(blob_sha, outline)
+        self._write_disk(blob_sha, outline)
+
+    def clear(self):
+        """清空内存缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, blob_sha: str, outline: dict):
+        """写入内存LRU（调用方持有锁）"""
+        self._entries[blob_sha] = outline
+        self._entries.move_to_end(blob_sha)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, blob_sha: str) -> str:
+        return os.path.join(self.disk_dir, blob_sha[:2], f"{blob_sha[2:]}.json")
+
+    def _read_disk(self, blob_sha: str) -> Optional[dict]:
+        """读取磁盘缓存"""
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(blob_sha)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"读取解析缓存失败 {blob_sha}: {e}")
+            return None
+
+    def _write_disk(self, blob_sha: str, outline: dict):
+        """写入磁盘缓存（先写临时文件再重命名，多进程并发写入安全）"""
+        if not self.disk_dir:
+            return
+        path = self._disk_path(blob_sha)
+        if os.path.exists(path):
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(outline, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.debug(f"写入解析缓存失败 {blob_sha}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
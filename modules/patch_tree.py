@@ -0,0 +1,145 @@
+"""
+Patch树构建模块 - 在临时索引中应用patch生成tree/commit对象，不接触任何工作区
+"""
+
+import os
+import subprocess
+import tempfile
+from typing import Any, Dict, Optional, Sequence
+
+from utils.logger import get_logger
+from utils.exceptions import GitOperationError
+
+logger = get_logger()
+
+
+def write_patched_tree(repo_path: str,
+                       base_rev: str,
+                       patch_content: str,
+                       three_way: bool = False,
+                       apply_args: Sequence[str] = (),
+                       index_dir: Optional[str] = None,
+                       timeout: int = 60) -> Dict[str, Any]:
+    """
+    将patch应用到基础版本的tree上，生成新的tree对象
+
+    使用临时索引（GIT_INDEX_FILE）执行 `git read-tree` + `git apply --cached` + `git write-tree`，
+    只写入git对象库：patch无法应用时不会留下任何文件。
+
+    Args:
+        repo_path: 仓库路径
+        base_rev: 基础commit或tree
+        patch_content: unified diff格式的patch
+        three_way: 直接应用失败时是否再尝试 `--3way`（冲突时write-tree失败）
+        apply_args: 额外的 `git apply` 参数
+        index_dir: 临时索引文件所在目录，默认系统临时目录
+        timeout: 单个git命令的超时（秒）
+
+    Returns:
+        dict: {'success': bool, 'tree': tree hash, 'output': str, 'error': str}
+    """
+    result = {'success': False, 'tree': None}
+
+    # Ensure patch ends with newline to avoid "corrupt patch" from git apply
+    if patch_content and not patch_content.endswith('\n'):
+        patch_content = patch_content + '\n'
+
+    fd, index_file = tempfile.mkstemp(prefix='.tubench_index_', dir=index_dir)
+    os.close(fd)
+    os.remove(index_file)
+
+    env = os.environ.copy()
+    env['GIT_INDEX_FILE'] = index_file
+
+    def run_git(*args, input_text=None):
+        return subprocess.run(
+            ['git', *args],
+            cwd=repo_path,
+            input=input_text,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            env=env
+        )
+
+    try:
+        process = run_git('read-tree', base_rev)
+        if process.returncode != 0:
+            result['error'] = process.stderr.strip()
+            return result
+
+        process = run_git('apply', '--cached', '--verbose', *apply_args, input_text=patch_content)
+        if process.returncode == 0:
+            result['output'] = process.stdout
+        elif three_way:
+            process2 = run_git('apply', '--cached', '--3way', *apply_args, input_text=patch_content)
+            if process2.returncode != 0:
+                result['error'] = process.stderr or process2.stderr
+                return result
+        else:
+            result['error'] = process.stderr
+            return result
+
+        process = run_git('write-tree')
+        if process.returncode != 0:
+            result['error'] = process.stderr.strip()
+            return result
+
+        result['tree'] = process.stdout.strip()
+        result['success'] = True
+
+    except subprocess.TimeoutExpired:
+        result['error'] = "Patch application timed out"
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        # 清理临时索引
+        for path in (index_file, index_file + '.lock'):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception:
+                    pass
+
+    return result
+
+
+def commit_tree(repo_path: str, tree: str, parent: str, message: str,
+                env_overrides: Optional[Dict[str, str]] = None, timeout: int = 60) -> str:
+    """
+    创建指向tree的commit对象（不更新任何引用）
+
+    Args:
+        repo_path: 仓库路径
+        tree: tree hash
+        parent: 父commit hash
+        message: 提交信息
+        env_overrides: 覆盖的环境变量（如固定作者和时间）
+        timeout: 超时（秒）
+
+    Returns:
+        str: commit hash
+
+    Raises:
+        GitOperationError: 创建失败
+    """
+    env = os.environ.copy()
+    if env_overrides:
+        env.update(env_overrides)
+
+    try:
+        process = subprocess.run(
+            ['git', 'commit-tree', tree, '-p', parent, '-F', '-'],
+            cwd=repo_path,
+            input=message,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            env=env
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise GitOperationError(f"git commit-tree失败: {e}")
+
+    if process.returncode != 0:
+        raise GitOperationError(f"git commit-tree失败: {process.stderr.strip()}")
+    return process.stdout.strip()
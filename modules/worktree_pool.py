@@ -0,0 +1,325 @@
+"""
+Worktree池模块 - 在进程内复用长期存在的git worktree，避免每个版本重复创建和删除
+"""
+
+import os
+import re
+import shutil
+import threading
+from typing import Dict, List, Optional
+
+from git import Git, GitCommandError
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class WorktreePool:
+    """可复用的worktree池
+
+    每个进程每个仓库一个池。执行版本时从池中取出空闲worktree，
+    通过 `git checkout --detach` + `git clean -fdx` 切换到目标版本，
+    用完归还而不是删除：
+    - 只在池扩容时执行 `git worktree add`，避免多个线程同时增删worktree争用git管理锁
+    - 切换版本只更新有差异的文件，不再每次完整检出整个文件树
+    - `target/` 随其他未跟踪文件一起清除：默认构建执行 `clean`，保留的输出不会被使用；
+      增量构建由执行器用V-1的快照显式预置
+    - 指定稀疏检出目录时使用cone模式的稀疏检出（规则写在worktree管理目录中，不修改仓库配置），只物化需要的模块
+    """
+
+    # 进程内共享的池 {(repo_path, pool_dir): WorktreePool}
+    _pools: Dict[tuple, 'WorktreePool'] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, repo_path: str, pool_dir: str):
+        """
+        初始化worktree池
+
+        Args:
+            repo_path: 原始仓库路径
+            pool_dir: 池内worktree的存放目录
+        """
+        self.repo_path = repo_path
+        self.pool_dir = os.path.abspath(pool_dir)
+        self._idle: List[str] = []
+        self._worktrees: List[str] = []
+        # 每个worktree最后检出的版本，优先复用同一版本的worktree
+        self._revisions: Dict[str, str] = {}
+        # 每个worktree当前的稀疏检出目录（None表示完整检出）
+        self._sparse: Dict[str, Optional[tuple]] = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+        # 同一进程内的 `worktree add` 串行执行，不阻塞空闲worktree的取还
+        self._create_lock = threading.Lock()
+
+    @classmethod
+    def for_repo(cls, repo_path: str, pool_dir: str) -> 'WorktreePool':
+        """获取进程内共享的worktree池"""
+        key = (os.path.abspath(repo_path), os.path.abspath(pool_dir))
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls(repo_path, pool_dir)
+                cls._pools[key] = pool
+            return pool
+
+    def owns(self, worktree_path: str) -> bool:
+        """判断worktree是否由池管理"""
+        with self._lock:
+            return worktree_path in self._worktrees
+
+    def acquire(self, revision: str, sparse_dirs: Optional[List[str]] = None) -> Optional[str]:
+        """
+        取出一个worktree并切换到指定版本
+
+        Args:
+            revision: 目标commit hash
+            sparse_dirs: cone模式的稀疏检出目录，None表示完整检出
+
+        Returns:
+            str or None: worktree路径，失败时返回None
+        """
+        sparse = tuple(sparse_dirs) if sparse_dirs else None
+        worktree_path = self._take_idle(revision, sparse)
+        if worktree_path:
+            if self._reset(worktree_path, revision, sparse):
+                return worktree_path
+            self._discard(worktree_path)
+
+        return self._create(revision, sparse)
+
+    def release(self, worktree_path: str):
+        """
+        归还worktree（保留工作区，下次取出时再切换版本）
+
+        Args:
+            worktree_path: worktree路径
+        """
+        with self._lock:
+            if worktree_path in self._worktrees and worktree_path not in self._idle:
+                self._idle.append(worktree_path)
+
+    def close(self):
+        """删除池中的所有worktree"""
+        with self._lock:
+            worktrees = list(self._worktrees)
+            self._worktrees.clear()
+            self._idle.clear()
+            self._revisions.clear()
+            self._sparse.clear()
+
+        for worktree_path in worktrees:
+            self._remove(self.repo_path, worktree_path)
+
+    @classmethod
+    def close_all(cls):
+        """删除当前进程中所有池的worktree"""
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for pool in pools:
+            pool.close()
+
+    @classmethod
+    def remove_matching(cls, repo_path: str, path_pattern: str) -> int:
+        """
+        删除路径匹配的worktree（用于清理其他进程留下的池）
+
+        Args:
+            repo_path: 原始仓库路径
+            path_pattern: worktree路径的正则表达式
+
+        Returns:
+            int: 删除的worktree数量
+        """
+        git = Git(repo_path)
+        pattern = re.compile(path_pattern)
+        removed = 0
+
+        try:
+            output = git.worktree('list', '--porcelain')
+        except GitCommandError as e:
+            logger.debug(f"列出worktree失败: {e}")
+            return 0
+
+        for line in output.split('\n'):
+            if not line.startswith('worktree '):
+                continue
+            path = line[len('worktree '):].strip()
+            if pattern.match(path):
+                cls._remove(repo_path, path)
+                removed += 1
+
+        try:
+            git.worktree('prune')
+        except GitCommandError:
+            pass
+        return removed
+
+    def _take_idle(self, revision: str, sparse: Optional[tuple] = None) -> Optional[str]:
+        """取出空闲worktree，优先选择上次检出同一版本（其次同一稀疏目录）的"""
+        with self._lock:
+            if not self._idle:
+                return None
+            for idx in range(len(self._idle) - 1, -1, -1):
+                if self._revisions.get(self._idle[idx]) == revision:
+                    return self._idle.pop(idx)
+            for idx in range(len(self._idle) - 1, -1, -1):
+                if self._sparse.get(self._idle[idx]) == sparse:
+                    return self._idle.pop(idx)
+            return self._idle.pop()
+
+    def _create(self, revision: str, sparse: Optional[tuple] = None) -> Optional[str]:
+        """创建新的worktree加入池中"""
+        with self._lock:
+            worktree_path = os.path.join(self.pool_dir, f"wt_{self._counter}")
+            self._counter += 1
+
+        with self._create_lock:
+            try:
+                if os.path.exists(worktree_path):
+                    shutil.rmtree(worktree_path)
+                os.makedirs(self.pool_dir, exist_ok=True)
+                add_worktree(self.repo_path, worktree_path, revision, sparse)
+            except (GitCommandError, OSError) as e:
+                logger.error(f"创建worktree失败: {e}")
+                self._remove(self.repo_path, worktree_path)
+                return None
+
+        with self._lock:
+            self._worktrees.append(worktree_path)
+            self._revisions[worktree_path] = revision
+            self._sparse[worktree_path] = sparse
+
+        logger.debug(f"创建池worktree: {worktree_path}")
+        return worktree_path
+
+    def _reset(self, worktree_path: str, revision: str, sparse: Optional[tuple] = None) -> bool:
+        """将worktree切换到指定版本并清除上次执行留下的改动"""
+        with self._lock:
+            current_sparse = self._sparse.get(worktree_path)
+        try:
+            if sparse or current_sparse:
+                # 先写入新的稀疏规则，切换版本时按新规则物化文件
+                git = _sparse_git(worktree_path, sparse)
+            else:
+                git = Git(worktree_path)
+            git.checkout('--detach', '--force', '-q', revision)
+            # 清除上次执行留在索引和工作区中的改动
+            git.reset('--hard', '-q')
+            git.clean('-ffdxq')
+            if sparse != current_sparse:
+                # 版本未变化时checkout不会重新应用稀疏规则
+                git.read_tree('-mu', 'HEAD')
+        except (GitCommandError, OSError) as e:
+            logger.debug(f"复用worktree失败 {worktree_path}: {e}")
+            return False
+
+        with self._lock:
+            self._revisions[worktree_path] = revision
+            self._sparse[worktree_path] = sparse
+        return True
+
+    def _discard(self, worktree_path: str):
+        """从池中移除并删除worktree"""
+        with self._lock:
+            if worktree_path in self._worktrees:
+                self._worktrees.remove(worktree_path)
+            self._revisions.pop(worktree_path, None)
+            self._sparse.pop(worktree_path, None)
+        self._remove(self.repo_path, worktree_path)
+
+    @staticmethod
+    def _remove(repo_path: str, worktree_path: str):
+        """删除worktree目录及其git管理信息"""
+        try:
+            Git(repo_path).worktree('remove', '--force', worktree_path)
+        except GitCommandError:
+            pass
+        if os.path.exists(worktree_path):
+            shutil.rmtree(worktree_path, ignore_errors=True)
+        logger.debug(f"删除池worktree: {worktree_path}")
+
+
+def add_worktree(repo_path: str, worktree_path: str, revision: str,
+                 sparse_dirs: Optional[List[str]] = None):
+    """
+    创建detached worktree，指定稀疏检出目录时先设置cone再检出文件
+
+    Args:
+        repo_path: 原始仓库路径
+        worktree_path: worktree路径
+        revision: 目标commit hash
+        sparse_dirs: cone模式的稀疏检出目录，None表示完整检出
+
+    Raises:
+        GitCommandError: git命令失败
+    """
+    git = Git(repo_path)
+    if not sparse_dirs:
+        git.worktree('add', '--detach', worktree_path, revision)
+        return
+
+    # 稀疏检出规则写在worktree自己的管理目录中，开关只通过命令行 `-c` 传入，
+    # 不修改仓库配置（`git sparse-checkout` 会为原始仓库开启extensions.worktreeConfig）
+    git.worktree('add', '--no-checkout', '--detach', worktree_path, revision)
+    _sparse_git(worktree_path, sparse_dirs).checkout('--detach', '--force', '-q', revision)
+
+
+def _cone_patterns(sparse_dirs: List[str]) -> List[str]:
+    """
+    生成cone模式的稀疏检出规则（与 `git sparse-checkout set --cone` 写入的内容一致）
+
+    Args:
+        sparse_dirs: 完整检出的目录
+
+    Returns:
+        List[str]: 规则行
+    """
+    def escape(path):
+        return re.sub(r'([\\*?\[])', r'\\\1', path)
+
+    recursive = sorted(set(d.strip('/') for d in sparse_dirs if d.strip('/')))
+    # 已被上层目录完整包含的目录不需要单独列出
+    recursive = [d for d in recursive
+                 if not any(d.startswith(other + '/') for other in recursive)]
+    parents = set()
+    for directory in recursive:
+        parts = directory.split('/')
+        for depth in range(1, len(parts)):
+            parents.add('/'.join(parts[:depth]))
+
+    patterns = ['/*', '!/*/']
+    for parent in sorted(parents):
+        patterns.append(f"/{escape(parent)}/")
+        patterns.append(f"!/{escape(parent)}/*/")
+    for directory in recursive:
+        patterns.append(f"/{escape(directory)}/")
+    return patterns
+
+
+def _sparse_git(worktree_path: str, sparse_dirs: Optional[List[str]]) -> Git:
+    """
+    写入worktree的稀疏检出规则，返回通过 `-c` 开启稀疏检出的Git对象
+
+    Args:
+        worktree_path: worktree路径
+        sparse_dirs: cone模式的稀疏检出目录，None表示完整检出（规则为 `/*`）
+
+    Returns:
+        Git: 在worktree中执行、带稀疏检出配置的Git对象
+    """
+    git = Git(worktree_path)
+    git_dir = git.rev_parse('--git-dir')
+    info_dir = os.path.join(worktree_path, git_dir, 'info')
+    os.makedirs(info_dir, exist_ok=True)
+
+    patterns = _cone_patterns(sparse_dirs) if sparse_dirs else ['/*']
+    with open(os.path.join(info_dir, 'sparse-checkout'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(patterns) + '\n')
+
+    git.set_persistent_git_options(c=[
+        'core.sparseCheckout=true',
+        f"core.sparseCheckoutCone={'true' if sparse_dirs else 'false'}",
+    ])
+    return git
@@ -0,0 +1,3 @@
+"""
+单元测试（python -m unittest discover tests 或 python -m pytest tests）
+"""
@@ -0,0 +1,54 @@
+"""
+BlobReader测试 - cat-file --batch响应解析
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from modules.blob_reader import BlobReader
+
+
+class BlobReaderTest(unittest.TestCase):
+    """批量读取blob"""
+
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp(prefix='tubench_blob_')
+        os.makedirs(os.path.join(self.repo_path, 'dir'))
+        with open(os.path.join(self.repo_path, 'a b'), 'w') as f:
+            f.write('x\n')
+        with open(os.path.join(self.repo_path, 'dir', 'c d e'), 'w') as f:
+            f.write('y\n')
+        self._git('init', '-q')
+        self._git('add', '.')
+        self._git('-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', 'init')
+        self.reader = BlobReader(self.repo_path)
+
+    def tearDown(self):
+        self.reader.close()
+        shutil.rmtree(self.repo_path, ignore_errors=True)
+
+    def _git(self, *args):
+        subprocess.run(['git', *args], cwd=self.repo_path, check=True, capture_output=True)
+
+    def test_paths_with_spaces(self):
+        results = self.reader.read_many([
+            ('HEAD', 'a b'),
+            ('HEAD', 'x y'),          # 不存在，响应头为 "HEAD:x y missing"
+            ('HEAD', 'dir/c d e'),
+            ('HEAD', 'no such file'),
+            ('HEAD', 'dir'),          # tree对象
+            ('HEAD', 'a b'),
+        ])
+        self.assertEqual([r[1] if r else None for r in results],
+                         [b'x\n', None, b'y\n', None, None, b'x\n'])
+
+    def test_read_single(self):
+        self.assertEqual(self.reader.read('HEAD', 'dir/c d e')[1], b'y\n')
+        self.assertIsNone(self.reader.read('HEAD', 'missing file'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+"""
+CodeAnalyzer测试 - 单次括号扫描计算的方法结束行与原逐方法状态机扫描的结果一致
+"""
+
+import random
+import unittest
+
+from modules.code_analyzer import CodeAnalyzer
+from modules.parse_cache import ParseCache
+
+
+def reference_end_line(file_content, start_line):
+    """原逐方法扫描的参考实现：从start_line开始用状态机跳过字符串和注释中的括号"""
+    lines = file_content.split('\n')
+    if start_line >= len(lines) or start_line < 1:
+        return None
+
+    brace_stack = []
+    found_first_brace = False
+    in_string = in_char = in_multi_comment = escape_next = False
+
+    for line_idx in range(start_line - 1, len(lines)):
+        line = lines[line_idx]
+        in_single_comment = False
+
+        i = 0
+        while i < len(line):
+            char = line[i]
+            next_char = line[i + 1] if i + 1 < len(line) else ''
+
+            if escape_next:
+                escape_next = False
+                i += 1
+                continue
+            if char == '\\' and (in_string or in_char):
+                escape_next = True
+                i += 1
+                continue
+            if in_multi_comment:
+                if char == '*' and next_char == '/':
+                    in_multi_comment = False
+                    i += 2
+                    continue
+                i += 1
+                continue
+            if in_single_comment:
+                i += 1
+                continue
+            if in_string:
+                if char == '"':
+                    in_string = False
+                i += 1
+                continue
+            if in_char:
+                if char == "'":
+                    in_char = False
+                i += 1
+                continue
+            if char == '/' and next_char == '/':
+                in_single_comment = True
+                i += 2
+                continue
+            if char == '/' and next_char == '*':
+                in_multi_comment = True
+                i += 2
+                continue
+            if char == '"':
+                in_string = True
+                i += 1
+                continue
+            if char == "'":
+                in_char = True
+                i += 1
+                continue
+
+            if char == '{':
+                brace_stack.append('{')
+                found_first_brace = True
+            elif char == '}':
+                if brace_stack:
+                    brace_stack.pop()
+                if found_first_brace and len(brace_stack) == 0:
+                    return line_idx + 1
+            i += 1
+
+    return None
+
+
+SOURCE = r'''package demo;
+
+import java.util.function.Supplier;
+
+/**
+ * Javadoc with braces { and } and a stray "quote
+ */
+public class Outer {
+    private static final String OPEN = "{";
+    private static final String ESCAPED = "\"}{\\";
+    private static final char CLOSE = '}';
+    private static final char QUOTE = '\'';
+
+    public int literals() {
+        String s = "}}}" + '{' + "/* not a comment */";
+        // a line comment with an unmatched {
+        /* a block comment } spanning
+           two lines { */
+        return s.length();
+    }
+
+    public Runnable anonymous() {
+        return new Runnable() {
+            @Override
+            public void run() {
+                System.out.println("in run {");
+            }
+        };
+    }
+
+    public Supplier<String> lambda() {
+        Supplier<String> supplier = () -> {
+            if (true) { return "}"; }
+            return "{";
+        };
+        return supplier;
+    }
+
+    public void
+    signatureOnTwoLines(int value)
+    {
+        int[] values = {1, 2, value};
+    }
+
+    abstract static class Nested {
+        abstract void noBody();
+
+        void nestedMethod() { int x = 0; }
+
+        class Inner {
+            String innerMethod() {
+                return "{" + '}';
+            }
+        }
+    }
+
+    interface Callback {
+        void call();
+    }
+}
+'''
+
+
+class BraceIndexTest(unittest.TestCase):
+    """_build_brace_index / _estimate_method_end_line"""
+
+    def setUp(self):
+        self.analyzer = CodeAnalyzer(ParseCache())
+
+    def _assert_matches_reference(self, content, start_lines):
+        brace_index = self.analyzer._build_brace_index(content)
+        for start_line in start_lines:
+            self.assertEqual(
+                self.analyzer._estimate_method_end_line(content, start_line, brace_index),
+                reference_end_line(content, start_line),
+                f"start_line={start_line}\n{content}"
+            )
+
+    def test_method_end_lines_match_reference(self):
+        outline = self.analyzer.parse_outline(SOURCE)
+        methods = {
+            f"{cls['name']}.{method['name']}": method
+            for cls in outline['classes'] for method in cls['methods']
+        }
+        self.assertEqual(set(methods), {
+            'Outer.literals', 'Outer.anonymous', 'Outer.lambda', 'Outer.signatureOnTwoLines',
+            'Outer.Nested.noBody', 'Outer.Nested.nestedMethod', 'Outer.Nested.Inner.innerMethod',
+        })
+        for name, method in methods.items():
+            if name == 'Outer.Nested.noBody':
+                continue
+            self.assertEqual(method['end_line'], reference_end_line(SOURCE, method['start_line']), name)
+
+        lines = SOURCE.split('\n')
+        self.assertEqual(lines[methods['Outer.anonymous']['end_line'] - 1].strip(), '}')
+        self.assertIn('int[] values', lines[methods['Outer.signatureOnTwoLines']['end_line'] - 2])
+
+    def test_every_code_line_matches_reference(self):
+        # 原实现从起始行重新开始扫描，只在行首处于代码区域时两者可比
+        code_lines = [
+            line_no for line_no, line in enumerate(SOURCE.split('\n'), 1)
+            if not line.lstrip().startswith(('*', 'two lines'))
+        ]
+        self._assert_matches_reference(SOURCE, code_lines)
+
+    def test_unclosed_and_out_of_range(self):
+        content = 'class A {\n  void m() {\n    String s = "}";\n'
+        self._assert_matches_reference(content, range(0, 6))
+        self.assertIsNone(self.analyzer._estimate_method_end_line(content, 2))
+
+    def test_random_lines_match_reference(self):
+        # 每行内的字符串、字符常量和注释都闭合，任意行首都处于代码区域
+        tokens = ['{', '}', ' ', 'x', ';', '"{"', '"}"', '"\\""', "'{'", "'}'", "'\\''",
+                  '"\\\\"', '/* } */', '/* { */', '/', '""']
+        rng = random.Random(20240601)
+        for _ in range(300):
+            lines = []
+            for _ in range(rng.randint(1, 12)):
+                line = ''.join(rng.choice(tokens) for _ in range(rng.randint(0, 8)))
+                if rng.random() < 0.2:
+                    line += '// ' + ''.join(rng.choice('{}"\'') for _ in range(3))
+                lines.append(line)
+            content = '\n'.join(lines)
+            self._assert_matches_reference(content, range(0, len(lines) + 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
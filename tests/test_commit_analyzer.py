@@ -0,0 +1,75 @@
+"""
+CommitAnalyzer测试 - 预读取的文件内容携带git blob SHA作为解析缓存key
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from analysis.commit_analyzer import CommitAnalyzer
+from modules.code_analyzer import CodeAnalyzer
+from modules.parse_cache import ParseCache
+
+
+# 注释中含Latin-1字节，按UTF-8解码时会丢弃该字节
+SOURCE = b"""package demo;
+
+/* caf\xe9 */
+public class A {
+    public int value() {
+        return 1;
+    }
+}
+"""
+
+
+class PrefetchBlobShaTest(unittest.TestCase):
+    """_prefetch_file_contents / _extract_methods_from_content"""
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='tubench_commit_')
+        self.repo_path = os.path.join(self.base_dir, 'demo')
+        self.file_path = 'src/main/java/demo/A.java'
+        os.makedirs(os.path.join(self.repo_path, os.path.dirname(self.file_path)))
+        self._git('init', '-q')
+        with open(os.path.join(self.repo_path, self.file_path), 'wb') as f:
+            f.write(SOURCE)
+        self._git('add', '.')
+        self._git('-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', 'c0')
+        self.commit = self._git('rev-parse', 'HEAD').strip()
+        self.blob_sha = self._git('rev-parse', f"HEAD:{self.file_path}").strip()
+
+        self.analyzer = CommitAnalyzer(self.repo_path, os.path.join(self.base_dir, 'out'))
+        self.analyzer.code_analyzer = CodeAnalyzer(ParseCache())
+        self.addCleanup(self.analyzer.git_analyzer.blob_reader.close)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _git(self, *args):
+        return subprocess.run(['git', *args], cwd=self.repo_path, check=True,
+                              capture_output=True, text=True, errors='replace').stdout
+
+    def test_contents_carry_git_blob_sha(self):
+        file_changes = {'source_files': [{'path': self.file_path, 'change_type': 'added'}]}
+        contents = self.analyzer._prefetch_file_contents(self.commit, None, file_changes)
+        blob_sha, content = contents[(self.commit, self.file_path)]
+        self.assertEqual(blob_sha, self.blob_sha)
+        self.assertIn('public class A', content)
+
+        methods = self.analyzer._extract_methods_from_content((blob_sha, content), self.file_path)
+        self.assertEqual([m['method'] for m in methods], ['value'])
+        # 与Phase 3按cat-file读取时使用同一个缓存条目
+        self.assertIsNotNone(self.analyzer.code_analyzer.parse_cache.get(self.blob_sha))
+
+    def test_missing_file_is_none(self):
+        file_changes = {'source_files': [{'path': 'src/main/java/demo/B.java', 'change_type': 'added'}]}
+        contents = self.analyzer._prefetch_file_contents(self.commit, None, file_changes)
+        self.assertIsNone(contents[(self.commit, 'src/main/java/demo/B.java')])
+        self.assertEqual(self.analyzer._extract_methods_from_content(None, 'src/main/java/demo/B.java'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+"""
+CommitDiff测试 - 统一hunk索引与原ChangeDetector逐行解析的hunk和行号一致
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from modules.change_detector import ChangeDetector
+from modules.commit_diff import CommitDiff
+from modules.git_analyzer import GitAnalyzer
+
+
+HUNK_PATTERN = re.compile(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+def reference_split(diff_text):
+    """原_split_diff_by_file的参考实现：按行首的 'diff --git ' 切分，返回 [(file_diff, a_path)]"""
+    file_diffs = []
+    current = None
+    for line in diff_text.split('\n'):
+        if line.startswith('diff --git '):
+            match = re.match(r'diff --git a/(.*?) b/', line)
+            current = [line] if match else None
+            if match:
+                file_diffs.append((current, match.group(1)))
+        elif current is not None:
+            current.append(line)
+    return [('\n'.join(lines), path) for lines, path in file_diffs]
+
+
+def reference_parse_hunks(file_diff):
+    """原ChangeDetector._parse_hunks的参考实现：逐行切分后按行首字符计数"""
+    hunks = []
+    current_hunk = None
+    target_line_no = source_line_no = 0
+
+    for line in file_diff.split('\n'):
+        hunk_match = HUNK_PATTERN.match(line)
+        if hunk_match:
+            if current_hunk:
+                hunks.append(current_hunk)
+            current_hunk = {
+                'source_start': int(hunk_match.group(1)),
+                'source_length': int(hunk_match.group(2)) if hunk_match.group(2) else 1,
+                'target_start': int(hunk_match.group(3)),
+                'target_length': int(hunk_match.group(4)) if hunk_match.group(4) else 1,
+                'added_lines': [],
+                'removed_lines': []
+            }
+            target_line_no = current_hunk['target_start']
+            source_line_no = current_hunk['source_start']
+        elif current_hunk is not None:
+            if line.startswith('+') and not line.startswith('+++'):
+                current_hunk['added_lines'].append(target_line_no)
+                target_line_no += 1
+            elif line.startswith('-') and not line.startswith('---'):
+                current_hunk['removed_lines'].append(source_line_no)
+                source_line_no += 1
+            elif line.startswith(' ') or line == '':
+                target_line_no += 1
+                source_line_no += 1
+
+    if current_hunk:
+        hunks.append(current_hunk)
+    return hunks
+
+
+def reference_parse_diff(diff_text):
+    """原ChangeDetector.parse_diff的参考实现"""
+    return [
+        {
+            'file': file_path,
+            'changes': [
+                {
+                    'type': 'modified',
+                    'added_lines': hunk['added_lines'],
+                    'removed_lines': hunk['removed_lines'],
+                    'start_line': hunk['target_start'],
+                    'end_line': hunk['target_start'] + hunk['target_length']
+                }
+                for hunk in reference_parse_hunks(file_diff)
+            ]
+        }
+        for file_diff, file_path in reference_split(diff_text)
+    ]
+
+
+def hunk_fields(hunk):
+    """DiffHunk转换为与参考实现相同的dict"""
+    return {
+        'source_start': hunk.source_start,
+        'source_length': hunk.source_length,
+        'target_start': hunk.target_start,
+        'target_length': hunk.target_length,
+        'added_lines': list(hunk.added_lines),
+        'removed_lines': list(hunk.removed_lines)
+    }
+
+
+def java_lines(name, count, extra=()):
+    lines = [f"class {name} {{"]
+    lines += [f"    int f{idx}() {{ return {idx}; }}" for idx in range(count)]
+    lines += list(extra)
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+class CommitDiffTest(unittest.TestCase):
+    """CommitDiff.file_hunks / ChangeDetector.parse_diff"""
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='tubench_diff_')
+        self.repo_path = os.path.join(self.base_dir, 'demo')
+        os.makedirs(self.repo_path)
+        self._git('init', '-q')
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _git(self, *args):
+        return subprocess.run(['git', *args], cwd=self.repo_path, check=True,
+                              capture_output=True, text=True).stdout
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.repo_path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        mode = 'wb' if isinstance(content, bytes) else 'w'
+        with open(path, mode) as f:
+            f.write(content)
+
+    def _commit(self, message):
+        self._git('add', '-A')
+        self._git('-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', message)
+        analyzer = GitAnalyzer(self.repo_path)
+        return analyzer.get_full_diff(analyzer.repo.commit('HEAD'))
+
+    def _assert_matches_reference(self, diff_text):
+        commit_diff = CommitDiff(diff_text)
+        reference_files = reference_split(diff_text)
+        self.assertEqual([a_path for _, a_path, _ in commit_diff.iter_files()],
+                         [path for _, path in reference_files])
+
+        for file_diff, path in reference_files:
+            self.assertEqual([hunk_fields(h) for h in commit_diff.file_hunks(path)],
+                             reference_parse_hunks(file_diff), path)
+
+        parsed = ChangeDetector().parse_diff(commit_diff)
+        for entry in parsed:
+            for change in entry['changes']:
+                change['added_lines'] = list(change['added_lines'])
+                change['removed_lines'] = list(change['removed_lines'])
+        self.assertEqual(parsed, reference_parse_diff(diff_text))
+        return commit_diff
+
+    def test_git_diff_matches_reference(self):
+        self._write('src/Keep.java', java_lines('Keep', 40))
+        self._write('src/Old.java', java_lines('Old', 30))
+        self._write('src/Gone.java', java_lines('Gone', 5))
+        self._write('src/Tail.java', java_lines('Tail', 3).rstrip('\n'))
+        self._write('src/Fake.java', java_lines('Fake', 6, ['diff --git a/src/X.java b/src/X.java',
+                                                           'diff --git a/src/W.java b/src/W.java']))
+        self._write('res/blob.bin', bytes(range(256)) * 4)
+        self._commit('c0')
+
+        keep = java_lines('Keep', 40).split('\n')
+        keep[3] = '    int changed() { return -1; }'
+        keep.insert(20, '    int inserted() { return 20; }')
+        del keep[35]
+        self._write('src/Keep.java', '\n'.join(keep))
+        # 重命名并修改
+        os.remove(os.path.join(self.repo_path, 'src/Old.java'))
+        self._write('src/New.java', java_lines('Old', 30, ['    int renamed() { return 0; }']))
+        os.remove(os.path.join(self.repo_path, 'src/Gone.java'))
+        # 文件末尾无换行
+        self._write('src/Tail.java', java_lines('Tail', 4).rstrip('\n'))
+        # hunk中的新增、删除和上下文行都出现 "diff --git" 文本
+        self._write('src/Fake.java', java_lines('Fake', 6, ['diff --git a/src/X.java b/src/X.java',
+                                                           'diff --git a/src/Y.java b/src/Y.java']))
+        self._write('res/blob.bin', bytes(range(255, -1, -1)) * 4)
+        self._write('src/Added.java', '\n'.join(f"// added {idx}" for idx in range(5)) + '\n')
+
+        diff_text = self._commit('c1')
+        self.assertIn('rename from src/Old.java', diff_text)
+        self.assertIn('Binary files', diff_text)
+        self.assertIn('deleted file mode', diff_text)
+        self.assertIn('\\ No newline at end of file', diff_text)
+        for line in ('+diff --git a/src/Y.java', '-diff --git a/src/W.java', ' diff --git a/src/X.java'):
+            self.assertIn('\n' + line, diff_text)
+
+        commit_diff = self._assert_matches_reference(diff_text)
+        self.assertEqual(commit_diff.file_hunks('res/blob.bin'), [])
+        # 重命名文件可以用新旧路径查询
+        renamed = [hunk_fields(h) for h in commit_diff.file_hunks('src/New.java')]
+        self.assertTrue(renamed)
+        self.assertEqual([hunk_fields(h) for h in commit_diff.file_hunks('src/Old.java')], renamed)
+        self.assertEqual([list(h.removed_lines) for h in commit_diff.file_hunks('src/Gone.java')],
+                         [list(range(1, 8))])
+        self.assertEqual(sorted(commit_diff.paths), sorted([
+            'res/blob.bin', 'src/Added.java', 'src/Fake.java', 'src/Gone.java',
+            'src/Keep.java', 'src/New.java', 'src/Tail.java'
+        ]))
+
+    def test_handwritten_edge_cases_match_reference(self):
+        diff_text = '\n'.join([
+            'diff --git a/A.java b/A.java',
+            'index 1111111..2222222 100644',
+            '--- a/A.java',
+            '+++ b/A.java',
+            '@@ -1 +1 @@',
+            '-old',
+            '\\ No newline at end of file',
+            '+new',
+            '\\ No newline at end of file',
+            '@@ -10,4 +10,5 @@ class A {',
+            ' ctx',
+            '',
+            '-gone',
+            '+diff --git a/B.java b/B.java',
+            '+added',
+            ' ctx',
+            'diff --git a/B.java b/B.java',
+            'new file mode 100644',
+            'index 0000000..3333333',
+            '--- /dev/null',
+            '+++ b/B.java',
+            '@@ -0,0 +1,2 @@',
+            '+one',
+            '+two',
+            'diff --git a/C.bin b/C.bin',
+            'index 4444444..5555555 100644',
+            'Binary files a/C.bin and b/C.bin differ',
+        ])
+        commit_diff = self._assert_matches_reference(diff_text)
+        self.assertEqual(commit_diff.paths, ['A.java', 'B.java', 'C.bin'])
+        hunks = commit_diff.file_hunks('A.java')
+        self.assertEqual([list(h.added_lines) for h in hunks], [[1], [12, 13]])
+        self.assertEqual([list(h.removed_lines) for h in hunks], [[1], [12]])
+
+    def test_double_sign_lines_are_counted(self):
+        # 原实现跳过内容以 '++'/'--' 开头的增删行，导致后续行号错位；hunk头给出的行数是准确的
+        diff_text = '\n'.join([
+            'diff --git a/A.java b/A.java',
+            '--- a/A.java',
+            '+++ b/A.java',
+            '@@ -1,3 +1,3 @@',
+            '---i;',
+            '-x;',
+            '+++i;',
+            '+y;',
+            ' z;',
+        ])
+        hunk, = CommitDiff(diff_text).file_hunks('A.java')
+        self.assertEqual(list(hunk.removed_lines), [1, 2])
+        self.assertEqual(list(hunk.added_lines), [1, 2])
+        self.assertEqual(reference_parse_hunks(CommitDiff(diff_text).file_diff('A.java'))[0]['added_lines'], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
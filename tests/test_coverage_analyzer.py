@@ -0,0 +1,332 @@
+"""
+CoverageAnalyzer测试 - 流式解析JaCoCo报告与整树解析的结果一致，紧凑覆盖数据与集合/字典实现的结果一致
+"""
+
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from modules.coverage_analyzer import CoverageAnalyzer, SourceFileCoverage
+
+
+def reference_parse(report_path, include_classes=None):
+    """整树解析（ET.parse）的参考实现，按源文件名过滤"""
+    root = ET.parse(report_path).getroot()
+    coverage_data = {'classes': {}, 'summary': {}}
+
+    for counter in root.findall('counter'):
+        if counter.get('type') == 'LINE':
+            missed = int(counter.get('missed', 0))
+            covered = int(counter.get('covered', 0))
+            coverage_data['summary']['line'] = {'missed': missed, 'covered': covered,
+                                                'total': missed + covered}
+            break
+
+    for package in root.findall('.//package'):
+        package_name = package.get('name', '').replace('/', '.')
+        for sourcefile in package.findall('sourcefile'):
+            source_name = sourcefile.get('name', '')
+            full_class_name = f"{package_name}.{source_name.replace('.java', '')}"
+            if include_classes is not None and full_class_name not in include_classes:
+                continue
+            line_status = {}
+            branch_status = {}
+            for line in sourcefile.findall('line'):
+                nr = int(line.get('nr', 0))
+                ci, mi = int(line.get('ci', 0)), int(line.get('mi', 0))
+                cb, mb = int(line.get('cb', 0)), int(line.get('mb', 0))
+                if ci + mi == 0:
+                    continue
+                line_status[nr] = ci > 0
+                if cb + mb > 0:
+                    branch_status[nr] = {'covered': cb, 'total': cb + mb}
+            if any(line_status.values()):
+                coverage_data['classes'][full_class_name] = {
+                    'source_file': source_name,
+                    'line_status': line_status,
+                    'branch_status': branch_status,
+                }
+    return coverage_data
+
+
+def as_dicts(coverage_data):
+    """将SourceFileCoverage转换为与参考实现相同的字典形式"""
+    classes = {}
+    for name, value in coverage_data['classes'].items():
+        classes[name] = {
+            'source_file': value.source_file,
+            'line_status': {nr: bool(flag) for nr, flag in zip(value.lines, value.covered)},
+            'branch_status': {
+                nr: {'covered': covered, 'total': total}
+                for nr, covered, total in zip(value.branch_lines, value.branch_covered, value.branch_total)
+            },
+        }
+    return {'classes': classes, 'summary': coverage_data['summary']}
+
+
+class ReportBuilder:
+    """生成随机的JaCoCo XML报告"""
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def counter(self, parent, counter_type='LINE'):
+        ET.SubElement(parent, 'counter', {
+            'type': counter_type,
+            'missed': str(self.rng.randint(0, 500)),
+            'covered': str(self.rng.randint(0, 500)),
+        })
+
+    def package(self, parent, name):
+        package = ET.SubElement(parent, 'package', {'name': name})
+        for file_index in range(self.rng.randint(1, 4)):
+            simple = f"C{file_index}"
+            source_name = f"{simple}.java"
+            class_names = [simple, f"{simple}$Inner", f"{simple}$1"][:self.rng.randint(1, 3)]
+            if self.rng.random() < 0.3:
+                class_names.append(f"Extra{file_index}")
+            for class_name in class_names:
+                full = f"{name}/{class_name}" if name else class_name
+                element = ET.SubElement(package, 'class', {'name': full, 'sourcefilename': source_name})
+                method = ET.SubElement(element, 'method', {'name': 'm', 'desc': '()V', 'line': '3'})
+                self.counter(method)
+                self.counter(element)
+            sourcefile = ET.SubElement(package, 'sourcefile', {'name': source_name})
+            covered_any = self.rng.random() < 0.8
+            for nr in sorted(self.rng.sample(range(1, 200), self.rng.randint(1, 40))):
+                ci = self.rng.randint(0, 3) if covered_any else 0
+                mi = self.rng.randint(0, 3)
+                branches = self.rng.choice([0, 0, 2, 4])
+                cb = self.rng.randint(0, branches)
+                ET.SubElement(sourcefile, 'line', {
+                    'nr': str(nr), 'mi': str(mi), 'ci': str(ci),
+                    'mb': str(branches - cb), 'cb': str(cb),
+                })
+            self.counter(sourcefile)
+        self.counter(package)
+        self.counter(package, 'INSTRUCTION')
+
+    def report(self, path, with_groups=False):
+        root = ET.Element('report', {'name': 'demo'})
+        ET.SubElement(root, 'sessioninfo', {'id': 's', 'start': '0', 'dump': '1'})
+        names = ['org/demo', 'org/demo/util', 'com/x', '']
+        if with_groups:
+            for group_index in range(2):
+                group = ET.SubElement(root, 'group', {'name': f"module{group_index}"})
+                for name in names[group_index::2]:
+                    self.package(group, f"{name}/g{group_index}" if name else name)
+                self.counter(group)
+        else:
+            for name in names:
+                self.package(root, name)
+        self.counter(root, 'INSTRUCTION')
+        self.counter(root)
+        with open(path, 'wb') as f:
+            f.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    b'<!DOCTYPE report PUBLIC "-//JACOCO//DTD Report 1.1//EN" "report.dtd">')
+            f.write(ET.tostring(root))
+
+
+class ParseJacocoReportTest(unittest.TestCase):
+    """parse_jacoco_report（iterparse）"""
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='tubench_jacoco_')
+        self.report = os.path.join(self.base_dir, 'jacoco.xml')
+        self.analyzer = CoverageAnalyzer()
+        self.rng = random.Random(24)
+        self.builder = ReportBuilder(self.rng)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def test_matches_tree_parser(self):
+        for round_index in range(20):
+            self.builder.report(self.report, with_groups=bool(round_index % 2))
+            self.assertEqual(as_dicts(self.analyzer.parse_jacoco_report(self.report)),
+                             reference_parse(self.report))
+
+    def test_filter_matches_tree_parser(self):
+        for round_index in range(20):
+            self.builder.report(self.report, with_groups=bool(round_index % 2))
+            all_classes = sorted(reference_parse(self.report)['classes'])
+            include = set(self.rng.sample(all_classes, min(3, len(all_classes))))
+            include.add('org.demo.Missing')
+            self.assertEqual(as_dicts(self.analyzer.parse_jacoco_report(self.report, include)),
+                             reference_parse(self.report, include))
+
+    def test_filter_by_class_element(self):
+        with open(self.report, 'w') as f:
+            f.write(
+                '<report name="demo">'
+                '<package name="pkg">'
+                '<class name="pkg/Util" sourcefilename="Util.java"/>'
+                '<class name="pkg/Helper" sourcefilename="Util.java"/>'
+                '<class name="pkg/Outer$Inner" sourcefilename="Outer.java"/>'
+                '<sourcefile name="Util.java"><line nr="1" mi="0" ci="1" mb="0" cb="0"/></sourcefile>'
+                '<sourcefile name="Outer.java"><line nr="2" mi="0" ci="1" mb="0" cb="0"/></sourcefile>'
+                '<sourcefile name="Other.java"><line nr="3" mi="0" ci="1" mb="0" cb="0"/></sourcefile>'
+                '</package>'
+                '<package name="other"><sourcefile name="Helper.java">'
+                '<line nr="4" mi="0" ci="1" mb="0" cb="0"/></sourcefile></package>'
+                '<counter type="LINE" missed="0" covered="4"/>'
+                '</report>'
+            )
+        # 同一源文件中的其他顶层类映射到所在源文件，内部类按外部类匹配
+        data = self.analyzer.parse_jacoco_report(self.report, ['pkg.Helper', 'pkg.Outer'])
+        self.assertEqual(sorted(data['classes']), ['pkg.Outer', 'pkg.Util'])
+        self.assertEqual(data['summary']['line'], {'missed': 0, 'covered': 4, 'total': 4})
+
+    def test_summary_uses_report_level_counter(self):
+        with open(self.report, 'w') as f:
+            f.write(
+                '<report name="demo">'
+                '<group name="m"><package name="p"><counter type="LINE" missed="9" covered="9"/></package>'
+                '<counter type="LINE" missed="8" covered="8"/></group>'
+                '<counter type="INSTRUCTION" missed="7" covered="7"/>'
+                '<counter type="LINE" missed="1" covered="2"/>'
+                '</report>'
+            )
+        data = self.analyzer.parse_jacoco_report(self.report)
+        self.assertEqual(data['summary']['line'], {'missed': 1, 'covered': 2, 'total': 3})
+        self.assertEqual(data['classes'], {})
+
+    def test_invalid_report(self):
+        self.assertIsNone(self.analyzer.parse_jacoco_report(os.path.join(self.base_dir, 'missing.xml')))
+        with open(self.report, 'w') as f:
+            f.write('<report><package')
+        self.assertIsNone(self.analyzer.parse_jacoco_report(self.report))
+
+
+def reference_method_stats(class_cov, start_line, end_line):
+    """逐行成员测试的参考实现，返回 (是否覆盖, 覆盖行, 插桩行, 覆盖分支, 总分支)"""
+    is_covered = False
+    lines = [0, 0]
+    branches = [0, 0]
+    if class_cov:
+        line_status = class_cov['line_status']
+        branch_status = class_cov['branch_status']
+        for line_num in range(start_line, end_line + 1):
+            if line_status.get(line_num):
+                is_covered = True
+            if line_num in line_status:
+                lines[1] += 1
+                lines[0] += 1 if line_status[line_num] else 0
+            if line_num in branch_status:
+                branches[0] += branch_status[line_num]['covered']
+                branches[1] += branch_status[line_num]['total']
+    return is_covered, lines[0], lines[1], branches[0], branches[1]
+
+
+class SourceFileCoverageTest(unittest.TestCase):
+    """SourceFileCoverage及基于它的方法覆盖率分析"""
+
+    def setUp(self):
+        self.rng = random.Random(25)
+        self.analyzer = CoverageAnalyzer()
+
+    def _random_coverage(self, source_file):
+        line_numbers = sorted(self.rng.sample(range(1, 300), self.rng.randint(0, 80)))
+        covered = [1 if self.rng.random() < 0.6 else 0 for _ in line_numbers]
+        branch_lines = sorted(self.rng.sample(line_numbers, len(line_numbers) // 4))
+        totals = [self.rng.choice([2, 4, 6]) for _ in branch_lines]
+        branch_covered = [self.rng.randint(0, total) for total in totals]
+        return SourceFileCoverage(source_file, line_numbers, covered, branch_lines, branch_covered, totals)
+
+    def _random_methods(self, class_names):
+        methods = []
+        for index in range(self.rng.randint(1, 30)):
+            package, _, class_name = self.rng.choice(class_names).rpartition('.')
+            start = self.rng.randint(-5, 310)
+            methods.append({
+                'package': package,
+                'class': class_name,
+                'method': f"m{index}",
+                # 包含结束行小于开始行的异常范围
+                'start_line': start,
+                'end_line': start + self.rng.randint(-3, 60),
+            })
+        return methods
+
+    def test_range_queries_match_reference(self):
+        for _ in range(200):
+            value = self._random_coverage('A.java')
+            reference = as_dicts({'classes': {'p.A': value}, 'summary': {}})['classes']['p.A']
+            start = self.rng.randint(-5, 310)
+            end = start + self.rng.randint(-3, 80)
+            is_covered, covered, total, covered_branches, total_branches = \
+                reference_method_stats(reference, start, end)
+            self.assertEqual(value.has_covered_line(start, end), is_covered)
+            self.assertEqual(value.line_counts(start, end), (covered, total))
+            self.assertEqual(value.branch_counts(start, end), (covered_branches, total_branches))
+
+    def test_analyzers_match_reference(self):
+        for _ in range(50):
+            data = {'classes': {}, 'summary': {}}
+            for name in ('org.demo.A', 'org.demo.B', 'org.demo.Outer$Inner', 'com.x.Util'):
+                if self.rng.random() < 0.8:
+                    data['classes'][name] = self._random_coverage(f"{name.rsplit('.', 1)[1].split('$')[0]}.java")
+            dicts = as_dicts(data)['classes']
+            methods = self._random_methods(
+                ['org.demo.A', 'org.demo.B', 'org.demo.Outer.Inner', 'com.x.Util', 'org.demo.Missing']
+            )
+
+            method_result = self.analyzer.analyze_test_coverage_for_changes(data, [], methods)
+            line_result = self.analyzer.analyze_changed_methods_line_coverage(data, methods)
+            branch_result = self.analyzer.analyze_changed_methods_branch_coverage(data, methods)
+
+            for index, method in enumerate(methods):
+                full_class_name = f"{method['package']}.{method['class']}"
+                value = data['classes'].get(full_class_name) or self.analyzer._fuzzy_match_class(
+                    data['classes'], method['class'], full_class_name
+                )
+                key = next((k for k, v in data['classes'].items() if v is value), None)
+                is_covered, covered, total, covered_branches, total_branches = reference_method_stats(
+                    dicts.get(key), method['start_line'], method['end_line']
+                )
+                self.assertEqual(method_result['details'][index]['covered'], is_covered)
+                self.assertEqual(line_result['details'][index]['covered_lines'], covered)
+                self.assertEqual(line_result['details'][index]['total_lines'], total)
+                self.assertEqual(branch_result['details'][index]['covered_branches'], covered_branches)
+                self.assertEqual(branch_result['details'][index]['total_branches'], total_branches)
+
+            self.assertEqual(method_result['covered_methods'],
+                             sum(1 for detail in method_result['details'] if detail['covered']))
+            self.assertEqual(line_result['covered_lines'],
+                             sum(detail['covered_lines'] for detail in line_result['details']))
+            self.assertEqual(branch_result['total_branches'],
+                             sum(detail['total_branches'] for detail in branch_result['details']))
+
+    def test_fuzzy_match_by_source_file(self):
+        value = self._random_coverage('Widget.java')
+        data = {'classes': {'org.demo.WidgetImpl': value}}
+        self.assertIs(self.analyzer._fuzzy_match_class(data['classes'], 'Widget', 'org.other.Widget'), value)
+        self.assertIsNone(self.analyzer._fuzzy_match_class(data['classes'], 'Gadget', 'org.other.Gadget'))
+
+    def test_pickle_round_trip(self):
+        value = self._random_coverage('A.java')
+        restored = pickle.loads(pickle.dumps(value))
+        self.assertEqual(restored.__reduce__()[1], value.__reduce__()[1])
+        self.assertEqual(restored.covered_lines(), value.covered_lines())
+        self.assertEqual(restored.line_counts(0, 400), value.line_counts(0, 400))
+
+    def test_empty_and_inverted_ranges(self):
+        value = SourceFileCoverage('A.java', [3, 5, 7], [1, 0, 1], [5], [1], [2])
+        self.assertEqual(value.line_counts(6, 4), (0, 0))
+        self.assertEqual(value.branch_counts(6, 4), (0, 0))
+        self.assertFalse(value.has_covered_line(6, 4))
+        self.assertEqual(value.line_counts(4, 6), (0, 1))
+        self.assertEqual(value.branch_counts(5, 5), (1, 2))
+        self.assertEqual(value.covered_lines(), {3, 7})
+
+        empty = SourceFileCoverage('B.java', [], [])
+        self.assertEqual(empty.line_counts(0, 100), (0, 0))
+        self.assertFalse(empty.has_covered_line(0, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+ExecutionCache测试 - 报告压缩存储和按最近使用时间清理
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from modules.coverage_analyzer import CoverageAnalyzer
+from modules.execution_cache import ExecutionCache
+
+
+REPORT = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<report name="demo">
+  <sessioninfo id="s" start="0" dump="1"/>
+  <package name="pkg">
+    <class name="pkg/A" sourcefilename="A.java"/>
+    <sourcefile name="A.java">
+      <line nr="3" mi="0" ci="2" mb="1" cb="1"/>
+      <line nr="4" mi="2" ci="0" mb="0" cb="0"/>
+      {padding}
+    </sourcefile>
+  </package>
+  <counter type="LINE" missed="1" covered="1"/>
+</report>
+"""
+
+
+class ExecutionCacheTest(unittest.TestCase):
+    """put / get / prune"""
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='tubench_execcache_')
+        self.cache_root = os.path.join(self.base_dir, 'cache')
+        self.report = os.path.join(self.base_dir, 'jacoco.xml')
+        with open(self.report, 'w') as f:
+            f.write(REPORT.format(padding=''))
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _key(self, index):
+        return ExecutionCache.make_key(f"tree{index}", ['-q'], None, 'jdk')
+
+    def test_report_is_compressed_and_parseable(self):
+        with open(self.report, 'w') as f:
+            f.write(REPORT.format(padding='<!-- padding -->\n' * 2000))
+        cache = ExecutionCache(self.cache_root)
+        key = self._key(0)
+        cache.put(key, {'success': True}, {'success': True}, jacoco_report=self.report)
+
+        entry = cache.get(key)
+        self.assertEqual(entry['build'], {'success': True})
+        self.assertTrue(entry['jacoco_report'].endswith('.gz'))
+        self.assertLess(os.path.getsize(entry['jacoco_report']), os.path.getsize(self.report) / 10)
+
+        analyzer = CoverageAnalyzer()
+        cached = analyzer.parse_jacoco_report(entry['jacoco_report'])
+        original = analyzer.parse_jacoco_report(self.report)
+        self.assertEqual(cached['summary'], original['summary'])
+        self.assertEqual(cached['classes']['pkg.A'].__reduce__()[1],
+                         original['classes']['pkg.A'].__reduce__()[1])
+        self.assertEqual(cached['classes']['pkg.A'].covered_lines(), {3})
+
+    def test_prune_removes_least_recently_used(self):
+        cache = ExecutionCache(self.cache_root)
+        now = time.time()
+        for index in range(6):
+            cache.put(self._key(index), {'success': True}, {'success': True}, jacoco_report=self.report)
+            result_file = os.path.join(cache._entry_dir(self._key(index)), ExecutionCache.RESULT_FILE)
+            os.utime(result_file, (now - 100 + index, now - 100 + index))
+        # 命中更新最近使用时间，最早写入的条目不应被删除
+        self.assertIsNotNone(cache.get(self._key(0)))
+
+        entry_size = sum(
+            entry.stat().st_size for entry in os.scandir(cache._entry_dir(self._key(0)))
+        )
+        removed = cache.prune(max_bytes=entry_size * 3)
+        self.assertEqual(removed, 4)
+        remaining = [index for index in range(6) if cache.get(self._key(index))]
+        self.assertEqual(remaining, [0, 5])
+
+    def test_prune_removes_old_versions(self):
+        old_dir = os.path.join(self.cache_root, 'v1', 'ab', 'abc')
+        os.makedirs(old_dir)
+        cache = ExecutionCache(self.cache_root, max_bytes=10 ** 9)
+        cache.put(self._key(0), {'success': True}, {'success': True})
+        self.assertFalse(os.path.exists(os.path.join(self.cache_root, 'v1')))
+        self.assertIsNotNone(cache.get(self._key(0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+MavenExecutor测试 - JaCoCo注入方式和限定类的agent/插件配置
+"""
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+from config import Config, AnalysisConfig
+from modules.maven_executor import MavenExecutor
+from modules.maven_repository import MavenRepository
+
+
+POM = """<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <modelVersion>4.0.0</modelVersion>
+  <groupId>demo</groupId>
+  <artifactId>demo</artifactId>
+  <version>1.0</version>
+</project>
+"""
+
+# 记录命令行和执行时的pom.xml，并写出一份最小的JaCoCo报告
+FAKE_MAVEN = """#!/bin/sh
+echo "$@" > "{log_dir}/args"
+cp pom.xml "{log_dir}/pom.xml"
+mkdir -p target/site/jacoco
+echo '<report name="demo"><counter type="LINE" missed="0" covered="1"/></report>' > target/site/jacoco/jacoco.xml
+"""
+
+
+class MavenExecutorJacocoTest(unittest.TestCase):
+    """test_with_jacoco的注入方式"""
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='tubench_mvn_')
+        self.project = os.path.join(self.base_dir, 'project')
+        self.log_dir = os.path.join(self.base_dir, 'log')
+        os.makedirs(self.project)
+        os.makedirs(self.log_dir)
+        with open(os.path.join(self.project, 'pom.xml'), 'w') as f:
+            f.write(POM)
+
+        maven = os.path.join(self.base_dir, 'mvn')
+        with open(maven, 'w') as f:
+            f.write(FAKE_MAVEN.format(log_dir=self.log_dir))
+        os.chmod(maven, os.stat(maven).st_mode | stat.S_IEXEC)
+
+        # 预热后的共享仓库中的agent运行时jar
+        self.repository = MavenRepository(os.path.join(self.base_dir, 'm2'), os.path.join(self.base_dir, 'ov'))
+        version = Config.JACOCO_VERSION
+        self.agent_jar = os.path.join(self.repository.shared_dir, 'org', 'jacoco', 'org.jacoco.agent', version,
+                                      f"org.jacoco.agent-{version}-runtime.jar")
+        os.makedirs(os.path.dirname(self.agent_jar))
+        open(self.agent_jar, 'wb').close()
+
+        patches = [
+            mock.patch.object(MavenRepository, 'shared', return_value=self.repository),
+            mock.patch.object(AnalysisConfig, 'MAVEN_EXECUTABLE', maven),
+            mock.patch.object(AnalysisConfig, 'MAVEN_EXTRA_ARGS', ''),
+            mock.patch.object(AnalysisConfig, 'MAVEN_OFFLINE', False),
+            mock.patch.object(Config, 'JACOCO_INJECTION', 'cli'),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _read_log(self, name):
+        with open(os.path.join(self.log_dir, name)) as f:
+            return f.read()
+
+    def test_cli_without_coverage_classes(self):
+        result = MavenExecutor(self.project).test_with_jacoco(clean=False)
+        self.assertTrue(result['success'])
+        self.assertIsNotNone(result['jacoco_report'])
+        args = self._read_log('args')
+        self.assertIn(f"{MavenExecutor.JACOCO_PLUGIN}:prepare-agent", args)
+        self.assertNotIn('-DargLine', args)
+        self.assertNotIn('jacoco', self._read_log('pom.xml'))
+
+    def test_cli_scopes_agent_through_arg_line(self):
+        result = MavenExecutor(self.project).test_with_jacoco(
+            clean=False, coverage_classes=['pkg.Outer', '.Top']
+        )
+        self.assertTrue(result['success'])
+        self.assertIsNotNone(result['jacoco_report'])
+
+        args = self._read_log('args')
+        self.assertNotIn('prepare-agent', args)
+        self.assertIn(f"{MavenExecutor.JACOCO_PLUGIN}:report", args)
+        self.assertIn(
+            f"-DargLine=-javaagent:{self.agent_jar}=destfile=target/jacoco.exec,"
+            f"includes=pkg.Outer:pkg.Outer$*:Top:Top$*",
+            args
+        )
+        # 'cli'方式不修改pom.xml
+        self.assertEqual(self._read_log('pom.xml'), POM)
+
+    def test_cli_without_agent_jar_falls_back_to_prepare_agent(self):
+        os.remove(self.agent_jar)
+        with mock.patch('os.path.expanduser', return_value=os.path.join(self.base_dir, 'home')):
+            result = MavenExecutor(self.project).test_with_jacoco(clean=False, coverage_classes=['pkg.Outer'])
+        self.assertTrue(result['success'])
+        args = self._read_log('args')
+        self.assertIn(f"{MavenExecutor.JACOCO_PLUGIN}:prepare-agent", args)
+        self.assertNotIn('-DargLine', args)
+
+    def test_pom_scopes_agent_and_report(self):
+        with mock.patch.object(Config, 'JACOCO_INJECTION', 'pom'):
+            result = MavenExecutor(self.project).test_with_jacoco(clean=False, coverage_classes=['pkg.Outer'])
+        self.assertTrue(result['success'])
+        self.assertIsNotNone(result['jacoco_report'])
+
+        self.assertNotIn('prepare-agent', self._read_log('args'))
+        pom = self._read_log('pom.xml')
+        self.assertIn('jacoco-maven-plugin', pom)
+        for pattern in ('pkg/Outer', 'pkg/Outer$*', 'pkg/Outer.class', 'pkg/Outer$*.class'):
+            self.assertIn(f"<include>{pattern}</include>", pom)
+
+        # 执行后恢复原始pom.xml
+        with open(os.path.join(self.project, 'pom.xml')) as f:
+            self.assertEqual(f.read(), POM)
+
+
+if __name__ == '__main__':
+    unittest.main()
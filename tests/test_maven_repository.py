@@ -0,0 +1,91 @@
+"""
+MavenRepository测试 - 租约参数和共享仓库的写入锁
+"""
+
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from modules.maven_repository import MavenRepository
+
+
+class MavenRepositoryTest(unittest.TestCase):
+    """lease / online / prewarm"""
+
+    OLD_MAVEN = 'mvn-3.8-test'
+    NEW_MAVEN = 'mvn-3.9-test'
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='tubench_m2_')
+        self.repository = MavenRepository(os.path.join(self.base_dir, 'shared'),
+                                          os.path.join(self.base_dir, 'overlays'))
+        MavenRepository._maven_versions[self.OLD_MAVEN] = (3, 8, 6)
+        MavenRepository._maven_versions[self.NEW_MAVEN] = (3, 9, 6)
+
+    def tearDown(self):
+        MavenRepository._maven_versions.pop(self.OLD_MAVEN, None)
+        MavenRepository._maven_versions.pop(self.NEW_MAVEN, None)
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _is_locked(self):
+        os.makedirs(self.repository.shared_dir, exist_ok=True)
+        lock_fd = os.open(os.path.join(self.repository.shared_dir, MavenRepository.LOCK_FILE),
+                          os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(lock_fd)
+        return False
+
+    def test_old_maven_retries_into_shared_repo_under_lock(self):
+        shared_arg = f"-Dmaven.repo.local={self.repository.shared_dir}"
+        with self.repository.lease(self.OLD_MAVEN) as (offline_args, online_args):
+            self.assertIn('-o', offline_args)
+            self.assertIn(shared_arg, offline_args)
+            self.assertNotIn('-o', online_args)
+            self.assertIn(shared_arg, online_args)
+
+            self.assertFalse(self._is_locked())
+            with self.repository.online(online_args):
+                self.assertTrue(self._is_locked())
+            self.assertFalse(self._is_locked())
+
+    def test_overlay_retry_does_not_lock_shared_repo(self):
+        with self.repository.lease(self.NEW_MAVEN) as (offline_args, online_args):
+            self.assertTrue(any(arg.startswith('-Dmaven.repo.local.tail=') for arg in online_args))
+            with self.repository.online(online_args):
+                self.assertFalse(self._is_locked())
+
+    def test_prewarm_rechecks_marker_after_lock(self):
+        revision = 'a' * 40
+        marker = os.path.join(self.repository.shared_dir, MavenRepository.PREWARM_MARKER_DIR,
+                              f"project_{revision}")
+        results = []
+
+        with mock.patch.object(MavenRepository, '_prewarm_locked',
+                               side_effect=AssertionError('prewarmed twice')) as prewarm_locked:
+            with self.repository.exclusive():
+                # 另一个进程正在预热：等待锁期间对方写入标记
+                thread = threading.Thread(
+                    target=lambda: results.append(self.repository.prewarm('/tmp/project', revision))
+                )
+                thread.start()
+                thread.join(0.2)
+                self.assertTrue(thread.is_alive())
+                os.makedirs(os.path.dirname(marker))
+                with open(marker, 'w') as f:
+                    f.write(revision)
+            thread.join(5)
+
+        self.assertEqual(results, [True])
+        prewarm_locked.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+MethodIndex测试 - 区间树查询与原线性扫描的结果一致
+"""
+
+import random
+import unittest
+
+from modules.code_analyzer import CodeAnalyzer
+from modules.method_index import MethodIndex
+from modules.parse_cache import ParseCache
+
+
+def brute_force_find(methods, line_no):
+    """原_find_method_at_line：返回列表中第一个包含该行的方法"""
+    for m in methods:
+        if m.get('start_line', 0) <= line_no <= m.get('end_line', 0):
+            return m
+    return None
+
+
+def brute_force_overlapping(methods, start_line, end_line):
+    """原get_methods_in_range的范围判断：按列表顺序返回所有重叠的方法"""
+    return [m for m in methods
+            if not (m['end_line'] < start_line or end_line < m['start_line'])]
+
+
+class MethodIndexTest(unittest.TestCase):
+    """find / overlapping"""
+
+    def _random_methods(self, rng, count):
+        methods = []
+        for idx in range(count):
+            start = rng.randint(0, 60)
+            roll = rng.random()
+            if roll < 0.15:
+                # 起点大于终点的异常区间
+                end = start - rng.randint(1, 10)
+            elif roll < 0.25:
+                end = start
+            else:
+                end = start + rng.randint(1, 30)
+            methods.append({'name': f"m{idx}", 'method': f"m{idx}", 'start_line': start, 'end_line': end})
+        return methods
+
+    def _assert_same(self, actual, expected, context=None):
+        # 同一位置的方法必须是同一个对象，保证"靠前者优先"的语义
+        self.assertEqual([id(m) for m in actual], [id(m) for m in expected], context)
+
+    def test_find_matches_linear_scan(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            methods = self._random_methods(rng, rng.randint(0, 25))
+            index = MethodIndex(methods)
+            self.assertEqual(len(index), len(methods))
+            for line_no in range(-2, 95):
+                self.assertIs(index.find(line_no), brute_force_find(methods, line_no),
+                              f"line={line_no} methods={methods}")
+
+    def test_overlapping_matches_linear_scan(self):
+        rng = random.Random(11)
+        for _ in range(200):
+            methods = self._random_methods(rng, rng.randint(0, 25))
+            index = MethodIndex(methods)
+            for _ in range(40):
+                start_line = rng.randint(-5, 95)
+                # 约四分之一的查询范围是反向的
+                end_line = start_line + rng.randint(-10, 30)
+                self._assert_same(index.overlapping(start_line, end_line),
+                                  brute_force_overlapping(methods, start_line, end_line),
+                                  f"range=({start_line}, {end_line}) methods={methods}")
+
+    def test_inverted_ranges(self):
+        methods = [
+            {'method': 'inverted', 'start_line': 20, 'end_line': 10},
+            {'method': 'normal', 'start_line': 5, 'end_line': 15},
+            {'method': 'point', 'start_line': 12, 'end_line': 12},
+        ]
+        index = MethodIndex(methods)
+        # 反向区间不包含任何行
+        for line_no in range(0, 25):
+            self.assertIs(index.find(line_no), brute_force_find(methods, line_no))
+        self.assertEqual(index.find(12)['method'], 'normal')
+
+        # 但仍可能满足范围重叠判断
+        for start_line, end_line, expected in ((8, 22, ['inverted', 'normal', 'point']),
+                                               (8, 11, ['normal']),
+                                               (14, 11, ['normal']),
+                                               (21, 9, [])):
+            result = index.overlapping(start_line, end_line)
+            self._assert_same(result, brute_force_overlapping(methods, start_line, end_line))
+            self.assertEqual([m['method'] for m in result], expected)
+
+    def test_get_methods_in_range_with_key(self):
+        rng = random.Random(13)
+        analyzer = CodeAnalyzer(ParseCache())
+        for _ in range(50):
+            classes_info = {'classes': [
+                {'name': f"C{idx}", 'methods': self._random_methods(rng, rng.randint(0, 8))}
+                for idx in range(rng.randint(1, 4))
+            ]}
+            method_index = analyzer.build_method_index(classes_info)
+            for _ in range(20):
+                start_line = rng.randint(-5, 95)
+                end_line = start_line + rng.randint(-10, 30)
+                expected = [
+                    (class_info['name'], method['method'])
+                    for class_info in classes_info['classes']
+                    for method in brute_force_overlapping(class_info['methods'], start_line, end_line)
+                ]
+                for result in (analyzer.get_methods_in_range(classes_info, start_line, end_line),
+                               analyzer.get_methods_in_range(classes_info, start_line, end_line,
+                                                             method_index)):
+                    self.assertEqual([(m['class'], m['method']) for m in result], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
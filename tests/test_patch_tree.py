@@ -0,0 +1,143 @@
+"""
+patch_tree测试 - 在临时索引中应用patch生成的tree与实际提交的tree一致
+"""
+
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from modules.patch_tree import write_patched_tree, commit_tree
+from utils.exceptions import GitOperationError
+
+
+class PatchTreeTest(unittest.TestCase):
+    """write_patched_tree / commit_tree"""
+
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp(prefix='tubench_patch_')
+        self._git('init', '-q')
+        self.rng = random.Random(16)
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_path, ignore_errors=True)
+
+    def _git(self, *args, input_text=None):
+        return subprocess.run(['git', *args], cwd=self.repo_path, check=True,
+                              capture_output=True, text=True, input=input_text).stdout
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.repo_path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _commit(self, message):
+        self._git('add', '-A')
+        self._git('-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', message)
+        return self._git('rev-parse', 'HEAD').strip()
+
+    def _random_lines(self, count):
+        return ''.join(f"line {self.rng.randint(0, 50)}\n" for _ in range(count))
+
+    def _random_change(self, files):
+        """随机修改、新增、删除或重命名文件"""
+        action = self.rng.choice(['edit', 'edit', 'add', 'delete', 'rename'])
+        if action == 'add' or len(files) < 2:
+            name = f"src/d{self.rng.randint(0, 3)}/F{len(files)}_{self.rng.randint(0, 999)}.java"
+            files[name] = self._random_lines(self.rng.randint(1, 30))
+            self._write(name, files[name])
+            return
+        name = self.rng.choice(sorted(files))
+        if action == 'edit':
+            lines = files[name].splitlines(keepends=True)
+            for _ in range(self.rng.randint(1, 4)):
+                pos = self.rng.randint(0, len(lines))
+                if lines and self.rng.random() < 0.5:
+                    del lines[min(pos, len(lines) - 1)]
+                else:
+                    lines.insert(pos, f"changed {self.rng.randint(0, 99)}\n")
+            if not lines:
+                lines = ['x\n']
+            files[name] = ''.join(lines)
+            self._write(name, files[name])
+        elif action == 'delete':
+            os.remove(os.path.join(self.repo_path, name))
+            del files[name]
+        else:
+            new_name = name.replace('.java', '_r.java')
+            os.rename(os.path.join(self.repo_path, name), os.path.join(self.repo_path, new_name))
+            files[new_name] = files.pop(name)
+
+    def test_patched_tree_equals_child_tree(self):
+        files = {}
+        for _ in range(5):
+            self._random_change(files)
+        parent = self._commit('base')
+
+        for round_index in range(30):
+            for _ in range(self.rng.randint(1, 4)):
+                self._random_change(files)
+            child = self._commit(f"change {round_index}")
+            args = ['diff', '--full-index', parent, child]
+            if round_index % 2:
+                args.insert(1, '-M')
+            patch = self._git(*args)
+
+            result = write_patched_tree(self.repo_path, parent, patch)
+            self.assertTrue(result['success'], result.get('error'))
+            self.assertEqual(result['tree'], self._git('rev-parse', f"{child}^{{tree}}").strip())
+            parent = child
+
+    def test_failed_patch_leaves_repo_untouched(self):
+        self._write('a.txt', 'one\ntwo\n')
+        base = self._commit('base')
+        status_before = self._git('status', '--porcelain')
+        patch = (
+            "diff --git a/a.txt b/a.txt\n"
+            "--- a/a.txt\n"
+            "+++ b/a.txt\n"
+            "@@ -1,2 +1,2 @@\n"
+            " nothing\n"
+            "-like\n"
+            "+this\n"
+        )
+        result = write_patched_tree(self.repo_path, base, patch)
+        self.assertFalse(result['success'])
+        self.assertIsNone(result['tree'])
+        self.assertTrue(result['error'])
+        self.assertEqual(self._git('status', '--porcelain'), status_before)
+
+    def test_missing_trailing_newline(self):
+        self._write('a.txt', 'one\n')
+        base = self._commit('base')
+        self._write('a.txt', 'one\ntwo\n')
+        child = self._commit('child')
+        patch = self._git('diff', base, child).rstrip('\n')
+
+        result = write_patched_tree(self.repo_path, base, patch)
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['tree'], self._git('rev-parse', f"{child}^{{tree}}").strip())
+
+    def test_commit_tree_does_not_move_refs(self):
+        self._write('a.txt', 'one\n')
+        base = self._commit('base')
+        tree = self._git('rev-parse', f"{base}^{{tree}}").strip()
+        refs_before = self._git('show-ref')
+
+        commit = commit_tree(self.repo_path, tree, base, 'synthetic', env_overrides={
+            'GIT_AUTHOR_NAME': 't', 'GIT_AUTHOR_EMAIL': 't@t',
+            'GIT_COMMITTER_NAME': 't', 'GIT_COMMITTER_EMAIL': 't@t',
+        })
+        self.assertEqual(self._git('rev-parse', f"{commit}^{{tree}}").strip(), tree)
+        self.assertEqual(self._git('rev-parse', f"{commit}^").strip(), base)
+        self.assertEqual(self._git('show-ref'), refs_before)
+
+        with self.assertRaises(GitOperationError):
+            commit_tree(self.repo_path, '0' * 40, base, 'bad')
+
+
+if __name__ == '__main__':
+    unittest.main()
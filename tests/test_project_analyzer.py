@@ -0,0 +1,78 @@
+"""
+ProjectAnalyzer测试 - Phase 1扫描方式与commit索引的优先级
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from config import AnalysisConfig
+from analysis.project_analyzer import ProjectAnalyzer
+
+
+class Phase1ScanModeTest(unittest.TestCase):
+    """显式指定bloom扫描时不被commit索引覆盖"""
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='tubench_phase1_')
+        self.repo_path = os.path.join(self.base_dir, 'demo')
+        os.makedirs(self.repo_path)
+        self._git('init', '-q')
+        self.expected = []
+        for index in range(4):
+            self._write(f"src/main/java/demo/A{index}.java", f"class A{index} {{}}\n")
+            if index % 2 == 0:
+                self._write(f"src/test/java/demo/A{index}Test.java", f"class A{index}Test {{}}\n")
+            self._git('add', '.')
+            self._git('-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', f"c{index}")
+            # 根commit没有父版本，不作为候选
+            if index % 2 == 0 and index > 0:
+                self.expected.append(self._git('rev-parse', 'HEAD').strip())
+
+        patcher = mock.patch.object(AnalysisConfig, 'CACHE_DIR', os.path.join(self.base_dir, 'cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _git(self, *args):
+        return subprocess.run(['git', *args], cwd=self.repo_path, check=True,
+                              capture_output=True, text=True).stdout
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.repo_path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _analyzer(self, scan_mode):
+        return ProjectAnalyzer(self.repo_path, os.path.join(self.base_dir, f"out_{scan_mode}"),
+                               workers=1, enable_cache=True, scan_mode=scan_mode)
+
+    def test_bloom_takes_precedence_over_commit_index(self):
+        analyzer = self._analyzer('bloom')
+        self.assertIsNotNone(analyzer.commit_index)
+        with mock.patch.object(analyzer, '_get_bloom_candidates',
+                               wraps=analyzer._get_bloom_candidates) as bloom, \
+                mock.patch.object(analyzer, '_get_commit_index',
+                                  wraps=analyzer._get_commit_index) as index:
+            candidates = analyzer._phase1_quick_scan(None)
+        bloom.assert_called_once()
+        index.assert_not_called()
+        self.assertEqual(sorted(candidates), sorted(self.expected))
+
+    def test_stream_uses_commit_index(self):
+        analyzer = self._analyzer('stream')
+        with mock.patch.object(analyzer, '_get_bloom_candidates') as bloom:
+            candidates = analyzer._phase1_quick_scan(None)
+        bloom.assert_not_called()
+        self.assertTrue(analyzer._commit_index_ready)
+        self.assertEqual(sorted(candidates), sorted(self.expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
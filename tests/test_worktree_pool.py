@@ -0,0 +1,122 @@
+"""
+WorktreePool测试 - worktree复用时的版本切换和清理
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from modules.worktree_pool import WorktreePool, _cone_patterns
+
+
+class WorktreePoolTest(unittest.TestCase):
+    """池内worktree的取出、归还和复用"""
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='tubench_pool_')
+        self.repo_path = os.path.join(self.base_dir, 'repo')
+        os.makedirs(os.path.join(self.repo_path, 'core', 'src'))
+        os.makedirs(os.path.join(self.repo_path, 'api', 'src'))
+        self._write('pom.xml', '<project/>\n')
+        self._write('core/src/A.java', 'class A {}\n')
+        self._write('api/src/B.java', 'class B {}\n')
+        self._git('init', '-q')
+        self._git('add', '.')
+        self._commit('c1')
+        self.c1 = self._rev_parse('HEAD')
+        self._write('core/src/A.java', 'class A { int x; }\n')
+        self._git('add', '.')
+        self._commit('c2')
+        self.c2 = self._rev_parse('HEAD')
+        self.pool = WorktreePool(self.repo_path, os.path.join(self.base_dir, 'pool'))
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _write(self, relative_path, content):
+        with open(os.path.join(self.repo_path, relative_path), 'w') as f:
+            f.write(content)
+
+    def _git(self, *args, cwd=None):
+        return subprocess.run(['git', *args], cwd=cwd or self.repo_path, check=True,
+                              capture_output=True, text=True).stdout
+
+    def _commit(self, message):
+        self._git('-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', message)
+
+    def _rev_parse(self, rev, cwd=None):
+        return self._git('rev-parse', rev, cwd=cwd).strip()
+
+    def test_reuse_switches_revision_and_cleans(self):
+        path = self.pool.acquire(self.c1)
+        os.makedirs(os.path.join(path, 'target', 'classes'))
+        self._write_in(path, 'target/classes/A.class', 'stale')
+        self._write_in(path, 'core/src/A.java', 'modified')
+        self._write_in(path, 'untracked.txt', 'x')
+        self.pool.release(path)
+
+        reused = self.pool.acquire(self.c2)
+        self.assertEqual(reused, path)
+        self.assertEqual(self._rev_parse('HEAD', cwd=reused), self.c2)
+        with open(os.path.join(reused, 'core', 'src', 'A.java')) as f:
+            self.assertEqual(f.read(), 'class A { int x; }\n')
+        # 默认构建执行clean，上一版本的target/不应保留
+        self.assertFalse(os.path.exists(os.path.join(reused, 'target')))
+        self.assertFalse(os.path.exists(os.path.join(reused, 'untracked.txt')))
+
+    def test_concurrent_acquire_creates_new_worktree(self):
+        first = self.pool.acquire(self.c1)
+        second = self.pool.acquire(self.c1)
+        self.assertNotEqual(first, second)
+        self.assertTrue(self.pool.owns(second))
+        self.pool.close()
+        self.assertFalse(os.path.exists(first))
+        self.assertNotIn(first, self._git('worktree', 'list'))
+
+    def test_sparse_checkout_keeps_repo_config(self):
+        os.makedirs(os.path.join(self.repo_path, 'apps', 'web'))
+        self._write('apps/web/C.java', 'class C {}\n')
+        self._write('api/pom.xml', '<project/>\n')
+        self._git('add', '.')
+        self._commit('c3')
+        c3 = self._rev_parse('HEAD')
+        config_before = self._git('config', '--list', '--local')
+
+        sparse_dirs = ['core', 'api/__pom_only__', 'apps/web']
+        path = self.pool.acquire(c3, sparse_dirs)
+        self.assertTrue(os.path.exists(os.path.join(path, 'core', 'src', 'A.java')))
+        self.assertTrue(os.path.exists(os.path.join(path, 'apps', 'web', 'C.java')))
+        self.assertTrue(os.path.exists(os.path.join(path, 'api', 'pom.xml')))
+        self.assertFalse(os.path.exists(os.path.join(path, 'api', 'src')))
+        self.pool.release(path)
+
+        # 切换到完整检出后所有文件都应物化
+        reused = self.pool.acquire(c3)
+        self.assertEqual(reused, path)
+        self.assertTrue(os.path.exists(os.path.join(reused, 'api', 'src', 'B.java')))
+        self.pool.release(reused)
+
+        reused = self.pool.acquire(self.c2, ['core'])
+        self.assertTrue(os.path.exists(os.path.join(reused, 'core', 'src', 'A.java')))
+        self.assertFalse(os.path.exists(os.path.join(reused, 'api', 'src')))
+
+        self.assertEqual(self._git('config', '--list', '--local'), config_before)
+
+    def test_cone_patterns_match_git(self):
+        sparse_dirs = ['core', 'api/__pom_only__', 'apps/web', 'apps/web/sub', 'a b', 'x[1]']
+        self._git('sparse-checkout', 'set', '--cone', '--skip-checks', *sparse_dirs)
+        with open(os.path.join(self.repo_path, '.git', 'info', 'sparse-checkout')) as f:
+            expected = f.read().split('\n')
+        self.assertEqual(sorted(_cone_patterns(sparse_dirs)), sorted(p for p in expected if p))
+
+    @staticmethod
+    def _write_in(root, relative_path, content):
+        with open(os.path.join(root, relative_path), 'w') as f:
+            f.write(content)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -43,10 +43,13 @@ class PomModifier:
             return True
         return False
     
-    def add_jacoco_plugin(self):
+    def add_jacoco_plugin(self, include_classes=None):
         """
         添加JaCoCo插件到pom.xml
         
+        Args:
+            include_classes: 只插桩和报告的顶层类（"包名.类名"，同时包含其内部类），None表示全部类
+        
         Returns:
             bool: 是否成功添加
         """
@@ -74,7 +77,7 @@ class PomModifier:
                 plugins = ET.SubElement(build, f"{{{self.MAVEN_NS}}}plugins")
             
             # 创建JaCoCo插件配置
-            jacoco_plugin = self._create_jacoco_plugin_xml()
+            jacoco_plugin = self._create_jacoco_plugin_xml(include_classes)
             plugins.append(jacoco_plugin)
             
             # 保存修改后的POM
@@ -95,7 +98,7 @@ class PomModifier:
                 return True
         return False
     
-    def _create_jacoco_plugin_xml(self):
+    def _create_jacoco_plugin_xml(self, include_classes=None):
         """创建JaCoCo插件的XML配置"""
         # 创建plugin元素
         plugin = ET.Element(f"{{{self.MAVEN_NS}}}plugin")
@@ -120,6 +123,9 @@ class PomModifier:
         goals1 = ET.SubElement(execution1, f"{{{self.MAVEN_NS}}}goals")
         goal1 = ET.SubElement(goals1, f"{{{self.MAVEN_NS}}}goal")
         goal1.text = "prepare-agent"
+        if include_classes:
+            # agent按VM类名匹配
+            self._add_includes(execution1, include_classes, '')
         
         # execution: report
         execution2 = ET.SubElement(executions, f"{{{self.MAVEN_NS}}}execution")
@@ -130,9 +136,22 @@ class PomModifier:
         goals2 = ET.SubElement(execution2, f"{{{self.MAVEN_NS}}}goals")
         goal2 = ET.SubElement(goals2, f"{{{self.MAVEN_NS}}}goal")
         goal2.text = "report"
+        if include_classes:
+            # report按class文件路径匹配
+            self._add_includes(execution2, include_classes, '.class')
         
         return plugin
     
+    def _add_includes(self, execution, include_classes, suffix):
+        """为execution添加 <configuration><includes>（每个类及其内部类）"""
+        configuration = ET.SubElement(execution, f"{{{self.MAVEN_NS}}}configuration")
+        includes = ET.SubElement(configuration, f"{{{self.MAVEN_NS}}}includes")
+        for class_name in include_classes:
+            path = class_name.lstrip('.').replace('.', '/')
+            for pattern in (path, f"{path}$*"):
+                include = ET.SubElement(includes, f"{{{self.MAVEN_NS}}}include")
+                include.text = pattern + suffix
+    
     def __enter__(self):
         """上下文管理器入口"""
         self.backup()